@@ -0,0 +1,295 @@
+"""Benchmarks offline do Mini Navegador PyQt.
+
+Roda o Browser na plataforma "offscreen" do Qt contra um servidor HTTP local
+com páginas sintéticas (DOM pesado, muitos sub-recursos e imagens grandes) e
+mede carregamento frio/quente, latência de add_new_tab, troca de abas e
+memória dos renderizadores com N abas abertas.
+
+Uso:
+    python benchmark.py --output resultados.json
+    python benchmark.py --output novo.json --baseline resultados.json --threshold 0.10
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import functools
+import http.server
+
+# Precisa estar definido antes de qualquer import do Qt
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QUrl, QEventLoop, QTimer, QT_VERSION_STR, PYQT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+
+import navegador
+
+LOAD_TIMEOUT_SECONDS = 60
+CACHE_CLEAR_SETTLE_MS = 500             # clearHttpCache é assíncrono
+
+
+# --- Páginas sintéticas ---
+def png_bytes(width, height, rgb):
+    """PNG mínimo de cor sólida, gerado sem dependências externas."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    row = b"\x00" + bytes(rgb) * width
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height)) + chunk(b"IEND", b""))
+
+def bmp_bytes(width, height, seed):
+    """BMP de 24 bits sem compressão: imagem grande de verdade no fio e na decodificação."""
+    row_size = (width * 3 + 3) & ~3
+    pixels = bytearray(row_size * height)
+    for y in range(height):
+        value = (y * 7 + seed) & 0xff
+        pixels[y * row_size:y * row_size + width * 3] = bytes((value, 255 - value, seed & 0xff)) * width
+    header = struct.pack("<2sIHHI", b"BM", 54 + len(pixels), 0, 0, 54)
+    info = struct.pack("<IiiHHIIiiII", 40, width, height, 1, 24, 0, len(pixels), 2835, 2835, 0, 0)
+    return header + info + bytes(pixels)
+
+def write_synthetic_site(root, dom_nodes=20000, subresources=200, large_images=3, image_size=1500):
+    """Gera o site de teste em root e devolve os caminhos relativos das páginas."""
+    os.makedirs(os.path.join(root, "res"), exist_ok=True)
+
+    with open(os.path.join(root, "blank.html"), "w") as page:
+        page.write("<!doctype html><title>blank</title><p>ok</p>")
+
+    rows = "".join(f"<tr><td>{i}</td><td><span class='c{i % 10}'>item {i}</span></td><td><a href='#{i}'>link</a></td></tr>"
+                   for i in range(dom_nodes // 4))
+    with open(os.path.join(root, "heavy_dom.html"), "w") as page:
+        page.write(f"<!doctype html><title>heavy dom</title><table>{rows}</table>")
+
+    tags = []
+    for i in range(subresources):
+        kind = i % 4
+        if kind == 0:
+            with open(os.path.join(root, "res", f"s{i}.css"), "w") as res:
+                res.write(f".r{i} {{ color: #{i % 256:02x}{i % 256:02x}{i % 256:02x}; }}\n" * 50)
+            tags.append(f"<link rel='stylesheet' href='res/s{i}.css'>")
+        elif kind == 1:
+            with open(os.path.join(root, "res", f"s{i}.js"), "w") as res:
+                res.write(f"window.v{i} = Array.from({{length: 200}}, (_, k) => k * {i});\n")
+            tags.append(f"<script src='res/s{i}.js'></script>")
+        else:
+            with open(os.path.join(root, "res", f"i{i}.png"), "wb") as res:
+                res.write(png_bytes(32, 32, (i % 256, (i * 3) % 256, (i * 7) % 256)))
+            tags.append(f"<img src='res/i{i}.png' width=32 height=32>")
+    with open(os.path.join(root, "subresources.html"), "w") as page:
+        page.write(f"<!doctype html><title>subresources</title>{''.join(tags)}")
+
+    images = []
+    for i in range(large_images):
+        with open(os.path.join(root, "res", f"big{i}.bmp"), "wb") as res:
+            res.write(bmp_bytes(image_size, image_size, i * 40))
+        images.append(f"<img src='res/big{i}.bmp' width=400>")
+    with open(os.path.join(root, "large_images.html"), "w") as page:
+        page.write(f"<!doctype html><title>large images</title>{''.join(images)}")
+
+    return ["heavy_dom.html", "subresources.html", "large_images.html"]
+
+
+class CachingRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Servidor estático silencioso que permite cache: a carga "quente" sai do cache HTTP."""
+    def end_headers(self):
+        self.send_header("Cache-Control", "max-age=3600")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(root):
+    handler = functools.partial(CachingRequestHandler, directory=root)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+# --- Medições ---
+def wait_ms(ms):
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec_()
+
+def timed_load(view, url):
+    """Navega e espera o loadFinished. Retorna (milissegundos, sucesso)."""
+    loop = QEventLoop()
+    result = {}
+
+    def finished(ok):
+        result["ok"] = ok
+        loop.quit()
+
+    view.loadFinished.connect(finished)
+    QTimer.singleShot(LOAD_TIMEOUT_SECONDS * 1000, loop.quit)
+    started = time.perf_counter()
+    view.setUrl(QUrl(url))
+    loop.exec_()
+    elapsed = (time.perf_counter() - started) * 1000
+    view.loadFinished.disconnect(finished)
+    return elapsed, result.get("ok", False)
+
+def summarize(samples, unit="ms"):
+    return {"median": statistics.median(samples), "min": min(samples), "max": max(samples),
+            "unit": unit, "samples": samples}
+
+def measure_page_loads(browser, base_url, pages, repeats):
+    metrics = {}
+    view = browser.current_browser_tab().browser
+    for page in pages:
+        cold, warm = [], []
+        for _ in range(repeats):
+            timed_load(view, base_url + "blank.html")
+            browser.web_profile.clearHttpCache()
+            wait_ms(CACHE_CLEAR_SETTLE_MS)
+            elapsed, ok = timed_load(view, base_url + page)
+            if ok:
+                cold.append(elapsed)
+            timed_load(view, base_url + "blank.html")
+            elapsed, ok = timed_load(view, base_url + page)
+            if ok:
+                warm.append(elapsed)
+        name = page.rsplit(".", 1)[0]
+        if cold:
+            metrics[f"page_load_cold_{name}"] = summarize(cold)
+        if warm:
+            metrics[f"page_load_warm_{name}"] = summarize(warm)
+    return metrics
+
+def measure_new_tabs(browser, base_url, repeats):
+    call_samples, ready_samples = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        tab = browser.add_new_tab(QUrl(base_url + "blank.html"))
+        call_samples.append((time.perf_counter() - started) * 1000)
+
+        loop = QEventLoop()
+        tab.browser.loadFinished.connect(loop.quit)
+        QTimer.singleShot(LOAD_TIMEOUT_SECONDS * 1000, loop.quit)
+        loop.exec_()
+        ready_samples.append((time.perf_counter() - started) * 1000)
+        # Aba vinda do pool: o about:blank do aquecimento não pode ficar no "Voltar"
+        history_count = tab.browser.history().count()
+        if history_count != 1:
+            raise RuntimeError(f"Aba nova com {history_count} entradas no histórico depois da primeira carga "
+                               "(esperado 1).")
+        browser.close_current_tab()
+        wait_ms(navegador.PAGE_POOL_REFILL_DELAY_MS + 200) # Dá tempo de o pool repor a página usada
+    return {"add_new_tab_call": summarize(call_samples), "add_new_tab_until_loaded": summarize(ready_samples)}
+
+def open_tabs(browser, url, count):
+    """Abre count abas carregando url e espera todas terminarem."""
+    pending = {"count": count}
+    loop = QEventLoop()
+
+    def finished(ok):
+        pending["count"] -= 1
+        if pending["count"] <= 0:
+            loop.quit()
+
+    tabs = []
+    for _ in range(count):
+        tab = browser.add_new_tab(QUrl(url))
+        tab.browser.loadFinished.connect(finished)
+        tabs.append(tab)
+    QTimer.singleShot(LOAD_TIMEOUT_SECONDS * 1000, loop.quit)
+    loop.exec_()
+    return tabs
+
+def measure_tab_switch_and_memory(app, browser, base_url, tab_count, repeats):
+    open_tabs(browser, base_url + "heavy_dom.html", tab_count)
+    wait_ms(1000) # Deixa os renderizadores assentarem antes de medir memória
+
+    snapshot = browser.tab_resource_snapshot()
+    renderer_bytes = sum({entry["pid"]: entry["rss_bytes"] for entry in snapshot if entry["pid"]}.values())
+    metrics = {
+        f"renderer_memory_{tab_count}_tabs": summarize([renderer_bytes / (1024 * 1024)], "MB"),
+        "browser_process_memory": summarize([navegador.get_process_rss_bytes(os.getpid()) / (1024 * 1024)], "MB"),
+    }
+
+    switch_samples = []
+    count = browser.tabs.count()
+    for i in range(repeats * count):
+        started = time.perf_counter()
+        browser.tabs.setCurrentIndex(i % count)
+        app.processEvents()
+        switch_samples.append((time.perf_counter() - started) * 1000)
+    metrics["tab_switch"] = summarize(switch_samples)
+    return metrics
+
+
+# --- Comparação com uma execução anterior ---
+def compare_with_baseline(results, baseline, threshold):
+    """Lista as métricas cuja mediana piorou mais que threshold (todas são "menor é melhor")."""
+    regressions = []
+    for name, current in results["metrics"].items():
+        previous = baseline.get("metrics", {}).get(name)
+        if not previous or previous["median"] <= 0:
+            continue
+        change = current["median"] / previous["median"] - 1
+        status = "REGRESSÃO" if change > threshold else "ok"
+        print(f"  {name:<40} {previous['median']:10.1f} -> {current['median']:10.1f} {current['unit']:<3} "
+              f"({change:+.1%}) {status}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline do Mini Navegador PyQt")
+    parser.add_argument("--output", default="benchmark_results.json", help="arquivo JSON de resultados")
+    parser.add_argument("--baseline", help="resultados anteriores para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="piora relativa tolerada na mediana antes de acusar regressão (padrão: 0.10)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tabs", type=int, default=10, help="abas abertas na medição de memória e troca de abas")
+    args = parser.parse_args()
+
+    navegador.register_local_file_scheme() # Os perfis instalam o handler de arquivo:
+    app = QApplication([sys.argv[0]])
+    with tempfile.TemporaryDirectory(prefix="navegadorpytech_bench_") as site_root:
+        pages = write_synthetic_site(site_root)
+        server, base_url = start_http_server(site_root)
+
+        browser = navegador.Browser("guest_mode", initial_urls=[base_url + "blank.html"])
+        browser.show()
+        timed_load(browser.current_browser_tab().browser, base_url + "blank.html") # Aquece o motor
+
+        metrics = {}
+        metrics.update(measure_page_loads(browser, base_url, pages, args.repeats))
+        metrics.update(measure_new_tabs(browser, base_url, args.repeats))
+        metrics.update(measure_tab_switch_and_memory(app, browser, base_url, args.tabs, args.repeats))
+
+        page_pool = browser.page_pool.stats()
+        browser.close()
+        server.shutdown()
+    navegador.wait_for_background_threads()
+
+    results = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "qt": QT_VERSION_STR, "pyqt": PYQT_VERSION_STR, "platform": platform.platform(),
+                 "repeats": args.repeats, "tabs": args.tabs, "page_pool": page_pool},
+        "metrics": metrics,
+    }
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(results, output, indent=2)
+    print(f"Resultados gravados em {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"Comparando com {args.baseline} (tolerância {args.threshold:.0%}):")
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressão(ões): {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
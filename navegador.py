@@ -4,22 +4,396 @@ import shutil
 import gc
 import glob
 import re
+import time
+import json
+import queue
+import bisect
+import logging
+import sqlite3
+import argparse
+import hashlib
+import getpass
+import pickle
+import itertools
+import io
+import stat
+import tarfile
+import zlib
+import mmap
+import mimetypes
+import html
+import threading
+import http.client
+import http.server
+from collections import OrderedDict
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
 
-from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QLineEdit, QToolBar, QWidget,
-    QVBoxLayout, QMessageBox, QInputDialog, QDialog, QPushButton, QListWidget,
-    QHBoxLayout, QLabel, QAction, QTabWidget, QMenu # Importe QTabWidget e QMenu
+# Referência para o --startup-trace: tudo antes disso é o próprio interpretador Python
+STARTUP_TIME_ORIGIN = time.perf_counter()
+
+# Só QtCore e QtNetwork antes da entrada rápida (logo abaixo das constantes): quem apenas
+# repassa URLs para uma instância já aberta não paga a importação do QtWebEngine
+from PyQt5.QtCore import (
+    QUrl, Qt, QDir, QStandardPaths, QTimer, QThread, QObject, pyqtSignal, QModelIndex, QEvent, QAbstractListModel,
+    QIODevice, QBuffer, QUrlQuery
+)
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket, QAbstractSocket
+
+# Filtros, downloads em partes, diário de sessão, regras por site e a busca do Ctrl+K não
+# dependem do QtWebEngine: ficam em navegador_nucleo (com as constantes deles), que os testes
+# importam mesmo onde o QtWebEngine não carrega
+from navegador_nucleo import (
+    BOOKMARK_IMPORT_READ_BYTES, DOWNLOAD_PART_SUFFIX, DOWNLOAD_STATE_SUFFIX, PROFILE_ARCHIVE_ROOT, SITE_RULE_ATTRIBUTES,
+    FilterEngine, ParallelDownload, SessionJournal, SiteRules, archive_member_path, format_bytes, iter_json_events,
+    rank_fuzzy
 )
-from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineProfile, QWebEnginePage
-from PyQt5.QtCore import QUrl, Qt, QDir, QStandardPaths, QTimer, QThread
-from PyQt5.QtGui import QIcon, QKeySequence # Importe QKeySequence
 
 # --- Definições de Caminho e Configurações ---
 APP_DATA_DIR_NAME = "navegadorpytech"
 PROFILES_DIR_NAME = "profiles"
 DEFAULT_HOME_URL = "https://www.google.com"
 DEFAULT_SEARCH_ENGINE_URL = "https://www.google.com/search?q="
+LOCAL_FILE_SCHEME = "arquivo"           # Arquivos e pastas locais servidos pelo LocalFileSchemeHandler
+LOCAL_FILE_READ_CHUNK_BYTES = 1024 * 1024
+LOCAL_DIR_PAGE_SIZE = 500               # Entradas por página na listagem de pastas
+
+# --- Ciclo de vida das abas em segundo plano ---
+TAB_FREEZE_AFTER_SECONDS = 5 * 60       # Aba oculta há 5 min é congelada (sem timers/JS)
+TAB_DISCARD_AFTER_SECONDS = 30 * 60     # Aba oculta há 30 min é descartada (libera o renderizador)
+RENDERER_MEMORY_BUDGET_MB = 1536        # Acima disso, descarta abas antigas primeiro (0 desativa)
+TAB_LIFECYCLE_CHECK_INTERVAL_MS = 15000
+
+# --- Limpeza dos dados do modo convidado ---
+GUEST_TOMBSTONE_PREFIX = f"{APP_DATA_DIR_NAME}_tombstone_"
+CLEANUP_MAX_WORKERS = 4
+CLEANUP_MAX_RETRIES = 5
+CLEANUP_RETRY_DELAY_MS = 1000
+CLEANUP_EXIT_WAIT_MS = 5000
+CLEANUP_START_DELAY_MS = 2000           # Espera a janela aparecer antes de começar a apagar
+GUEST_MEMORY_HTTP_CACHE_MAX_MB = 64     # Convidado padrão: cache HTTP só em RAM, com este teto
+
+# --- Instância única por perfil ---
+INSTANCE_SERVER_PREFIX = f"{APP_DATA_DIR_NAME}-instance"
+INSTANCE_CONNECT_TIMEOUT_MS = 200       # Ninguém escutando: segue com a inicialização normal
+INSTANCE_REPLY_TIMEOUT_MS = 2000
+
+# --- Gerenciador de tarefas ---
+TASK_MANAGER_REFRESH_MS = 1000
+
+# --- Bloqueador de conteúdo ---
+FILTER_LISTS_DIR_NAME = "filters"       # Listas no formato EasyList (*.txt) ficam aqui
+FILTER_CACHE_FILE_NAME = "filters.compiled"
+FILTER_ENGINE_VERSION = 1               # Mude ao alterar o formato compilado: invalida o cache
+BLOCKED_COUNTER_MAX_PAGES = 500         # Páginas com contador de bloqueios guardado
+BLOCKED_COUNTER_REFRESH_MS = 1000
+
+# --- Downloads ---
+DOWNLOAD_PANEL_REFRESH_MS = 500
+
+# --- Renderização em lote (--batch) ---
+BATCH_DEFAULT_CONCURRENCY = 4           # Páginas renderizando ao mesmo tempo
+BATCH_DEFAULT_TIMEOUT_SECONDS = 30
+BATCH_SETTLE_MS = 300                   # Espera depois do loadFinished antes de gerar o PDF/PNG
+BATCH_VIEWPORT_SIZE = (1280, 800)
+BATCH_SLUG_MAX_CHARS = 60
+BATCH_REPORT_FILE_NAME = "report.json"
+
+# --- Páginas pré-criadas ---
+DEFAULT_PAGE_POOL_SIZE = 2              # "page_pool_size" nas preferências do perfil (0 desativa)
+PAGE_POOL_MAX_SIZE = 8
+PAGE_POOL_REFILL_DELAY_MS = 500         # Repõe uma página por vez, com a interface ociosa
+PAGE_POOL_WARM_URL = "about:blank"      # Carregar algo já sobe o processo renderizador
+
+# --- Interface ---
+UI_UPDATE_INTERVAL_MS = 16              # Um quadro: rajadas de sinais viram uma atualização só
+# Estado do ícone de segurança -> (ícone do tema, ícone alternativo, dica)
+SECURITY_ICON_STATES = {
+    "secure": ("object-locked", "dialog-ok", "Conexão segura (HTTPS)"),
+    "local": ("dialog-information", "dialog-information", "Arquivo local"),
+    "insecure": ("dialog-warning", "dialog-error", "Conexão não segura ou HTTP"),
+}
+
+# --- Métricas ---
+METRICS_DIR_NAME = "metrics"            # Dentro da pasta do aplicativo (vale para todos os perfis)
+METRICS_LOG_FILE_NAME = "metrics.jsonl" # Um evento JSON por linha
+METRICS_LOG_MAX_BYTES = 5 * 1024 * 1024
+METRICS_LOG_BACKUP_COUNT = 3            # metrics.jsonl.1 ... .3
+METRICS_LOGGER_NAME = "navegador.metrics"
+METRICS_HTTP_HOST = "127.0.0.1"         # --metrics-port só escuta localmente
+NAVIGATION_BUCKETS_SECONDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+WINDOW_BUCKETS_SECONDS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+CLEANUP_BUCKETS_SECONDS = (0.1, 0.5, 1, 5, 15, 60, 300)
+# Família -> (tipo, descrição, limites do histograma)
+METRIC_FAMILIES = {
+    "navegador_navigation_commit_seconds": ("histogram", "Do loadStarted ao primeiro urlChanged da navegação",
+                                            NAVIGATION_BUCKETS_SECONDS),
+    "navegador_navigation_load_seconds": ("histogram", "Do loadStarted ao loadFinished", NAVIGATION_BUCKETS_SECONDS),
+    "navegador_navigations_total": ("counter", "Navegações terminadas, por resultado", None),
+    "navegador_open_tabs": ("gauge", "Abas abertas", None),
+    "navegador_loaded_tabs": ("gauge", "Abas com página criada", None),
+    "navegador_window_opened_seconds": ("histogram", "Tempo para abrir a janela de um perfil", WINDOW_BUCKETS_SECONDS),
+    "navegador_window_closed_seconds": ("histogram", "Tempo do closeEvent da janela de um perfil",
+                                        WINDOW_BUCKETS_SECONDS),
+    "navegador_cleanup_seconds": ("histogram", "Duração das limpezas em segundo plano", CLEANUP_BUCKETS_SECONDS),
+    "navegador_cleanup_bytes_total": ("counter", "Bytes apagados pelas limpezas em segundo plano", None),
+}
+
+# --- Diário de sessão (restaura as abas ao reabrir o perfil) ---
+SESSION_JOURNAL_FILE_NAME = "session.journal"
+
+# --- Preferências e cache HTTP por perfil ---
+PROFILE_SETTINGS_FILE_NAME = "preferences.json"
+HTTP_CACHE_DIR_NAME = "Cache"           # Subpasta que o QtWebEngine cria dentro do cachePath
+HTTP_CACHE_TYPES = ("disk", "memory")
+DEFAULT_HTTP_CACHE_TYPE = "disk"
+DEFAULT_HTTP_CACHE_MAX_MB = 256
+HTTP_CACHE_MIN_MB = 16                  # Limites aceitos em "http_cache_max_mb" (e no diálogo)
+HTTP_CACHE_MAX_MB = 100 * 1024
+HTTP_CACHE_OVERSHOOT_FACTOR = 1.1       # Folga sobre o limite antes de limparmos o cache à força
+CACHE_MEASURE_INTERVAL_MS = 5 * 60 * 1000
+CACHE_FIRST_MEASURE_DELAY_MS = 10000
+
+# --- Histórico de navegação ---
+HISTORY_DB_FILE_NAME = "history.sqlite"
+HISTORY_BATCH_MAX = 200                 # Visitas gravadas por transação
+HISTORY_BATCH_DELAY_SECONDS = 1.0       # Espera para juntar visitas num mesmo lote
+HISTORY_FRECENCY_EPOCH = 1577836800     # 2020-01-01: referência fixa para o peso das visitas
+HISTORY_FRECENCY_HALF_LIFE_DAYS = 30    # Uma visita vale metade a cada 30 dias
+HISTORY_SUGGESTION_LIMIT = 8
+HISTORY_HOT_SET_SIZE = 2000             # URLs mais frequentes mantidas em memória
+HISTORY_RECORDED_SCHEMES = ("http", "https", "ftp", "file", LOCAL_FILE_SCHEME)
+
+# --- Favoritos ---
+BOOKMARKS_DB_FILE_NAME = "bookmarks.sqlite"
+BOOKMARK_SEARCH_LIMIT = 10
+BOOKMARK_IMPORT_BATCH = 1000            # Favoritos inseridos (e gravados) por transação durante a importação
+
+# --- Regras por site e modo leve ---
+SITE_RULES_FILE_NAME = "site_rules.json" # {"exemplo.com": {"javascript": false}, "lento.com": "leve"}
+
+# --- Ícones dos sites ---
+FAVICONS_DB_FILE_NAME = "favicons.sqlite"
+FAVICON_MEMORY_CACHE_SIZE = 256         # QIcons decodificados mantidos em memória (LRU)
+FAVICON_STORE_MAX_BYTES = 4 * 1024 * 1024  # Limite do banco de ícones do perfil
+FAVICON_STORE_TRIM_RATIO = 0.8          # Passou do limite: apaga os menos usados até 80% dele
+FAVICON_STORE_SIZE = 32                 # Lado máximo (px) do PNG gravado
+
+# --- Operações de perfil (apagar, clonar, exportar, importar) ---
+PROFILE_TRASH_PREFIX = ".apagar_"       # Perfil excluído: some da lista na hora e é apagado em segundo plano
+PROFILE_TEMP_PREFIX = ".incompleto_"    # Clone/importação em andamento (com o PID de quem está montando)
+PROFILE_ARCHIVE_SUFFIX = ".tar.gz"
+PROFILE_ARCHIVE_MANIFEST_NAME = f"{APP_DATA_DIR_NAME}-perfil.json"
+PROFILE_ARCHIVE_FORMAT = 1
+PROFILE_COPY_BUFFER_BYTES = 1024 * 1024
+PROFILE_JOB_PROGRESS_INTERVAL_SECONDS = 0.2
+
+# --- Layout do perfil em disco ---
+PROFILE_CACHE_DIR_NAME = "cache"        # cachePath do motor: pode ser apagado sem perder nada
+PROFILE_STORAGE_DIR_NAME = "storage"    # persistentStoragePath: cookies, LocalStorage, IndexedDB...
+PROFILE_APPDATA_DIR_NAME = "appdata"    # Arquivos do próprio navegador
+PROFILE_APPDATA_FILES = (PROFILE_SETTINGS_FILE_NAME, HISTORY_DB_FILE_NAME, BOOKMARKS_DB_FILE_NAME, FAVICONS_DB_FILE_NAME,
+                         SITE_RULES_FILE_NAME,
+                         SESSION_JOURNAL_FILE_NAME)
+PROFILE_LAYOUT_MARKER_NAME = "layout_version"
+PROFILE_LAYOUT_VERSION = 2              # 1 = tudo na raiz do perfil
+DISK_USAGE_CACHE_FILE_NAME = "disk_usage.json"
+DISK_USAGE_RACY_SECONDS = 2             # Diretórios alterados há menos que isso são sempre relidos
+
+# --- LINHA DE COMANDO E ENTRADA RÁPIDA ---
+def local_file_url(path):
+    """URL arquivo: para um caminho local (absoluto)."""
+    url = QUrl()
+    url.setScheme(LOCAL_FILE_SCHEME)
+    url.setPath(QDir.fromNativeSeparators(os.path.abspath(path)))
+    return url
+
+def open_batch_list(source):
+    """Abre a lista do --batch ("-" é a entrada padrão). Erros de abertura sobem como OSError."""
+    return sys.stdin if source == "-" else open(source, encoding="utf-8")
+
+def profile_name_problem(profile_name, must_be_new=True):
+    """Motivo para recusar um nome de perfil (None se o nome serve).
+
+    O nome vira uma pasta dentro de profiles/: nada de barras, ':' (unidade no
+    Windows) nem '.' no início, que list_profiles esconde. Com must_be_new um
+    perfil já existente também é recusado.
+    """
+    if not profile_name:
+        return "O nome do perfil não pode ser vazio."
+    if profile_name.lower() in ("guest", "guest_mode"):
+        return "O nome 'guest' é reservado para o modo convidado."
+    if profile_name.startswith(".") or any(char in profile_name for char in ("/", "\\", ":", "\0", os.sep)):
+        return "O nome do perfil não pode começar com '.' nem conter barras ou ':'."
+    if must_be_new and os.path.exists(os.path.join(get_profiles_data_dir(), profile_name)):
+        return f"Já existe um perfil chamado '{profile_name}'."
+    return None
+
+# Opções do próprio Qt (um traço só) que consomem o argumento seguinte
+QT_OPTIONS_WITH_VALUE = {"-platform", "-platformpluginpath", "-platformtheme", "-plugin", "-qwindowgeometry",
+                         "-geometry", "-qwindowtitle", "-title", "-qwindowicon", "-style", "-stylesheet",
+                         "-display", "-session"}
+
+def parse_command_line(argv):
+    """Lê as opções do navegador; as opções do Qt (ex.: -platform offscreen) ficam para o QApplication."""
+    qt_args = []
+    own_args = []
+    arguments = iter(argv[1:])
+    for argument in arguments:
+        if argument.startswith("-") and not argument.startswith("--") and len(argument) > 2:
+            qt_args.append(argument)
+            if argument in QT_OPTIONS_WITH_VALUE:
+                value = next(arguments, None)
+                if value is not None:
+                    qt_args.append(value)
+        else:
+            own_args.append(argument)
+
+    parser = argparse.ArgumentParser(prog="navegador.py", description="Mini Navegador PyQt")
+    profile_group = parser.add_mutually_exclusive_group()
+    profile_group.add_argument("--profile", metavar="NOME", help="abre direto o perfil NOME (cria se não existir)")
+    profile_group.add_argument("--guest", action="store_true",
+                               help="abre direto no modo convidado (tudo em memória, nada gravado em disco)")
+    profile_group.add_argument("--guest-on-disk", action="store_true",
+                               help="modo convidado gravando numa pasta temporária apagada ao fechar "
+                                    "(para sessões grandes demais para a memória)")
+    parser.add_argument("--no-dialog", action="store_true",
+                        help="não mostra nenhum diálogo na inicialização (sem perfil: modo convidado)")
+    parser.add_argument("--startup-trace", action="store_true",
+                        help="imprime o tempo de cada fase até a primeira pintura e o primeiro loadFinished")
+    parser.add_argument("--metrics-port", type=int, metavar="PORTA",
+                        help=f"serve as métricas no formato do Prometheus em http://{METRICS_HTTP_HOST}:PORTA/metrics")
+    parser.add_argument("urls", nargs="*", metavar="URL_OU_ARQUIVO", help="URLs ou arquivos para abrir em abas")
+    batch_group = parser.add_argument_group("renderização em lote (sem janela)")
+    batch_group.add_argument("--batch", metavar="LISTA",
+                             help="renderiza as URLs/arquivos de LISTA (um por linha; '-' lê da entrada padrão) e sai")
+    batch_group.add_argument("--format", choices=("pdf", "png"), default="pdf", help="formato de saída (padrão: pdf)")
+    batch_group.add_argument("--output", metavar="PASTA", default="render", help="pasta de saída (padrão: render)")
+    batch_group.add_argument("--concurrency", type=int, default=BATCH_DEFAULT_CONCURRENCY, metavar="N",
+                             help=f"páginas renderizando ao mesmo tempo (padrão: {BATCH_DEFAULT_CONCURRENCY})")
+    batch_group.add_argument("--timeout", type=float, default=BATCH_DEFAULT_TIMEOUT_SECONDS, metavar="SEGUNDOS",
+                             help=f"tempo máximo por item (padrão: {BATCH_DEFAULT_TIMEOUT_SECONDS})")
+    batch_group.add_argument("--report", metavar="ARQUIVO",
+                             help=f"relatório JSON com os tempos de cada item (padrão: PASTA/{BATCH_REPORT_FILE_NAME})")
+    args = parser.parse_args(own_args)
+    if args.concurrency < 1:
+        parser.error("--concurrency precisa ser pelo menos 1")
+    if args.timeout <= 0:
+        parser.error("--timeout precisa ser positivo")
+    if args.metrics_port is not None and not 0 <= args.metrics_port <= 65535:
+        parser.error("--metrics-port precisa estar entre 0 e 65535")
+    args.batch_list = None
+    if args.batch:
+        # Abre já aqui: um arquivo inexistente é erro de uso, não uma exceção no meio do laço do Qt
+        try:
+            args.batch_list = open_batch_list(args.batch)
+        except OSError as e:
+            parser.error(f"não foi possível abrir a lista do --batch '{args.batch}': {e.strerror or e}")
+    args.guest = args.guest or args.guest_on_disk
+    if args.profile is not None:
+        args.profile = args.profile.strip()
+        # Perfil existente vale (é aberto); só nomes que sairiam da pasta de perfis são recusados
+        problem = profile_name_problem(args.profile, must_be_new=False)
+        if problem:
+            parser.error(f"--profile '{args.profile}': {problem}")
+    return args, [argv[0]] + qt_args
+
+def command_line_url(argument):
+    """Arquivo ou pasta existente vira arquivo:; o resto é interpretado como o usuário digitaria."""
+    if os.path.exists(argument): # Arquivo ou pasta: servidos pelo esquema arquivo:
+        return local_file_url(argument).toString()
+    return QUrl.fromUserInput(argument).toString()
 
+def instance_server_name(profile_name=None):
+    """Nome do servidor local de um perfil (None = a instância principal, dona do apelido).
+
+    Inclui o usuário e um hash do perfil: nomes curtos e sem caracteres estranhos
+    para o caminho do socket.
+    """
+    try:
+        user = getpass.getuser()
+    except Exception: # Sem variável de ambiente nem entrada no passwd
+        user = str(os.getuid()) if hasattr(os, "getuid") else "user"
+    user = re.sub(r'[^A-Za-z0-9_.-]', '_', user)
+    suffix = hashlib.sha1(profile_name.encode("utf-8")).hexdigest()[:12] if profile_name else "primary"
+    return f"{INSTANCE_SERVER_PREFIX}-{user}-{suffix}"
+
+def forward_to_running_instance(profile_name, urls, include_primary=True):
+    """Entrega as URLs a uma instância já aberta. Retorna False se não houver ninguém escutando.
+
+    Tenta primeiro a janela do próprio perfil; depois (com include_primary) a
+    instância principal, que abre o perfil numa janela nova dentro do processo
+    que já está rodando.
+    """
+    names = [instance_server_name(profile_name)] if profile_name else []
+    if include_primary or not profile_name:
+        names.append(instance_server_name(None))
+    message = json.dumps({"profile": profile_name, "urls": urls}) + "\n"
+    for name in names:
+        socket = QLocalSocket()
+        socket.connectToServer(name)
+        if not socket.waitForConnected(INSTANCE_CONNECT_TIMEOUT_MS):
+            continue
+        socket.write(message.encode("utf-8"))
+        socket.waitForBytesWritten(INSTANCE_REPLY_TIMEOUT_MS)
+        delivered = socket.waitForReadyRead(INSTANCE_REPLY_TIMEOUT_MS) and bytes(socket.readAll()).startswith(b"ok")
+        socket.disconnectFromServer()
+        if delivered:
+            return True
+    return False
+
+def forward_command_line(args):
+    """Repassa a invocação para uma instância já aberta. Retorna (entregue, URLs da linha de comando).
+
+    Roda antes de importar o QtWebEngine e sem QApplication: QLocalSocket em modo
+    bloqueante não precisa de laço de eventos. Mesmo sem URLs a invocação é
+    repassada (a janela aberta vem para a frente), então dois processos nunca
+    sobem o Chromium sobre a mesma pasta de perfil.
+    """
+    urls = [command_line_url(argument) for argument in args.urls]
+    for argument, url in zip(args.urls, urls):
+        print(f"Abrindo: {url}" if url else f"Argumento inválido: {argument}")
+    urls = [url for url in urls if url]
+    if args.guest or (args.no_dialog and not args.profile):
+        forward_profile = "guest_mode"
+    else:
+        forward_profile = args.profile # None: quem atende é a instância principal
+    return forward_to_running_instance(forward_profile, urls), urls
+
+if __name__ == "__main__":
+    args, qt_argv = parse_command_line(sys.argv)
+    initial_load_urls = []
+    if not args.batch: # O lote roda sempre num processo próprio, sem janela
+        forwarded, initial_load_urls = forward_command_line(args)
+        if forwarded:
+            print("URLs entregues à instância já aberta." if initial_load_urls else "Instância já aberta trazida para a frente.")
+            sys.exit(0)
+STARTUP_FORWARD_CHECKED = time.perf_counter()
+
+# As classes abaixo herdam de widgets do Qt, então o resto do Qt é importado aqui,
+# depois da entrada rápida; o --startup-trace mostra quanto isso custa
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QLineEdit, QToolBar, QWidget,
+    QVBoxLayout, QMessageBox, QInputDialog, QDialog, QPushButton, QListWidget, QListWidgetItem,
+    QHBoxLayout, QLabel, QAction, QTabWidget, QMenu, # Importe QTabWidget e QMenu
+    QCompleter, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QFileDialog, QToolButton,
+    QListView, QDockWidget, QProgressBar
+)
+from PyQt5.QtWebEngineWidgets import (
+    QWebEngineView, QWebEngineProfile, QWebEnginePage, QWebEngineDownloadItem, QWebEngineSettings
+)
+from PyQt5.QtWebEngineCore import (
+    QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob
+)
+try:
+    from PyQt5.QtWebEngineCore import QWebEngineUrlScheme
+except ImportError: # Qt < 5.12
+    QWebEngineUrlScheme = None
+from PyQt5.QtGui import QIcon, QPixmap, QKeySequence, QStandardItemModel, QStandardItem # Importe QKeySequence
+STARTUP_QT_IMPORTED = time.perf_counter()
+
+# --- DIRETÓRIOS DE DADOS ---
 def get_app_base_data_dir():
     user_home = os.path.expanduser('~')
     app_data_path = os.path.join(user_home, 'AppData', 'Local', APP_DATA_DIR_NAME)
@@ -36,272 +410,3796 @@ def get_profile_data_path(profile_name):
     os.makedirs(profile_data_path, exist_ok=True)
     return profile_data_path
 
+def list_profiles():
+    """Nomes dos perfis persistentes existentes (pastas ocultas são exclusões e cópias em andamento)."""
+    profiles_dir = get_profiles_data_dir()
+    return [d for d in os.listdir(profiles_dir) if not d.startswith(".") and os.path.isdir(os.path.join(profiles_dir, d))]
+
+def get_profile_http_cache_path(profile_name):
+    # Só o cache HTTP fica aqui; cookies e armazenamento ficam fora desta pasta
+    return os.path.join(get_profile_cache_path(profile_name), HTTP_CACHE_DIR_NAME)
+
+def load_profile_settings(profile_name):
+    """Lê as preferências do perfil (dicionário vazio se ainda não existirem)."""
+    settings_path = os.path.join(get_profile_appdata_path(profile_name), PROFILE_SETTINGS_FILE_NAME)
+    try:
+        with open(settings_path, encoding="utf-8") as settings_file:
+            settings = json.load(settings_file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"AVISO: Preferências inválidas em {settings_path}: {e}")
+        return {}
+    return settings if isinstance(settings, dict) else {}
+
+def save_profile_settings(profile_name, settings):
+    settings_path = os.path.join(get_profile_appdata_path(profile_name), PROFILE_SETTINGS_FILE_NAME)
+    temp_path = settings_path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as settings_file:
+            json.dump(settings, settings_file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, settings_path)
+    except OSError as e:
+        print(f"AVISO: Não foi possível salvar as preferências em {settings_path}: {e}")
+
+def measure_directory(path):
+    """Soma (bytes, arquivos) de uma árvore de diretórios sem seguir links simbólicos."""
+    total_bytes = total_files = 0
+    pending = [path]
+    while pending:
+        current = pending.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total_bytes += entry.stat(follow_symlinks=False).st_size
+                        total_files += 1
+                except OSError:
+                    continue
+    return total_bytes, total_files
+
+def get_filter_lists_dir():
+    filters_path = os.path.join(get_app_base_data_dir(), FILTER_LISTS_DIR_NAME)
+    os.makedirs(filters_path, exist_ok=True)
+    return filters_path
+
 def get_guest_profile_base_temp_dir():
     temp_base_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.TempLocation)
     guest_temp_path = os.path.join(temp_base_dir, f"{APP_DATA_DIR_NAME}_guest_{os.getpid()}")
     os.makedirs(guest_temp_path, exist_ok=True)
     return guest_temp_path
 
+def get_process_rss_bytes(pid):
+    """Memória residente (RSS) de um processo lida de /proc. Retorna 0 se não estiver disponível."""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+# Threads sem dono (ex.: iniciadas por um diálogo) ficam referenciadas aqui até terminar,
+# para não serem destruídas ainda rodando quando quem as criou for fechado
+_background_threads = set()
+
+def start_background_thread(thread):
+    _background_threads.add(thread)
+    thread.finished.connect(lambda: _background_threads.discard(thread))
+    thread.start()
+    return thread
+
+# --- MEDIÇÃO DA INICIALIZAÇÃO (--startup-trace) ---
+def get_process_age_seconds():
+    """Há quanto tempo o processo existe, lido de /proc (None fora do Linux)."""
+    try:
+        with open("/proc/self/stat") as stat_file:
+            # O nome do processo pode ter espaços: os campos seguintes começam depois do ')'
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTrace:
+    """Registra o instante de cada fase da inicialização e imprime o detalhamento."""
+    def __init__(self):
+        self.enabled = False
+        self.reported = False
+        self.marks = []
+
+    def mark(self, phase):
+        if self.enabled and not self.reported:
+            self.marks.append((phase, time.perf_counter()))
+
+    def mark_once(self, phase):
+        if self.enabled and not self.reported and phase not in (name for name, _ in self.marks):
+            self.marks.append((phase, time.perf_counter()))
+
+    def start(self):
+        """Ativa o rastreamento já com as fases que aconteceram antes do main."""
+        self.enabled = True
+        process_age = get_process_age_seconds()
+        if process_age is not None:
+            # Tempo do interpretador antes do primeiro import do Qt
+            interpreter_start = time.perf_counter() - process_age
+            self.marks.append(("início do processo", interpreter_start))
+        self.marks.append(("interpretador Python e módulos padrão", STARTUP_TIME_ORIGIN))
+        self.marks.append(("QtCore/QtNetwork e instância já aberta", STARTUP_FORWARD_CHECKED))
+        self.marks.append(("importação do QtWidgets/QtWebEngine", STARTUP_QT_IMPORTED))
+
+    def report(self):
+        if not self.enabled or self.reported or not self.marks:
+            return
+        self.reported = True
+        origin = self.marks[0][1]
+        previous = origin
+        print("\nTempos de inicialização (--startup-trace):")
+        for phase, timestamp in self.marks[1:]:
+            print(f"  {phase:<40} +{(timestamp - previous) * 1000:8.1f} ms   {(timestamp - origin) * 1000:8.1f} ms")
+            previous = timestamp
+        print()
+
+startup_trace = StartupTrace()
+
+
+# --- MÉTRICAS (log JSON-lines e endpoint Prometheus) ---
+class Histogram:
+    """Histograma no formato do Prometheus: contagem por limite superior, soma e total."""
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # O último é o +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_metric_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """GET /metrics devolve as métricas no formato texto do Prometheus."""
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.recorder.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Sem uma linha no terminal a cada coleta
+
+
+class MetricsRecorder:
+    """Registra eventos estruturados (JSON-lines) e agrega as séries de METRIC_FAMILIES.
+
+    Pode ser chamado de qualquer thread: a CleanerThread registra as limpezas. Os
+    eventos passam por uma fila e quem grava o arquivo rotativo é a thread do
+    QueueListener, nunca a da interface. Sem start_log() os eventos são
+    descartados, mas as séries continuam sendo agregadas.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {} # (família, rótulos) -> número ou Histogram
+        self._logger = logging.getLogger(METRICS_LOGGER_NAME)
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._listener = None
+        self._http_server = None
+
+    def start_log(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_handler = RotatingFileHandler(path, maxBytes=METRICS_LOG_MAX_BYTES,
+                                           backupCount=METRICS_LOG_BACKUP_COUNT, encoding="utf-8", delay=True)
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        log_queue = queue.SimpleQueue()
+        self._logger.addHandler(QueueHandler(log_queue))
+        self._listener = QueueListener(log_queue, file_handler)
+        self._listener.start()
+
+    def start_http(self, port):
+        """Sobe o endpoint /metrics em localhost. Devolve False se a porta não puder ser usada."""
+        try:
+            server = http.server.ThreadingHTTPServer((METRICS_HTTP_HOST, port), MetricsRequestHandler)
+        except OSError as e:
+            print(f"AVISO: Endpoint de métricas indisponível na porta {port}: {e}")
+            return False
+        server.daemon_threads = True
+        server.recorder = self
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        self._http_server = server
+        print(f"Métricas em http://{METRICS_HTTP_HOST}:{server.server_address[1]}/metrics")
+        return True
+
+    def stop(self):
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+        if self._listener is not None:
+            self._listener.stop() # Grava o que ainda estiver na fila
+            self._listener = None
+
+    # --- Primitivas ---
+    def event(self, name, **fields):
+        if self._listener is None:
+            return
+        record = {"ts": round(time.time(), 3), "event": name}
+        record.update(fields)
+        self._logger.info(json.dumps(record, ensure_ascii=False))
+
+    def observe(self, family, value, **labels):
+        key = (family, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                histogram = self._series[key] = Histogram(METRIC_FAMILIES[family][2])
+            histogram.observe(value)
+
+    def increment(self, family, amount=1, **labels):
+        key = (family, tuple(sorted(labels.items())))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def set_gauge(self, family, value, **labels):
+        with self._lock:
+            self._series[(family, tuple(sorted(labels.items())))] = value
+
+    # --- Eventos do navegador ---
+    def record_navigation(self, profile, tab_id, host, commit_seconds, load_seconds, success):
+        result = "ok" if success else "erro"
+        self.observe("navegador_navigation_load_seconds", load_seconds, profile=profile, result=result)
+        if commit_seconds is not None:
+            self.observe("navegador_navigation_commit_seconds", commit_seconds, profile=profile)
+        self.increment("navegador_navigations_total", profile=profile, result=result)
+        self.event("navigation", profile=profile, tab=tab_id, host=host, result=result,
+                   commit_ms=None if commit_seconds is None else round(commit_seconds * 1000, 1),
+                   load_ms=round(load_seconds * 1000, 1))
+
+    def record_tab_count(self, profile, open_tabs, loaded_tabs):
+        self.set_gauge("navegador_open_tabs", open_tabs, profile=profile)
+        self.set_gauge("navegador_loaded_tabs", loaded_tabs, profile=profile)
+        self.event("tabs", profile=profile, open=open_tabs, loaded=loaded_tabs)
+
+    def record_window(self, action, profile, seconds, tabs):
+        """Abertura ("opened") ou fechamento ("closed") de uma janela de perfil."""
+        self.observe(f"navegador_window_{action}_seconds", seconds, profile=profile)
+        self.event(f"window_{action}", profile=profile, ms=round(seconds * 1000, 1), tabs=tabs)
+
+    def record_cleanup(self, seconds, removed_bytes, removed_files, failed):
+        self.observe("navegador_cleanup_seconds", seconds)
+        self.increment("navegador_cleanup_bytes_total", removed_bytes)
+        self.event("cleanup", seconds=round(seconds, 3), bytes=removed_bytes, files=removed_files, failed=failed)
+
+    # --- Exportação ---
+    def render_prometheus(self):
+        with self._lock:
+            snapshot = [(family, labels, value if not isinstance(value, Histogram) else
+                         (value.buckets, list(value.counts), value.sum, value.count))
+                        for (family, labels), value in self._series.items()]
+        lines = []
+        for family, (kind, help_text, _) in METRIC_FAMILIES.items():
+            series = [(labels, value) for name, labels, value in snapshot if name == family]
+            if not series:
+                continue
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            for labels, value in sorted(series):
+                if kind != "histogram":
+                    lines.append(f"{family}{format_metric_labels(labels)} {value}")
+                    continue
+                buckets, counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{family}_bucket{format_metric_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{family}_sum{format_metric_labels(labels)} {total!r}")
+                lines.append(f"{family}_count{format_metric_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRecorder()
+
+
+def get_process_cpu_ticks(pid):
+    """Tempo de CPU (usuário + sistema) do processo em ticks do relógio, lido de /proc. None se indisponível."""
+    try:
+        with open(f"/proc/{pid}/stat") as stat_file:
+            # O nome do processo pode ter espaços: os campos seguintes começam depois do ')'
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        return int(fields[11]) + int(fields[12])
+    except (OSError, ValueError, IndexError):
+        return None
+
 # --- CLASSE PARA EXCLUSÃO EM SEGUNDO PLANO ---
+def is_pid_running(pid):
+    """Só em POSIX: no Windows os.kill(pid, 0) encerraria o processo em vez de testá-lo."""
+    if os.name != "posix":
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True # Existe, mas é de outro usuário
+    return True
+
+def tombstone_directory(path):
+    """Renomeia o diretório para uma "lápide" (instantâneo); a exclusão real fica para depois."""
+    tombstone_path = os.path.join(os.path.dirname(path),
+                                  f"{GUEST_TOMBSTONE_PREFIX}{os.getpid()}_{time.monotonic_ns()}_{os.path.basename(path)}")
+    try:
+        os.rename(path, tombstone_path)
+    except OSError as e:
+        print(f"  AVISO: Não foi possível renomear {path} para exclusão: {e}")
+        return None
+    return tombstone_path
+
+def remove_tree_counting(path):
+    """Apaga uma árvore de baixo para cima. Retorna (bytes, arquivos, caminhos que falharam)."""
+    removed_bytes = removed_files = 0
+    failed = []
+    if not os.path.isdir(path) or os.path.islink(path):
+        try:
+            size = os.lstat(path).st_size
+            os.unlink(path)
+            return size, 1, failed
+        except FileNotFoundError:
+            return 0, 0, failed
+        except OSError:
+            return 0, 0, [path]
+
+    for dir_path, dir_names, file_names in os.walk(path, topdown=False):
+        for name in file_names:
+            file_path = os.path.join(dir_path, name)
+            try:
+                size = os.lstat(file_path).st_size
+                os.unlink(file_path)
+            except FileNotFoundError:
+                continue
+            except OSError:
+                failed.append(file_path)
+                continue
+            removed_bytes += size
+            removed_files += 1
+        for name in dir_names:
+            sub_path = os.path.join(dir_path, name)
+            try:
+                if os.path.islink(sub_path): # os.walk não segue links, mas os lista como diretórios
+                    os.unlink(sub_path)
+                else:
+                    os.rmdir(sub_path)
+            except FileNotFoundError:
+                continue
+            except OSError:
+                failed.append(sub_path)
+    try:
+        os.rmdir(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        failed.append(path)
+    return removed_bytes, removed_files, failed
+
+
 class CleanerThread(QThread):
-    def __init__(self, path_to_clean):
+    """Apaga diretórios (já renomeados para lápides) com um pool limitado de workers.
+
+    Só as entradas que falharam são tentadas de novo, até CLEANUP_MAX_RETRIES vezes.
+    """
+    cleanup_finished = pyqtSignal(object) # {"bytes", "files", "failed", "seconds"}
+
+    def __init__(self, paths_to_clean):
         super().__init__()
-        self.path_to_clean = path_to_clean
-        self.max_retries = 30
-        self.retry_delay = 1000
+        self.paths_to_clean = list(paths_to_clean)
+        self.max_retries = CLEANUP_MAX_RETRIES
+        self.retry_delay = CLEANUP_RETRY_DELAY_MS
 
     def run(self):
-        print(f"Iniciando limpeza em segundo plano para: {self.path_to_clean}")
-        for i in range(self.max_retries):
-            if not os.path.exists(self.path_to_clean):
-                print(f"Diretório temporário {self.path_to_clean} já não existe. Limpeza concluída (ou já foi feita).")
-                return
+        started = time.monotonic()
+        print(f"Iniciando limpeza em segundo plano de {len(self.paths_to_clean)} diretório(s).")
 
+        # Cada filho direto de cada lápide vira uma tarefa do pool; as lápides vazias saem no fim
+        jobs = []
+        for path in self.paths_to_clean:
             try:
-                shutil.rmtree(self.path_to_clean)
-                print(f"Dados do modo convidado apagados de: {self.path_to_clean}")
-                return
-            except OSError as e:
-                print(f"Tentativa {i+1}/{self.max_retries}: Erro ao apagar dados do modo convidado em {self.path_to_clean}: {e}")
-                if i < self.max_retries - 1:
-                    self.msleep(self.retry_delay)
-                else:
-                    print(f"Falha CRÍTICA e PERSISTENTE: Não foi possível apagar dados do modo convidado em {self.path_to_clean} após {self.max_retries} tentativas. Por favor, remova manualmente se desejar.")
+                with os.scandir(path) as entries:
+                    jobs.extend(entry.path for entry in entries)
+            except OSError:
+                continue
+
+        removed_bytes = removed_files = 0
+        failed = []
+        with ThreadPoolExecutor(max_workers=CLEANUP_MAX_WORKERS) as pool:
+            for job_bytes, job_files, job_failed in pool.map(remove_tree_counting, jobs):
+                removed_bytes += job_bytes
+                removed_files += job_files
+                failed.extend(job_failed)
+        for path in self.paths_to_clean:
+            failed.extend(remove_tree_counting(path)[2])
+
+        for attempt in range(self.max_retries):
+            if not failed:
+                break
+            print(f"Tentativa {attempt + 1}/{self.max_retries}: {len(failed)} entrada(s) ainda não apagada(s).")
+            self.msleep(self.retry_delay)
+            still_failed = []
+            for path in failed: # Na ordem em que falharam: arquivos antes dos diretórios que os contêm
+                job_bytes, job_files, job_failed = remove_tree_counting(path)
+                removed_bytes += job_bytes
+                removed_files += job_files
+                still_failed.extend(job_failed)
+            failed = still_failed
+
+        elapsed = time.monotonic() - started
+        print(f"Limpeza concluída: {removed_files} arquivo(s), {format_bytes(removed_bytes)} recuperados em {elapsed:.1f}s.")
+        if failed:
+            print(f"AVISO: {len(failed)} entrada(s) não puderam ser apagadas. Remova manualmente se desejar, por exemplo: {failed[0]}")
+        metrics.record_cleanup(elapsed, removed_bytes, removed_files, len(failed))
+        self.cleanup_finished.emit({"bytes": removed_bytes, "files": removed_files, "failed": failed, "seconds": elapsed})
 
 def clean_guest_profile_data_async(path):
     if os.path.exists(path) and os.path.isdir(path):
-        cleaner = CleanerThread(path)
-        cleaner.start()
-        return cleaner
+        # Renomeia primeiro: se a limpeza não terminar agora, a próxima inicialização a encontra
+        tombstone_path = tombstone_directory(path) or path
+        return start_background_thread(CleanerThread([tombstone_path]))
     else:
         print(f"Caminho para limpeza não é um diretório ou não existe: {path}")
         return None
 
-def clean_all_old_guest_data_on_startup():
+def tombstone_old_guest_data_on_startup():
+    """Renomeia dados de convidados de sessões anteriores para lápides. Só renomeia: é instantâneo."""
     temp_base_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.TempLocation)
     guest_dir_pattern = os.path.join(temp_base_dir, f"{APP_DATA_DIR_NAME}_guest_*")
-    
-    print("\nVerificando e limpando dados de convidados anteriores na inicialização...")
-    
-    found_old_dirs = False
+
     for path in glob.glob(guest_dir_pattern):
         current_session_pid_match = re.search(r'_guest_(\d+)$', path)
-        if current_session_pid_match and int(current_session_pid_match.group(1)) == os.getpid():
-            print(f"  Pulando diretório da sessão atual: {path}")
+        if current_session_pid_match:
+            pid = int(current_session_pid_match.group(1))
+            # Diretório desta sessão ou de outra instância ainda aberta
+            if pid == os.getpid() or is_pid_running(pid):
+                continue
+        if os.path.isdir(path):
+            tombstone_directory(path)
+
+def clean_guest_tombstones_async():
+    """Apaga em segundo plano todas as lápides pendentes (desta e de inicializações anteriores)."""
+    temp_base_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.TempLocation)
+    tombstones = [path for path in glob.glob(os.path.join(temp_base_dir, f"{GUEST_TOMBSTONE_PREFIX}*"))
+                  if os.path.isdir(path)]
+    if not tombstones:
+        return None
+    return start_background_thread(CleanerThread(tombstones))
+
+def wait_for_background_threads(timeout_ms=CLEANUP_EXIT_WAIT_MS):
+    """Dá um tempo para as threads em segundo plano terminarem antes de o processo sair."""
+    deadline = time.monotonic() + timeout_ms / 1000
+    for thread in list(_background_threads):
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0 or not thread.wait(remaining_ms):
+            print("AVISO: Limpeza em segundo plano interrompida; será retomada na próxima inicialização.")
+            break
+
+
+# --- INSTÂNCIA ÚNICA ---
+# instance_server_name e forward_to_running_instance ficam na entrada rápida, no topo do módulo
+def is_profile_open_elsewhere(profile_name):
+    """True se outro processo tem uma janela desse perfil (o servidor local dela responde)."""
+    socket = QLocalSocket()
+    socket.connectToServer(instance_server_name(profile_name))
+    connected = socket.waitForConnected(INSTANCE_CONNECT_TIMEOUT_MS)
+    socket.abort()
+    return connected
+
+
+class SingleInstanceServer(QObject):
+    """Escuta num socket local e repassa as URLs enviadas por novas invocações.
+
+    Com profile_name é o servidor de uma janela; sem ele é o da instância
+    principal, que atende quem não disse qual perfil usar ou pediu um perfil
+    ainda sem janela. handler(perfil, urls) decide o que fazer.
+    """
+    def __init__(self, handler, profile_name=None, parent=None):
+        super().__init__(parent)
+        self.handler = handler
+        self.servers = []
+        self._buffers = {}
+        self._listen(instance_server_name(profile_name), quiet=profile_name is None)
+
+    def _listen(self, name, quiet=False):
+        server = QLocalServer(self)
+        server.setSocketOptions(QLocalServer.UserAccessOption)
+        if not server.listen(name):
+            if server.serverError() != QAbstractSocket.AddressInUseError:
+                print(f"AVISO: Não foi possível abrir o servidor de instância única '{name}': {server.errorString()}")
+                return False
+            # Socket velho de uma instância que caiu: se ninguém responde, pode ser removido
+            probe = QLocalSocket()
+            probe.connectToServer(name)
+            if probe.waitForConnected(INSTANCE_CONNECT_TIMEOUT_MS):
+                probe.disconnectFromServer()
+                if not quiet:
+                    print(f"AVISO: Outra instância já atende '{name}'.")
+                return False
+            QLocalServer.removeServer(name)
+            if not server.listen(name):
+                print(f"AVISO: Não foi possível abrir o servidor de instância única '{name}': {server.errorString()}")
+                return False
+        server.newConnection.connect(self._accept_connections)
+        self.servers.append(server)
+        return True
+
+    def _accept_connections(self):
+        server = self.sender()
+        while server.hasPendingConnections():
+            socket = server.nextPendingConnection()
+            self._buffers[socket] = b""
+            socket.readyRead.connect(self._read_message)
+            socket.disconnected.connect(self._forget_socket)
+
+    def _forget_socket(self):
+        socket = self.sender()
+        self._buffers.pop(socket, None)
+        socket.deleteLater()
+
+    def _read_message(self):
+        socket = self.sender()
+        buffer = self._buffers.get(socket, b"") + bytes(socket.readAll())
+        if b"\n" not in buffer:
+            self._buffers[socket] = buffer
+            return
+        line = buffer.split(b"\n", 1)[0]
+        self._buffers[socket] = b""
+        try:
+            message = json.loads(line.decode("utf-8"))
+            urls = [url for url in message.get("urls", []) if isinstance(url, str) and url]
+            profile_name = message.get("profile")
+            if not isinstance(profile_name, str):
+                profile_name = None
+        except (ValueError, AttributeError):
+            socket.write(b"error\n")
+            socket.disconnectFromServer()
+            return
+        socket.write(b"ok\n")
+        socket.flush()
+        socket.disconnectFromServer()
+        self.handler(profile_name, urls)
+
+
+# --- BLOQUEADOR DE CONTEÚDO ---
+# FilterEngine e o parser das listas EasyList ficam em navegador_nucleo
+REQUEST_RESOURCE_TYPE_NAMES = {
+    QWebEngineUrlRequestInfo.ResourceTypeMainFrame: "document",
+    QWebEngineUrlRequestInfo.ResourceTypeSubFrame: "subdocument",
+    QWebEngineUrlRequestInfo.ResourceTypeStylesheet: "stylesheet",
+    QWebEngineUrlRequestInfo.ResourceTypeScript: "script",
+    QWebEngineUrlRequestInfo.ResourceTypeImage: "image",
+    QWebEngineUrlRequestInfo.ResourceTypeFontResource: "font",
+    QWebEngineUrlRequestInfo.ResourceTypeObject: "object",
+    QWebEngineUrlRequestInfo.ResourceTypeMedia: "media",
+    QWebEngineUrlRequestInfo.ResourceTypeXhr: "xmlhttprequest",
+    QWebEngineUrlRequestInfo.ResourceTypePing: "ping",
+}
+
+
+def filter_lists_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            info = os.stat(path)
+        except OSError:
             continue
+        signature.append((os.path.basename(path), info.st_size, info.st_mtime_ns))
+    return [FILTER_ENGINE_VERSION] + sorted(signature)
 
-        if os.path.isdir(path):
-            found_old_dirs = True
-            print(f"  Tentando limpar diretório antigo: {path}")
+def load_filter_engine():
+    """Carrega as listas de filtros, usando a versão compilada em disco se nada mudou."""
+    filters_dir = get_filter_lists_dir()
+    list_paths = sorted(glob.glob(os.path.join(filters_dir, "*.txt")))
+    signature = filter_lists_signature(list_paths)
+    cache_path = os.path.join(get_app_base_data_dir(), FILTER_CACHE_FILE_NAME)
+
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cached_signature, engine = pickle.load(cache_file)
+        if cached_signature == signature:
+            return engine
+    except FileNotFoundError:
+        pass
+    except Exception as e: # Cache corrompido ou de outra versão: recompila
+        print(f"AVISO: Cache das listas de filtros ignorado: {e}")
+
+    engine = FilterEngine()
+    for path in list_paths:
+        try:
+            with open(path, encoding="utf-8", errors="replace") as list_file:
+                for line in list_file:
+                    engine.add_line(line)
+        except OSError as e:
+            print(f"AVISO: Não foi possível ler a lista de filtros {path}: {e}")
+
+    temp_path = cache_path + ".tmp"
+    try:
+        with open(temp_path, "wb") as cache_file:
+            pickle.dump((signature, engine), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"AVISO: Não foi possível salvar o cache das listas de filtros: {e}")
+    return engine
+
+
+# Um motor por processo, compartilhado pelos interceptadores de todos os perfis e páginas
+_filter_engine = None
+_filter_engine_loader = None
+# Cada página tem o próprio interceptador (e o próprio contador) desde o Qt 5.13
+PAGE_REQUEST_INTERCEPTORS = hasattr(QWebEnginePage, "setUrlRequestInterceptor")
+
+
+class FilterEngineLoaderThread(QThread):
+    """Carrega as listas e publica o motor na variável do módulo, sem depender de quem pediu."""
+    def run(self):
+        global _filter_engine
+        started = time.monotonic()
+        engine = load_filter_engine()
+        if engine.rule_count:
+            print(f"Bloqueador de conteúdo: {engine.rule_count} regra(s) carregada(s) em {time.monotonic() - started:.2f}s.")
+        _filter_engine = engine # Os interceptadores leem a variável a cada requisição
+
+def start_filter_engine_loader():
+    """Começa a carregar as listas de filtros (uma vez por processo). Até terminar, nada é bloqueado."""
+    global _filter_engine_loader
+    if _filter_engine is None and _filter_engine_loader is None:
+        _filter_engine_loader = start_background_thread(FilterEngineLoaderThread())
+
+
+class ContentBlocker(QWebEngineUrlRequestInterceptor):
+    """Bloqueia as requisições que casam com as listas de filtros (motor global do processo).
+
+    No Qt >= 5.13 cada BrowserPage instala o seu (QWebEnginePage.setUrlRequestInterceptor)
+    e blocked_count é o contador daquela aba, zerado a cada navegação principal.
+    Em versões antigas um só fica no perfil (install) e os bloqueios são contados
+    pela URL do documento principal (blocked_count_for).
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.blocked_count = 0
+        self.blocked_by_page = OrderedDict() # Só no interceptador do perfil
+        self.per_profile = False
+
+    def install(self, web_profile):
+        self.per_profile = True
+        if hasattr(web_profile, "setUrlRequestInterceptor"): # Qt >= 5.13
+            web_profile.setUrlRequestInterceptor(self)
+        else:
+            web_profile.setRequestInterceptor(self)
+
+    def interceptRequest(self, info):
+        engine = _filter_engine
+        if engine is None:
+            return
+        resource_type = REQUEST_RESOURCE_TYPE_NAMES.get(info.resourceType(), "other")
+        request_url = info.requestUrl()
+        if resource_type == "document":
+            # Nova navegação principal: o contador desta página recomeça
+            if self.per_profile:
+                self.blocked_by_page.pop(request_url.toString(QUrl.RemoveFragment), None)
+            else:
+                self.blocked_count = 0
+            return
+        first_party_url = info.firstPartyUrl()
+        if not engine.should_block(request_url.toString(), request_url.host(), first_party_url.host(), resource_type):
+            return
+        info.block(True)
+        if not self.per_profile:
+            self.blocked_count += 1
+            return
+        page_key = first_party_url.toString(QUrl.RemoveFragment)
+        self.blocked_by_page[page_key] = self.blocked_by_page.pop(page_key, 0) + 1
+        if len(self.blocked_by_page) > BLOCKED_COUNTER_MAX_PAGES:
+            self.blocked_by_page.popitem(last=False)
+
+    def blocked_count_for(self, qurl):
+        return self.blocked_by_page.get(qurl.toString(QUrl.RemoveFragment), 0)
+
+
+# --- DOWNLOADS ---
+# ParallelDownload (o download em partes em si, sem Qt) fica em navegador_nucleo
+class DownloadThread(QThread):
+    """Roda um ParallelDownload fora da thread da interface."""
+    download_finished = pyqtSignal(bool, str) # (completo, mensagem de erro)
+
+    def __init__(self, download):
+        super().__init__()
+        self.download = download
+
+    def run(self):
+        try:
+            completed = self.download.run()
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self.download_finished.emit(False, str(e))
+            return
+        self.download_finished.emit(completed, "")
+
+
+class DownloadJob(QObject):
+    """Um download nosso na lista do gerenciador: pausar, retomar e cancelar."""
+    def __init__(self, manager, url, target_path, referrer=None):
+        super().__init__(manager)
+        self.manager = manager
+        self.url = url
+        self.target_path = target_path
+        self.referrer = referrer
+        self.page = None # Página que pediu o download (para devolver ao motor se preciso)
+        self.expected_type = None # Tipo e nome que o motor recebeu; None em downloads retomados de outra sessão
+        self.expected_name = None
+        self.download = None
+        self.thread = None
+        self.state = "Pausado"
+        self._cancel_requested = False
+
+    def file_name(self):
+        return os.path.basename(self.target_path)
+
+    def received_bytes(self):
+        return self.download.downloaded_bytes() if self.download else 0
+
+    def total_bytes(self):
+        return self.download.total_bytes if self.download else None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.isRunning()
+
+    def start(self):
+        if self.is_running() or self.state == "Concluído":
+            return
+        self._cancel_requested = False
+        # Cabeçalhos montados agora: os cookies da sessão podem ter mudado desde a pausa
+        headers = self.manager.request_headers(self.url, self.referrer)
+        self.download = ParallelDownload(self.url, self.target_path, headers,
+                                         expected_type=self.expected_type, expected_name=self.expected_name)
+        self.thread = DownloadThread(self.download)
+        self.thread.download_finished.connect(self._finished)
+        self.state = "Baixando"
+        start_background_thread(self.thread)
+
+    def pause(self):
+        if self.is_running():
+            self.state = "Pausando"
+            self.download.stop()
+
+    def resume(self):
+        self.start()
+
+    def cancel(self):
+        if self.is_running():
+            self._cancel_requested = True
+            self.download.stop()
+        else:
+            self._remove_partial_files()
+            self.state = "Cancelado"
+
+    def _remove_partial_files(self):
+        for path in (self.target_path + DOWNLOAD_PART_SUFFIX, self.target_path + DOWNLOAD_STATE_SUFFIX):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _finished(self, completed, error):
+        if self._cancel_requested:
+            self._remove_partial_files()
+            self.state = "Cancelado"
+        elif completed:
+            self.state = "Concluído"
+            print(f"Download concluído: {self.target_path}")
+        elif error:
+            self.state = f"Erro: {error}"
+            print(f"AVISO: Download de {self.url} falhou: {error}")
+            # Nem o primeiro pedido deu certo, ou a resposta não era o arquivo: o motor baixa do jeito dele
+            if not self.download.probed:
+                self.manager.fall_back_to_engine(self)
+        else:
+            self.state = "Pausado"
+
+
+class EngineDownloadJob(QObject):
+    """Download feito pelo próprio QtWebEngine (URLs que não são http/https ou fallback)."""
+    def __init__(self, manager, item):
+        super().__init__(manager)
+        self.item = item
+        self.url = item.url().toString()
+        self.target_path = item.path()
+
+    def file_name(self):
+        return os.path.basename(self.target_path)
+
+    def received_bytes(self):
+        return self.item.receivedBytes()
+
+    def total_bytes(self):
+        total = self.item.totalBytes()
+        return total if total >= 0 else None
+
+    def is_running(self):
+        return not self.item.isFinished() and not (hasattr(self.item, "isPaused") and self.item.isPaused())
+
+    @property
+    def state(self):
+        item_state = self.item.state()
+        if item_state == QWebEngineDownloadItem.DownloadCompleted:
+            return "Concluído"
+        if item_state == QWebEngineDownloadItem.DownloadCancelled:
+            return "Cancelado"
+        if item_state == QWebEngineDownloadItem.DownloadInterrupted:
+            return f"Erro: {self.item.interruptReasonString()}"
+        if hasattr(self.item, "isPaused") and self.item.isPaused():
+            return "Pausado"
+        return "Baixando"
+
+    def pause(self):
+        if hasattr(self.item, "pause"): # Qt >= 5.10
+            self.item.pause()
+
+    def resume(self):
+        if hasattr(self.item, "resume"):
+            self.item.resume()
+
+    def cancel(self):
+        self.item.cancel()
+
+
+class ProfileCookieJar(QObject):
+    """Cópia dos cookies do perfil (QWebEngineCookieStore), para os downloads feitos fora do motor.
+
+    O motor não deixa consultar os cookies de uma URL: o jeito é acompanhar os
+    sinais cookieAdded/cookieRemoved (loadAllCookies traz os já gravados em disco).
+    """
+    def __init__(self, cookie_store, parent=None):
+        super().__init__(parent)
+        self._cookies = {} # (nome, domínio, caminho) -> QNetworkCookie
+        cookie_store.cookieAdded.connect(self._cookie_added)
+        cookie_store.cookieRemoved.connect(self._cookie_removed)
+        cookie_store.loadAllCookies()
+
+    @staticmethod
+    def _key(cookie):
+        return bytes(cookie.name()), cookie.domain().lower(), cookie.path() or "/"
+
+    def _cookie_added(self, cookie):
+        self._cookies[self._key(cookie)] = cookie
+
+    def _cookie_removed(self, cookie):
+        self._cookies.pop(self._key(cookie), None)
+
+    def header_for(self, url):
+        """Valor do cabeçalho Cookie para a URL (texto), ou "" se nenhum cookie vale para ela."""
+        qurl = QUrl(url)
+        host = qurl.host().lower()
+        path = qurl.path() or "/"
+        now = time.time()
+        matches = []
+        for cookie in self._cookies.values():
+            domain = cookie.domain().lower()
+            if domain.startswith("."): # Cookie de domínio: vale para os subdomínios
+                if host != domain[1:] and not host.endswith(domain):
+                    continue
+            elif host != domain:
+                continue
+            cookie_path = cookie.path() or "/"
+            if path != cookie_path and not path.startswith(cookie_path.rstrip("/") + "/"):
+                continue
+            if cookie.isSecure() and qurl.scheme() != "https":
+                continue
+            if not cookie.isSessionCookie() and cookie.expirationDate().toSecsSinceEpoch() <= now:
+                continue
+            matches.append(cookie)
+        matches.sort(key=lambda cookie: len(cookie.path() or "/"), reverse=True) # Caminhos mais longos primeiro
+        return "; ".join(f"{bytes(cookie.name()).decode('latin-1')}={bytes(cookie.value()).decode('latin-1')}"
+                         for cookie in matches)
+
+
+class DownloadManager(QObject):
+    """Atende o downloadRequested do perfil: http/https viram downloads paralelos e retomáveis.
+
+    Os pedidos levam os cookies do perfil (ProfileCookieJar) e o Referer da página.
+    Ficam com o motor: o que não é http/https (blob:, data:, ...), respostas a
+    formulários (podem ser POST, que não dá para repetir) e tudo cuja primeira
+    resposta não bate com o que o motor recebeu. Downloads interrompidos numa sessão
+    anterior (um .part.json na pasta de downloads) aparecem pausados, prontos para retomar.
+    """
+    def __init__(self, web_profile, parent=None):
+        super().__init__(parent)
+        self.web_profile = web_profile
+        self.cookies = ProfileCookieJar(web_profile.cookieStore(), self)
+        self.jobs = []
+        self._engine_urls = set() # URLs devolvidas ao motor: o próximo pedido delas é aceito como está
+        self._speed_samples = {} # job -> (bytes, instante) da última amostra
+        web_profile.downloadRequested.connect(self.download_requested)
+        self.find_interrupted_downloads()
+
+    def download_directory(self):
+        if hasattr(self.web_profile, "downloadPath"): # Qt >= 5.13
+            return self.web_profile.downloadPath()
+        return QStandardPaths.writableLocation(QStandardPaths.StandardLocation.DownloadLocation)
+
+    def find_interrupted_downloads(self):
+        for state_path in glob.glob(os.path.join(glob.escape(self.download_directory()), f"*{DOWNLOAD_STATE_SUFFIX}")):
+            try:
+                with open(state_path, encoding="utf-8") as state_file:
+                    url = json.load(state_file)["url"]
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+            target_path = state_path[:-len(DOWNLOAD_STATE_SUFFIX)]
+            self.jobs.append(DownloadJob(self, url, target_path))
+
+    def request_headers(self, url, referrer=None):
+        headers = {"User-Agent": self.web_profile.httpUserAgent()}
+        if referrer:
+            headers["Referer"] = referrer
+        cookie_header = self.cookies.header_for(url)
+        if cookie_header:
+            headers["Cookie"] = cookie_header
+        return headers
+
+    def download_requested(self, item):
+        url = item.url()
+        url_text = url.toString()
+        page = item.page() if hasattr(item, "page") else None # Qt >= 5.12
+        # Resposta a um formulário: o pedido pode ter sido um POST, que repetido como GET traria outra coisa
+        from_form = getattr(page, "last_navigation_was_form", False)
+        if url.scheme() not in ("http", "https") or url_text in self._engine_urls or from_form:
+            self._engine_urls.discard(url_text)
+            item.accept()
+            self.jobs.append(EngineDownloadJob(self, item))
+            return
+
+        # Não aceitar o item faz o motor cancelá-lo; o download segue por nossa conta
+        target_path = item.path()
+        referrer = page.url().toString() if page is not None else None
+        job = None
+        for candidate in self.jobs:
+            if isinstance(candidate, DownloadJob) and candidate.target_path == target_path \
+                    and not candidate.is_running() and candidate.state != "Concluído":
+                job = candidate # Mesmo destino de um download interrompido: retoma
+                job.url, job.referrer = url_text, referrer
+                break
+        if job is None:
+            job = DownloadJob(self, url_text, target_path, referrer)
+            self.jobs.append(job)
+        job.page = page
+        job.expected_type = item.mimeType() or None
+        if hasattr(item, "suggestedFileName"): # Qt >= 5.14
+            job.expected_name = item.suggestedFileName() or None
+        job.start()
+
+    def fall_back_to_engine(self, job):
+        page = getattr(job, "page", None)
+        if page is None or not hasattr(page, "download"): # Qt >= 5.11
+            return
+        self.jobs.remove(job)
+        self._engine_urls.add(job.url)
+        page.download(QUrl(job.url), job.target_path)
+
+    def snapshot(self):
+        """Lista de dicts com job, nome, baixados, total, velocidade (bytes/s) e estado."""
+        now = time.monotonic()
+        samples = {}
+        snapshot = []
+        for job in self.jobs:
+            received = job.received_bytes()
+            previous = self._speed_samples.get(job)
+            speed = 0.0
+            if job.is_running() and previous and now > previous[1]:
+                speed = max(received - previous[0], 0) / (now - previous[1])
+            samples[job] = (received, now)
+            snapshot.append({"job": job, "name": job.file_name(), "received": received, "total": job.total_bytes(),
+                             "speed": speed, "state": job.state})
+        self._speed_samples = samples
+        return snapshot
+
+    def shutdown(self):
+        """Pausa os downloads ao fechar a janela; o estado em disco permite retomar depois."""
+        for job in self.jobs:
+            if isinstance(job, DownloadJob):
+                job.pause()
+
+
+class DownloadsDialog(QDialog):
+    """Painel de downloads com progresso e velocidade, atualizado a cada DOWNLOAD_PANEL_REFRESH_MS."""
+    COLUMNS = ["Arquivo", "Progresso", "Velocidade", "Estado"]
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.setWindowTitle("Downloads")
+        self.setGeometry(300, 300, 700, 300)
+
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        button_layout = QHBoxLayout()
+        for text, slot in (("Pausar", self.pause_selected), ("Retomar", self.resume_selected),
+                           ("Cancelar", self.cancel_selected)):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            button_layout.addWidget(button)
+        layout.addLayout(button_layout)
+
+        self._jobs = []
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(DOWNLOAD_PANEL_REFRESH_MS)
+        self.refresh()
+
+    def selected_jobs(self):
+        return [self._jobs[index.row()] for index in self.table.selectionModel().selectedRows()
+                if index.row() < len(self._jobs)]
+
+    def refresh(self):
+        if not self.isVisible() and self.table.rowCount():
+            return
+        snapshot = self.manager.snapshot()
+        self._jobs = [entry["job"] for entry in snapshot]
+        self.table.setRowCount(len(snapshot))
+        total_speed = 0
+        for row, entry in enumerate(snapshot):
+            if entry["total"]:
+                progress = f"{format_bytes(entry['received'])} de {format_bytes(entry['total'])} " \
+                           f"({entry['received'] / entry['total']:.0%})"
+            else:
+                progress = format_bytes(entry["received"])
+            speed = f"{format_bytes(entry['speed'])}/s" if entry["speed"] else ""
+            total_speed += entry["speed"]
+            for column, value in enumerate((entry["name"], progress, speed, entry["state"])):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        running = sum(1 for job in self._jobs if job.is_running())
+        self.summary_label.setText(f"{running} download(s) ativo(s), {format_bytes(total_speed)}/s no total")
+
+    def pause_selected(self):
+        for job in self.selected_jobs():
+            job.pause()
+        self.refresh()
+
+    def resume_selected(self):
+        for job in self.selected_jobs():
+            job.resume()
+        self.refresh()
+
+    def cancel_selected(self):
+        for job in self.selected_jobs():
+            job.cancel()
+        self.refresh()
+
+
+# --- LAYOUT DO PERFIL E USO DE DISCO ---
+def is_appdata_file_name(name):
+    """Arquivos do próprio navegador (não do motor), incluindo -wal/-shm do SQLite e temporários."""
+    return any(name == base or name.startswith(base + "-") or name == base + ".tmp" for base in PROFILE_APPDATA_FILES)
+
+def migrate_profile_layout(profile_path):
+    """Move, no lugar, o conteúdo de um perfil antigo (tudo numa pasta só) para cache/, storage/ e appdata/.
+
+    Só renomeia dentro do mesmo diretório, então é instantâneo. Retorna False se algo não pôde ser movido.
+    """
+    subdirs = {name: os.path.join(profile_path, name)
+               for name in (PROFILE_CACHE_DIR_NAME, PROFILE_STORAGE_DIR_NAME, PROFILE_APPDATA_DIR_NAME)}
+    for path in subdirs.values():
+        os.makedirs(path, exist_ok=True)
+
+    moved = 0
+    complete = True
+    with os.scandir(profile_path) as entries:
+        for entry in list(entries):
+            if entry.name in subdirs or entry.name == PROFILE_LAYOUT_MARKER_NAME:
+                continue
+            if entry.name == HTTP_CACHE_DIR_NAME:
+                target_dir = subdirs[PROFILE_CACHE_DIR_NAME]
+            elif is_appdata_file_name(entry.name):
+                target_dir = subdirs[PROFILE_APPDATA_DIR_NAME]
+            else:
+                target_dir = subdirs[PROFILE_STORAGE_DIR_NAME] # Cookies, Local Storage, IndexedDB...
             try:
-                shutil.rmtree(path)
-                print(f"  Diretório antigo apagado com sucesso: {path}")
+                os.rename(entry.path, os.path.join(target_dir, entry.name))
+                moved += 1
             except OSError as e:
-                print(f"  AVISO: Não foi possível apagar diretório antigo {path}: {e}")
-    
-    if not found_old_dirs:
-        print("  Nenhum dado de convidado antigo encontrado para limpeza.")
-    print("Fim da verificação de limpeza na inicialização.\n")
+                print(f"AVISO: Não foi possível mover {entry.path} para {target_dir}: {e}")
+                complete = False
+    if moved:
+        print(f"Perfil migrado para o layout cache/storage/appdata: {moved} item(ns) movido(s) em {profile_path}.")
+    return complete
+
+_profiles_with_current_layout = set()
+
+def ensure_profile_layout(profile_name):
+    """Garante que o perfil usa o layout atual e devolve a pasta dele.
+
+    O marcador é gravado só depois de uma migração completa: se ela for
+    interrompida, a próxima chamada continua de onde parou.
+    """
+    profile_path = get_profile_data_path(profile_name)
+    if profile_name in _profiles_with_current_layout:
+        return profile_path
+    marker_path = os.path.join(profile_path, PROFILE_LAYOUT_MARKER_NAME)
+    try:
+        with open(marker_path, encoding="utf-8") as marker_file:
+            version = int(marker_file.read().strip() or 0)
+    except (OSError, ValueError):
+        version = 0
+    if version < PROFILE_LAYOUT_VERSION:
+        if not migrate_profile_layout(profile_path):
+            return profile_path
+        try:
+            with open(marker_path, "w", encoding="utf-8") as marker_file:
+                marker_file.write(str(PROFILE_LAYOUT_VERSION))
+        except OSError as e:
+            print(f"AVISO: Não foi possível gravar o marcador de layout em {marker_path}: {e}")
+    _profiles_with_current_layout.add(profile_name)
+    return profile_path
+
+def get_profile_cache_path(profile_name):
+    """cachePath do QWebEngineProfile: só cache, pode ser apagado sem perder nada do usuário."""
+    return os.path.join(ensure_profile_layout(profile_name), PROFILE_CACHE_DIR_NAME)
+
+def get_profile_storage_path(profile_name):
+    """persistentStoragePath do QWebEngineProfile: cookies, LocalStorage, IndexedDB..."""
+    return os.path.join(ensure_profile_layout(profile_name), PROFILE_STORAGE_DIR_NAME)
+
+def get_profile_appdata_path(profile_name):
+    """Dados do próprio navegador: preferências, histórico, favoritos, sessão."""
+    return os.path.join(ensure_profile_layout(profile_name), PROFILE_APPDATA_DIR_NAME)
+
+
+class IncrementalDiskUsage:
+    """Mede árvores de diretórios reaproveitando os diretórios cujo mtime não mudou.
+
+    Criar, apagar ou renomear uma entrada muda o mtime do diretório que a contém;
+    arquivos que só crescem no lugar (ex.: um banco SQLite) são remedidos quando
+    o diretório deles mudar. Diretórios modificados há menos de
+    DISK_USAGE_RACY_SECONDS não entram no cache (poderiam mudar no mesmo "tique").
+    """
+    def __init__(self, entries=None):
+        self.entries = entries or {} # caminho -> [mtime_ns, bytes dos arquivos, nº de arquivos, subdiretórios]
+        self.reused = 0
+        self.scanned = 0
+        self._seen = set()
+
+    def measure(self, root):
+        """(bytes, arquivos) da árvore em root, sem seguir links simbólicos."""
+        total_bytes = total_files = 0
+        racy_after = time.time_ns() - int(DISK_USAGE_RACY_SECONDS * 1e9)
+        pending = [root]
+        while pending:
+            path = pending.pop()
+            try:
+                mtime = os.stat(path, follow_symlinks=False).st_mtime_ns
+            except OSError:
+                continue
+            cached = self.entries.get(path)
+            if cached and cached[0] == mtime:
+                _, dir_bytes, dir_files, subdirs = cached
+                self.reused += 1
+            else:
+                dir_bytes = dir_files = 0
+                subdirs = []
+                try:
+                    with os.scandir(path) as scanner:
+                        for entry in scanner:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    subdirs.append(entry.name)
+                                elif entry.is_file(follow_symlinks=False):
+                                    dir_bytes += entry.stat(follow_symlinks=False).st_size
+                                    dir_files += 1
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                self.scanned += 1
+                if mtime < racy_after:
+                    self.entries[path] = [mtime, dir_bytes, dir_files, subdirs]
+                else:
+                    self.entries.pop(path, None)
+            self._seen.add(path)
+            total_bytes += dir_bytes
+            total_files += dir_files
+            pending.extend(os.path.join(path, name) for name in subdirs)
+        return total_bytes, total_files
+
+    def prune(self):
+        """Esquece os diretórios que não apareceram nas medições desde a última poda."""
+        self.entries = {path: entry for path, entry in self.entries.items() if path in self._seen}
+        self._seen = set()
+
+
+class ProfileDiskUsageThread(QThread):
+    """Mede cache/, storage/ e appdata/ de cada perfil fora da thread da interface.
+
+    O cache de mtimes fica em appdata/DISK_USAGE_CACHE_FILE_NAME (caminhos
+    relativos ao perfil), então até a primeira varredura de uma nova execução é incremental.
+    """
+    usage_ready = pyqtSignal(str, object) # (perfil, {"cache", "storage", "appdata", "files", "reused", "scanned"})
+
+    def __init__(self, profile_names):
+        super().__init__()
+        self.profile_names = list(profile_names)
+        for profile_name in self.profile_names:
+            ensure_profile_layout(profile_name) # Migra na thread da interface: nunca duas ao mesmo tempo
+
+    def run(self):
+        for profile_name in self.profile_names:
+            profile_path = get_profile_data_path(profile_name) # Já migrado por quem criou a thread
+            cache_file_path = os.path.join(profile_path, PROFILE_APPDATA_DIR_NAME, DISK_USAGE_CACHE_FILE_NAME)
+            usage = IncrementalDiskUsage(self._load_entries(cache_file_path, profile_path))
+            result = {"files": 0}
+            for category in (PROFILE_CACHE_DIR_NAME, PROFILE_STORAGE_DIR_NAME, PROFILE_APPDATA_DIR_NAME):
+                category_bytes, category_files = usage.measure(os.path.join(profile_path, category))
+                result[category] = category_bytes
+                result["files"] += category_files
+            usage.prune()
+            self._save_entries(cache_file_path, profile_path, usage.entries)
+            result["reused"], result["scanned"] = usage.reused, usage.scanned
+            self.usage_ready.emit(profile_name, result)
+
+    def _load_entries(self, cache_file_path, profile_path):
+        try:
+            with open(cache_file_path, encoding="utf-8") as cache_file:
+                saved = json.load(cache_file)
+            return {os.path.join(profile_path, relative): entry for relative, entry in saved["entries"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}
+
+    def _save_entries(self, cache_file_path, profile_path, entries):
+        saved = {"entries": {os.path.relpath(path, profile_path): entry for path, entry in entries.items()}}
+        temp_path = cache_file_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump(saved, cache_file)
+            os.replace(temp_path, cache_file_path)
+        except OSError as e:
+            print(f"AVISO: Não foi possível salvar o cache de uso de disco em {cache_file_path}: {e}")
+
+
+# --- OPERAÇÕES DE PERFIL EM SEGUNDO PLANO ---
+def profile_temp_path(profile_name):
+    """Pasta oculta onde um clone/importação é montado antes de aparecer na lista de perfis."""
+    return os.path.join(get_profiles_data_dir(),
+                        f"{PROFILE_TEMP_PREFIX}{os.getpid()}_{time.monotonic_ns()}_{profile_name}")
+
+def publish_profile_dir(temp_path, profile_name):
+    """Renomeia a pasta montada para o nome final: o perfil aparece inteiro ou não aparece."""
+    os.makedirs(temp_path, exist_ok=True) # Perfil vazio não criou nenhuma pasta
+    target_path = os.path.join(get_profiles_data_dir(), profile_name)
+    if os.path.exists(target_path):
+        raise FileExistsError(f"Já existe um perfil chamado '{profile_name}'.")
+    os.rename(temp_path, target_path)
+
+def trash_profile_dir(profile_name):
+    """Esconde o perfil renomeando a pasta (instantâneo); quem apaga de fato é o ProfileJobThread."""
+    profile_path = os.path.join(get_profiles_data_dir(), profile_name)
+    trash_path = os.path.join(get_profiles_data_dir(), f"{PROFILE_TRASH_PREFIX}{time.monotonic_ns()}_{profile_name}")
+    os.rename(profile_path, trash_path)
+    _profiles_with_current_layout.discard(profile_name) # Recriado com o mesmo nome: layout novo
+    return trash_path
+
+def iter_profile_files(profile_path, include_cache=True):
+    """(caminho, caminho relativo, tamanho) de cada arquivo comum do perfil, gerados durante a varredura."""
+    for dir_path, dir_names, file_names in os.walk(profile_path):
+        relative_dir = os.path.relpath(dir_path, profile_path)
+        if relative_dir == os.curdir:
+            relative_dir = ""
+            if not include_cache and PROFILE_CACHE_DIR_NAME in dir_names:
+                dir_names.remove(PROFILE_CACHE_DIR_NAME)
+        dir_names.sort()
+        for name in sorted(file_names):
+            if name == DISK_USAGE_CACHE_FILE_NAME: # Medição da pasta de origem: não vale para a cópia
+                continue
+            path = os.path.join(dir_path, name)
+            try:
+                file_stat = os.lstat(path)
+            except OSError:
+                continue
+            if stat.S_ISREG(file_stat.st_mode): # Links, sockets e travas do motor ficam de fora
+                yield path, os.path.join(relative_dir, name), file_stat.st_size
+
+def copy_file_with_progress(source, destination, on_chunk):
+    for chunk in iter(lambda: source.read(PROFILE_COPY_BUFFER_BYTES), b""):
+        destination.write(chunk)
+        on_chunk(len(chunk))
+
+
+class ProgressReader:
+    """Arquivo somente leitura que avisa quantos bytes já foram lidos (o tarfile lê por ele)."""
+    def __init__(self, raw, on_read):
+        self.raw = raw
+        self.on_read = on_read
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.on_read(len(data))
+        return data
+
+
+def remove_profile_tree(path, report):
+    """Apaga a pasta (já renomeada) de um perfil, avisando os bytes liberados."""
+    total_bytes, total_files = measure_directory(path)
+    removed_bytes = removed_files = 0
+    failed = []
+    # Cada neto (cache/Cache, storage/IndexedDB...) é uma etapa do progresso; as pastas saem depois
+    with os.scandir(path) as entries:
+        children = [entry.path for entry in entries]
+    for child in children:
+        jobs = []
+        if os.path.isdir(child) and not os.path.islink(child):
+            with os.scandir(child) as entries:
+                jobs = [entry.path for entry in entries]
+        for job in jobs + [child]:
+            job_bytes, job_files, job_failed = remove_tree_counting(job)
+            removed_bytes += job_bytes
+            removed_files += job_files
+            failed.extend(job_failed)
+            report(removed_bytes, total_bytes)
+    failed.extend(remove_tree_counting(path)[2])
+    return {"bytes": removed_bytes, "files": removed_files, "failed": len(failed)}
+
+def clone_profile(source_name, target_name, include_cache, report):
+    source_path = os.path.join(get_profiles_data_dir(), source_name)
+    if not os.path.isdir(source_path):
+        raise FileNotFoundError(f"Perfil '{source_name}' não encontrado.")
+    total_bytes = sum(size for _, _, size in iter_profile_files(source_path, include_cache))
+    temp_path = profile_temp_path(target_name)
+    progress = {"bytes": 0, "files": 0}
+
+    def copied(length):
+        progress["bytes"] += length
+        report(progress["bytes"], total_bytes)
+
+    try:
+        for path, relative_path, _ in iter_profile_files(source_path, include_cache):
+            destination_path = os.path.join(temp_path, relative_path)
+            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+            with open(path, "rb") as source, open(destination_path, "wb") as destination:
+                copy_file_with_progress(source, destination, copied)
+            shutil.copystat(path, destination_path)
+            progress["files"] += 1
+        publish_profile_dir(temp_path, target_name)
+    except BaseException:
+        remove_tree_counting(temp_path)
+        raise
+    return {"bytes": progress["bytes"], "files": progress["files"], "profile": target_name}
+
+def export_profile_archive(profile_name, archive_path, include_cache, report):
+    """Grava o perfil num .tar.gz em fluxo ("w|gz"): arquivo por arquivo, em pedaços, sem montar nada em memória."""
+    profile_path = os.path.join(get_profiles_data_dir(), profile_name)
+    if not os.path.isdir(profile_path):
+        raise FileNotFoundError(f"Perfil '{profile_name}' não encontrado.")
+    total_bytes = sum(size for _, _, size in iter_profile_files(profile_path, include_cache))
+    progress = {"bytes": 0, "files": 0}
+
+    def read(length):
+        progress["bytes"] += length
+        report(progress["bytes"], total_bytes)
+
+    manifest = json.dumps({"formato": PROFILE_ARCHIVE_FORMAT, "perfil": profile_name,
+                           "layout": PROFILE_LAYOUT_VERSION, "cache": include_cache,
+                           "criado": time.time()}, ensure_ascii=False).encode("utf-8")
+    temp_archive_path = archive_path + ".tmp"
+    try:
+        with open(temp_archive_path, "wb") as raw, tarfile.open(fileobj=raw, mode="w|gz") as archive:
+            manifest_info = tarfile.TarInfo(PROFILE_ARCHIVE_MANIFEST_NAME)
+            manifest_info.size = len(manifest)
+            manifest_info.mtime = int(time.time())
+            archive.addfile(manifest_info, io.BytesIO(manifest))
+            for path, relative_path, _ in iter_profile_files(profile_path, include_cache):
+                member_name = "/".join([PROFILE_ARCHIVE_ROOT] + relative_path.split(os.sep))
+                with open(path, "rb") as source:
+                    info = archive.gettarinfo(fileobj=source, arcname=member_name)
+                    archive.addfile(info, ProgressReader(source, read))
+                archive.members.clear() # Sem isso a lista de TarInfo cresceria com o número de arquivos
+                progress["files"] += 1
+        os.replace(temp_archive_path, archive_path)
+    except BaseException:
+        try:
+            os.unlink(temp_archive_path)
+        except OSError:
+            pass
+        raise
+    return {"bytes": progress["bytes"], "files": progress["files"], "archive": archive_path}
+
+def import_profile_archive(archive_path, profile_name, report):
+    """Lê um .tar.gz de export_profile_archive em fluxo ("r|gz") para um perfil novo."""
+    total_bytes = os.path.getsize(archive_path)
+    temp_path = profile_temp_path(profile_name)
+    progress = {"read": 0, "bytes": 0, "files": 0}
+
+    def read(length):
+        progress["read"] += length
+        report(progress["read"], total_bytes) # Progresso pelo arquivo compactado: é o total conhecido
+
+    try:
+        with open(archive_path, "rb") as raw, tarfile.open(fileobj=ProgressReader(raw, read), mode="r|gz") as archive:
+            manifest_info = archive.next()
+            if manifest_info is None or manifest_info.name != PROFILE_ARCHIVE_MANIFEST_NAME:
+                raise ValueError("O arquivo não é um perfil exportado pelo navegador.")
+            manifest = json.load(archive.extractfile(manifest_info))
+            if not isinstance(manifest, dict):
+                raise ValueError("O manifesto do perfil exportado está corrompido.")
+            if manifest.get("formato") != PROFILE_ARCHIVE_FORMAT:
+                raise ValueError(f"Formato de perfil não suportado: {manifest.get('formato')}")
+            while True:
+                archive.members.clear() # O tarfile guarda cada TarInfo lido; em fluxo eles não servem para nada
+                member = archive.next()
+                if member is None:
+                    break
+                relative_path = archive_member_path(member.name)
+                if relative_path is None:
+                    raise ValueError(f"Entrada inválida no arquivo: {member.name}")
+                destination_path = os.path.join(temp_path, relative_path)
+                if member.isdir():
+                    os.makedirs(destination_path, exist_ok=True)
+                    continue
+                if not member.isfile(): # Links e dispositivos nunca são exportados
+                    continue
+                os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+                with archive.extractfile(member) as source, open(destination_path, "wb") as destination:
+                    copy_file_with_progress(source, destination, lambda length: None)
+                os.utime(destination_path, (member.mtime, member.mtime))
+                progress["bytes"] += member.size
+                progress["files"] += 1
+        publish_profile_dir(temp_path, profile_name)
+    except BaseException:
+        remove_tree_counting(temp_path)
+        raise
+    return {"bytes": progress["bytes"], "files": progress["files"], "profile": profile_name,
+            "source_profile": manifest.get("perfil")}
+
+
+class ProfileJobThread(QThread):
+    """Apaga, clona, exporta ou importa um perfil fora da thread da interface, avisando o progresso."""
+    progress = pyqtSignal(object, object) # (feito, total) em bytes; podem passar de 32 bits
+    done = pyqtSignal(str, object) # (operação, {"error", "bytes", "files", "seconds", ...})
+
+    OPERATIONS = {
+        "delete": remove_profile_tree,
+        "clone": clone_profile,
+        "export": export_profile_archive,
+        "import": import_profile_archive,
+    }
+
+    def __init__(self, operation, **params):
+        super().__init__()
+        self.operation = operation
+        self.params = params
+        self._last_report = 0.0
+
+    def report(self, done, total):
+        now = time.monotonic()
+        if now - self._last_report >= PROFILE_JOB_PROGRESS_INTERVAL_SECONDS:
+            self._last_report = now
+            self.progress.emit(done, total)
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            result = self.OPERATIONS[self.operation](report=self.report, **self.params)
+            result["error"] = None
+        except (OSError, ValueError, EOFError, zlib.error, tarfile.TarError) as e:
+            print(f"AVISO: Falha na operação '{self.operation}' de perfil: {e}")
+            result = {"error": str(e)}
+        except Exception as e: # Erro inesperado: o diálogo ainda precisa do done para reabilitar os botões
+            print(f"ERRO: Falha inesperada na operação '{self.operation}' de perfil: {e!r}")
+            result = {"error": f"erro inesperado: {e}"}
+        result["seconds"] = time.monotonic() - started
+        self.done.emit(self.operation, result)
+
+def clean_profile_leftovers_async():
+    """Apaga perfis excluídos e clones/importações interrompidos de sessões anteriores."""
+    leftovers = []
+    for path in glob.glob(os.path.join(get_profiles_data_dir(), ".*")):
+        name = os.path.basename(path)
+        if name.startswith(PROFILE_TRASH_PREFIX):
+            leftovers.append(path)
+        elif name.startswith(PROFILE_TEMP_PREFIX):
+            pid_match = re.match(r'(\d+)_', name[len(PROFILE_TEMP_PREFIX):])
+            if pid_match and not is_pid_running(int(pid_match.group(1))):
+                leftovers.append(path)
+    leftovers = [path for path in leftovers if os.path.isdir(path)]
+    if not leftovers:
+        return None
+    return start_background_thread(CleanerThread(leftovers))
+
+
+# --- CACHE HTTP POR PERFIL ---
+# Arquivos de índice do cache do Chromium: nunca são apagados ao aparar
+CACHE_INDEX_NAMES = {"index", "index-dir", "the-real-index"}
+
+def trim_directory_to_size(path, max_bytes):
+    """Apaga os arquivos mais antigos do cache até o total caber em max_bytes."""
+    entries = []
+    pending = [path]
+    while pending:
+        current = pending.pop()
+        try:
+            scanner = os.scandir(current)
+        except OSError:
+            continue
+        with scanner:
+            for entry in scanner:
+                if entry.name in CACHE_INDEX_NAMES:
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        info = entry.stat(follow_symlinks=False)
+                        entries.append((info.st_mtime, info.st_size, entry.path))
+                except OSError:
+                    continue
+
+    total = sum(size for _, size, _ in entries)
+    removed_bytes = removed_files = 0
+    entries.sort() # Mais antigos primeiro
+    for _, size, file_path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(file_path)
+        except OSError:
+            continue
+        total -= size
+        removed_bytes += size
+        removed_files += 1
+    return removed_bytes, removed_files
+
+
+class CacheMaintenanceThread(QThread):
+    """Mede, apara ou limpa o cache HTTP de um perfil fora da thread da interface."""
+    done = pyqtSignal(str, object) # (operação, {"bytes", "files", "removed_bytes", "removed_files"})
+
+    def __init__(self, cache_path, operation="measure", max_bytes=0):
+        super().__init__()
+        self.cache_path = cache_path
+        self.operation = operation
+        self.max_bytes = max_bytes
+
+    def run(self):
+        removed_bytes = removed_files = 0
+        if self.operation == "trim":
+            removed_bytes, removed_files = trim_directory_to_size(self.cache_path, self.max_bytes)
+        elif self.operation == "clear":
+            removed_bytes, removed_files = measure_directory(self.cache_path)
+            shutil.rmtree(self.cache_path, ignore_errors=True)
+        total_bytes, total_files = measure_directory(self.cache_path)
+        self.done.emit(self.operation, {"bytes": total_bytes, "files": total_files,
+                                        "removed_bytes": removed_bytes, "removed_files": removed_files})
+
+
+class ProfileCacheManager(QObject):
+    """Tipo e limite do cache HTTP de um perfil, com medição em segundo plano.
+
+    Com web_profile o perfil está em uso: as configurações são aplicadas ao
+    QWebEngineProfile e a limpeza passa pelo motor. Sem ele, o cache é
+    manipulado direto no disco (perfil fechado).
+    """
+    usage_changed = pyqtSignal(object) # {"bytes", "files", ...}
+
+    def __init__(self, profile_name, web_profile=None, parent=None):
+        super().__init__(parent)
+        self.profile_name = profile_name
+        self.web_profile = web_profile
+        self.cache_path = get_profile_http_cache_path(profile_name)
+        settings = load_profile_settings(profile_name)
+        # preferences.json pode ter sido editado à mão: valor estranho volta ao padrão, sem impedir o perfil de abrir
+        self.cache_type = settings.get("http_cache_type", DEFAULT_HTTP_CACHE_TYPE)
+        if self.cache_type not in HTTP_CACHE_TYPES:
+            self.cache_type = DEFAULT_HTTP_CACHE_TYPE
+        try:
+            max_mb = int(settings.get("http_cache_max_mb", DEFAULT_HTTP_CACHE_MAX_MB))
+        except (TypeError, ValueError, OverflowError): # null, "muito", Infinity...
+            max_mb = DEFAULT_HTTP_CACHE_MAX_MB
+        self.max_bytes = max(HTTP_CACHE_MIN_MB, min(max_mb, HTTP_CACHE_MAX_MB)) * 1024 * 1024
+        self.last_usage = None
+        self._measuring = False
+
+        if self.web_profile is not None:
+            self.apply()
+            self._timer = QTimer(self)
+            self._timer.timeout.connect(self.measure_async)
+            self._timer.start(CACHE_MEASURE_INTERVAL_MS)
+            QTimer.singleShot(CACHE_FIRST_MEASURE_DELAY_MS, self.measure_async)
+
+    def apply(self):
+        """Aplica tipo e tamanho máximo ao QWebEngineProfile em uso."""
+        if self.web_profile is None:
+            return
+        if self.cache_type == "memory":
+            self.web_profile.setHttpCacheType(QWebEngineProfile.MemoryHttpCache)
+        else:
+            self.web_profile.setHttpCacheType(QWebEngineProfile.DiskHttpCache)
+        self.web_profile.setHttpCacheMaximumSize(self.max_bytes)
+
+    def configure(self, cache_type, max_mb):
+        self.cache_type = cache_type
+        self.max_bytes = max_mb * 1024 * 1024
+        settings = load_profile_settings(self.profile_name)
+        settings["http_cache_type"] = cache_type
+        settings["http_cache_max_mb"] = max_mb
+        save_profile_settings(self.profile_name, settings)
+        self.apply()
+
+    def _start(self, operation):
+        thread = CacheMaintenanceThread(self.cache_path, operation, self.max_bytes)
+        thread.done.connect(self._operation_done)
+        start_background_thread(thread)
+
+    def measure_async(self):
+        if self._measuring:
+            return
+        self._measuring = True
+        self._start("measure")
+
+    def trim(self):
+        """Apara o cache ao limite configurado."""
+        if self.web_profile is not None:
+            # Perfil em uso: os arquivos estão abertos pelo motor, então só dá para limpar tudo
+            if self.last_usage and self.last_usage["bytes"] > self.max_bytes:
+                self.web_profile.clearHttpCache()
+            QTimer.singleShot(1000, self.measure_async)
+        else:
+            self._start("trim")
+
+    def clear(self):
+        """Apaga todo o cache HTTP do perfil (cookies e armazenamento ficam intactos)."""
+        if self.web_profile is not None:
+            self.web_profile.clearHttpCache()
+            QTimer.singleShot(1000, self.measure_async)
+        else:
+            self._start("clear")
+
+    def _operation_done(self, operation, result):
+        if operation == "measure":
+            self._measuring = False
+        elif result["removed_files"]:
+            print(f"Cache do perfil '{self.profile_name}': {result['removed_files']} arquivo(s), "
+                  f"{format_bytes(result['removed_bytes'])} liberados.")
+        self.last_usage = result
+
+        # O motor respeita o limite só aproximadamente; passou muito do limite, limpa
+        if (operation == "measure" and self.web_profile is not None and self.max_bytes
+                and result["bytes"] > self.max_bytes * HTTP_CACHE_OVERSHOOT_FACTOR):
+            print(f"Cache do perfil '{self.profile_name}' acima do limite ({format_bytes(result['bytes'])}). Limpando.")
+            self.web_profile.clearHttpCache()
+        self.usage_changed.emit(result)
+
+
+# --- HISTÓRICO DE NAVEGAÇÃO ---
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    key TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    visit_count INTEGER NOT NULL DEFAULT 0,
+    last_visit REAL NOT NULL DEFAULT 0,
+    frecency REAL NOT NULL DEFAULT 0
+);
+DROP INDEX IF EXISTS urls_key;
+CREATE INDEX IF NOT EXISTS urls_key_frecency ON urls(key, frecency);
+CREATE INDEX IF NOT EXISTS urls_frecency ON urls(frecency DESC);
+"""
+
+HISTORY_VISIT_SQL = """
+INSERT INTO urls (url, key, title, visit_count, last_visit, frecency) VALUES (?, ?, ?, 1, ?, ?)
+ON CONFLICT(url) DO UPDATE SET
+    visit_count = visit_count + 1,
+    last_visit = excluded.last_visit,
+    frecency = frecency + excluded.frecency,
+    title = CASE WHEN excluded.title != '' THEN excluded.title ELSE title END
+"""
+
+HISTORY_TITLE_SQL = "UPDATE urls SET title = ? WHERE url = ?"
+
+# Só o índice (key, frecency) é lido para escolher as melhores; título e URL vêm depois, para essas poucas linhas
+HISTORY_PREFIX_SQL = """
+SELECT urls.url, urls.title, urls.frecency
+FROM (SELECT id FROM urls INDEXED BY urls_key_frecency WHERE key >= ? AND key < ? ORDER BY frecency DESC LIMIT ?) AS best
+JOIN urls ON urls.id = best.id
+"""
+
+def normalize_history_key(text):
+    """Chave de busca: sem esquema, sem 'www.' e em minúsculas ('https://www.Exemplo.com' -> 'exemplo.com')."""
+    key = text.strip().lower()
+    for prefix in ("https://", "http://", "ftp://", "file://"):
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+            break
+    if key.startswith("www."):
+        key = key[4:]
+    return key
+
+def frecency_weight(timestamp):
+    """Peso de uma visita. Cresce exponencialmente com o tempo, então somar pesos já
+    dá a pontuação "frequência + recência" sem precisar recalcular linhas antigas."""
+    half_life = HISTORY_FRECENCY_HALF_LIFE_DAYS * 24 * 3600
+    return 2.0 ** ((timestamp - HISTORY_FRECENCY_EPOCH) / half_life)
+
+def open_history_connection(path):
+    connection = sqlite3.connect(path)
+    if path != ":memory:":
+        connection.execute("PRAGMA journal_mode=WAL") # Leitores não esperam o escritor
+        connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(HISTORY_SCHEMA)
+    return connection
+
+
+class HistoryWriterThread(QThread):
+    """Grava as visitas em lotes, numa conexão própria, fora da thread da interface."""
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+        self.queue = queue.Queue()
+
+    def run(self):
+        try:
+            connection = open_history_connection(self.db_path)
+        except sqlite3.Error as e:
+            print(f"AVISO: Não foi possível abrir o histórico {self.db_path}: {e}")
+            return
+
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + HISTORY_BATCH_DELAY_SECONDS
+            while batch[-1] is not None and len(batch) < HISTORY_BATCH_MAX:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch[-1] is None: # Pedido de parada: grava o que restou e sai
+                batch.pop()
+                running = False
+            try:
+                with connection:
+                    for statement, params in batch:
+                        connection.execute(statement, params)
+            except sqlite3.Error as e:
+                print(f"AVISO: Falha ao gravar {len(batch)} visita(s) no histórico: {e}")
+        connection.close()
+
+
+class HistoryStore(QObject):
+    """Histórico do perfil em SQLite (WAL) com sugestões por prefixo ordenadas por frecência.
+
+    As escritas vão para HistoryWriterThread. As sugestões usam uma conexão de
+    leitura na thread da interface e um conjunto em memória com as URLs mais
+    frequentes. Se esse conjunto já tem sugestões suficientes para o prefixo, elas
+    são as melhores do banco inteiro e nada é lido; senão o índice (key, frecency)
+    devolve as de maior frecência no intervalo do prefixo. Cada tecla fica em
+    poucos milissegundos mesmo com milhões de linhas.
+    Sem db_path (modo convidado) tudo fica em memória.
+    """
+    def __init__(self, db_path=None, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self._writer = None
+        self._hot = None # url -> [chave, título, frecência]; carregado na primeira sugestão
+        try:
+            self._reader = open_history_connection(db_path or ":memory:")
+        except sqlite3.Error as e:
+            print(f"AVISO: Histórico indisponível ({db_path}): {e}")
+            self._reader = None
+            return
+        if db_path:
+            self._writer = HistoryWriterThread(db_path)
+            self._writer.start()
+
+    def _load_hot_set(self):
+        if self._hot is not None:
+            return
+        rows = self._reader.execute("SELECT url, key, title, frecency FROM urls ORDER BY frecency DESC LIMIT ?",
+                                    (HISTORY_HOT_SET_SIZE,))
+        self._hot = {url: [key, title, frecency] for url, key, title, frecency in rows}
+
+    def _execute(self, statement, params):
+        if self._writer is not None:
+            self._writer.queue.put((statement, params))
+        elif self._reader is not None:
+            with self._reader:
+                self._reader.execute(statement, params)
+
+    def record_visit(self, qurl, title=""):
+        if self._reader is None or qurl.scheme() not in HISTORY_RECORDED_SCHEMES:
+            return
+        url = qurl.toString()
+        key = normalize_history_key(url)
+        weight = frecency_weight(time.time())
+        entry = self._hot.get(url) if self._hot is not None else None
+        stored_frecency, stored_title = 0.0, ""
+        if self._hot is not None and entry is None:
+            # A URL pode ter frecência alta no banco: entrar só com o peso desta visita a deixaria
+            # subestimada, e o suggest não consulta o banco quando o conjunto já basta.
+            # Lida antes de enfileirar a visita, que o escritor ainda não somou
+            try:
+                row = self._reader.execute("SELECT frecency, title FROM urls WHERE url = ?", (url,)).fetchone()
+                if row:
+                    stored_frecency, stored_title = row
+            except sqlite3.Error as e:
+                print(f"AVISO: Falha ao consultar o histórico: {e}")
+        self._execute(HISTORY_VISIT_SQL, (url, key, title, time.time(), weight))
+
+        if self._hot is None:
+            return # O conjunto ainda vai ser lido do banco, já com esta visita
+        if entry:
+            entry[2] += weight
+            if title:
+                entry[1] = title
+        else:
+            self._hot[url] = [key, title or stored_title, stored_frecency + weight]
+            if len(self._hot) > HISTORY_HOT_SET_SIZE * 5 // 4:
+                hottest = sorted(self._hot.items(), key=lambda item: item[1][2], reverse=True)
+                self._hot = dict(hottest[:HISTORY_HOT_SET_SIZE])
+
+    def record_title(self, qurl, title):
+        if self._reader is None or not title or qurl.scheme() not in HISTORY_RECORDED_SCHEMES:
+            return
+        url = qurl.toString()
+        self._execute(HISTORY_TITLE_SQL, (title, url))
+        if self._hot is not None and url in self._hot:
+            self._hot[url][1] = title
+
+    def suggest(self, text, limit=HISTORY_SUGGESTION_LIMIT):
+        """Sugestões para o texto digitado: lista de (url, título), mais relevantes primeiro."""
+        key = normalize_history_key(text)
+        if not key or self._reader is None:
+            return []
+        self._load_hot_set()
+        candidates = {}
+        for url, (entry_key, title, frecency) in self._hot.items():
+            if entry_key.startswith(key):
+                candidates[url] = (frecency, title)
+        if len(candidates) < limit: # Prefixos curtos e comuns costumam parar aqui
+            try:
+                rows = self._reader.execute(HISTORY_PREFIX_SQL, (key, key + "\U0010ffff", limit))
+                for url, title, frecency in rows:
+                    if url not in candidates or candidates[url][0] < frecency:
+                        candidates[url] = (frecency, title)
+            except sqlite3.Error as e:
+                print(f"AVISO: Falha ao consultar o histórico: {e}")
+        ranked = sorted(candidates.items(), key=lambda item: item[1][0], reverse=True)
+        return [(url, title) for url, (_, title) in ranked[:limit]]
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.queue.put(None)
+            self._writer.wait(3000)
+            self._writer = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+# --- FAVORITOS ---
+BOOKMARKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookmarks (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER,
+    is_folder INTEGER NOT NULL DEFAULT 0,
+    title TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL DEFAULT '',
+    key TEXT NOT NULL DEFAULT '',
+    added REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS bookmarks_parent ON bookmarks(parent_id);
+CREATE INDEX IF NOT EXISTS bookmarks_key ON bookmarks(key);
+"""
+
+# Índice de texto completo mantido por gatilhos; sem FTS5 no SQLite a busca cai para LIKE
+BOOKMARKS_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_fts USING fts5(
+    title, url, content='bookmarks', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS bookmarks_ai AFTER INSERT ON bookmarks BEGIN
+    INSERT INTO bookmarks_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+END;
+CREATE TRIGGER IF NOT EXISTS bookmarks_ad AFTER DELETE ON bookmarks BEGIN
+    INSERT INTO bookmarks_fts(bookmarks_fts, rowid, title, url) VALUES ('delete', old.id, old.title, old.url);
+END;
+CREATE TRIGGER IF NOT EXISTS bookmarks_au AFTER UPDATE ON bookmarks BEGIN
+    INSERT INTO bookmarks_fts(bookmarks_fts, rowid, title, url) VALUES ('delete', old.id, old.title, old.url);
+    INSERT INTO bookmarks_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+END;
+"""
+
+BOOKMARK_INSERT_SQL = "INSERT INTO bookmarks (parent_id, is_folder, title, url, key, added) VALUES (?, ?, ?, ?, ?, ?)"
+BOOKMARK_SEARCH_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def open_bookmarks_connection(path):
+    """Abre o banco de favoritos. Devolve (conexão, tem_fts)."""
+    connection = sqlite3.connect(path, uri=path.startswith("file:"))
+    if not path.startswith("file:"):
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(BOOKMARKS_SCHEMA)
+    try:
+        connection.executescript(BOOKMARKS_FTS_SCHEMA)
+        has_fts = True
+    except sqlite3.OperationalError: # SQLite compilado sem FTS5
+        has_fts = False
+    return connection, has_fts
+
+
+class BookmarkWriter:
+    """Insere favoritos em lotes, uma transação curta por lote (usado pelos importadores).
+
+    Cada lote é gravado logo: a importação nunca segura a trava de escrita por
+    mais que um executemany, então Ctrl+D na janela não fica esperando por ela.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.pending = []
+        self.count = 0
+        self.now = time.time()
+
+    def add_folder(self, parent_id, title):
+        # Pastas são inseridas na hora: os favoritos de dentro precisam do id
+        self.flush()
+        cursor = self.connection.execute(BOOKMARK_INSERT_SQL, (parent_id, 1, title, "", "", self.now))
+        return cursor.lastrowid
+
+    def rename_folder(self, folder_id, title):
+        self.connection.execute("UPDATE bookmarks SET title = ? WHERE id = ?", (title, folder_id))
+
+    def add_bookmark(self, parent_id, title, url):
+        self.pending.append((parent_id, 0, title or url, url, normalize_history_key(url), self.now))
+        self.count += 1
+        if len(self.pending) >= BOOKMARK_IMPORT_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.connection.executemany(BOOKMARK_INSERT_SQL, self.pending)
+            self.pending = []
+            self.connection.commit()
+
+
+class NetscapeBookmarkParser(HTMLParser):
+    """Importa o formato HTML "Netscape Bookmark File" (exportado por todos os navegadores) aos pedaços.
+
+    <DT><H3>pasta</H3> seguido de <DL>...</DL> é uma pasta; <DT><A HREF=...>título</A> é um favorito.
+    """
+    def __init__(self, writer, root_id):
+        super().__init__(convert_charrefs=True)
+        self.writer = writer
+        self.folders = [root_id]
+        self._pending_folder = None # Pasta vista no <H3>, aberta no próximo <DL>
+        self._capture = None # "folder" ou "link" enquanto lê o texto do elemento
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "h3":
+            self._capture, self._text = "folder", []
+        elif tag == "a":
+            self._href = dict(attrs).get("href") or ""
+            self._capture, self._text = "link", []
+        elif tag == "dl":
+            if self._pending_folder is not None:
+                self.folders.append(self._pending_folder)
+                self._pending_folder = None
+            else:
+                self.folders.append(self.folders[-1]) # <DL> sem pasta (a lista da raiz): só equilibra o </DL>
+
+    def handle_endtag(self, tag):
+        if tag == "h3" and self._capture == "folder":
+            self._pending_folder = self.writer.add_folder(self.folders[-1], "".join(self._text).strip())
+            self._capture = None
+        elif tag == "a" and self._capture == "link":
+            if self._href and not self._href.startswith(("place:", "javascript:")):
+                self.writer.add_bookmark(self.folders[-1], "".join(self._text).strip(), self._href)
+            self._capture = None
+        elif tag == "dl" and len(self.folders) > 1:
+            self.folders.pop()
+
+    def handle_data(self, data):
+        if self._capture:
+            self._text.append(data)
+
+
+def import_json_bookmarks(stream, writer, root_id):
+    """Importa o JSON de favoritos do Chromium ("Bookmarks") ou um backup JSON do Firefox.
+
+    Todo objeto com "children" vira pasta (criada ao encontrar a chave, já que o
+    Chromium grava o nome depois dos filhos); objetos com "url"/"uri" viram favoritos.
+    """
+    stack = [] # Um dict por objeto aberto: campos escalares + id da pasta, se for pasta
+    parents = [root_id]
+    key = None
+    depth_of_children = [] # Profundidade dos arrays "children" abertos
+    depth = 0
+    for event, value in iter_json_events(stream):
+        if event == "key":
+            key = value
+            continue
+        if event == "start_map":
+            stack.append({})
+            depth += 1
+        elif event == "end_map":
+            depth -= 1
+            node = stack.pop()
+            if "folder_id" in node:
+                title = node.get("name") or node.get("title") or ""
+                if title and title != node.get("folder_title"):
+                    writer.rename_folder(node["folder_id"], title)
+            else:
+                url = node.get("url") or node.get("uri")
+                if isinstance(url, str) and url and not url.startswith(("place:", "javascript:")):
+                    title = node.get("name") or node.get("title") or ""
+                    writer.add_bookmark(parents[-1], title if isinstance(title, str) else "", url)
+        elif event == "start_array":
+            depth += 1
+            if key == "children" and stack:
+                node = stack[-1]
+                title = node.get("name") or node.get("title") or ""
+                node["folder_title"] = title if isinstance(title, str) else ""
+                node["folder_id"] = writer.add_folder(parents[-1], node["folder_title"])
+                parents.append(node["folder_id"])
+                depth_of_children.append(depth)
+        elif event == "end_array":
+            if depth_of_children and depth_of_children[-1] == depth:
+                depth_of_children.pop()
+                parents.pop()
+            depth -= 1
+        elif event == "value" and stack and key is not None:
+            if key in ("name", "title", "url", "uri", "type"):
+                stack[-1][key] = value
+        key = None
+
+
+class BookmarkImportThread(QThread):
+    """Importa um arquivo de favoritos (HTML ou JSON) numa conexão própria, em lotes de BOOKMARK_IMPORT_BATCH.
+
+    Se a importação falhar no meio, o que já foi gravado fica na pasta "Importados de ...".
+    """
+    import_finished = pyqtSignal(int, str) # (favoritos importados, mensagem de erro)
+
+    def __init__(self, db_path, file_path):
+        super().__init__()
+        self.db_path = db_path
+        self.file_path = file_path
+
+    def run(self):
+        count = 0
+        try:
+            connection, _ = open_bookmarks_connection(self.db_path)
+            try:
+                # utf-8-sig: exportações do Windows costumam começar com BOM
+                with connection, open(self.file_path, encoding="utf-8-sig", errors="replace") as source:
+                    writer = BookmarkWriter(connection)
+                    root_id = writer.add_folder(None, f"Importados de {os.path.basename(self.file_path)}")
+                    first_char = source.read(1)
+                    source.seek(0)
+                    if first_char in ("{", "["):
+                        import_json_bookmarks(source, writer, root_id)
+                    else:
+                        parser = NetscapeBookmarkParser(writer, root_id)
+                        for block in iter(lambda: source.read(BOOKMARK_IMPORT_READ_BYTES), ""):
+                            parser.feed(block)
+                        parser.close()
+                    writer.flush()
+                    count = writer.count
+            finally:
+                connection.close()
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.import_finished.emit(0, str(e))
+            return
+        self.import_finished.emit(count, "")
+
+
+class BookmarkStore(QObject):
+    """Favoritos do perfil em SQLite, com busca por prefixo da URL e texto completo (FTS5).
+
+    Sem db_path (modo convidado) o banco fica só em memória, compartilhado com a
+    thread de importação.
+    """
+    imported = pyqtSignal(int, str) # (favoritos importados, mensagem de erro)
+
+    def __init__(self, db_path=None, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path or f"file:navegador_bookmarks_{os.getpid()}_{id(self)}?mode=memory&cache=shared"
+        self._import_thread = None
+        try:
+            self._connection, self.has_fts = open_bookmarks_connection(self.db_path)
+        except sqlite3.Error as e:
+            print(f"AVISO: Favoritos indisponíveis ({db_path}): {e}")
+            self._connection, self.has_fts = None, False
+
+    def add(self, url, title, parent_id=None):
+        """Id do favorito novo, ou None se o banco não aceitou (ex.: travado por uma importação)."""
+        if self._connection is None:
+            return None
+        try:
+            with self._connection:
+                cursor = self._connection.execute(BOOKMARK_INSERT_SQL,
+                                                  (parent_id, 0, title or url, url, normalize_history_key(url), time.time()))
+        except sqlite3.Error as e:
+            print(f"AVISO: Falha ao adicionar o favorito: {e}")
+            return None
+        return cursor.lastrowid
+
+    def contains(self, url):
+        if self._connection is None:
+            return False
+        try:
+            return self._connection.execute("SELECT 1 FROM bookmarks WHERE url = ? AND is_folder = 0 LIMIT 1",
+                                            (url,)).fetchone() is not None
+        except sqlite3.Error as e:
+            print(f"AVISO: Falha ao consultar os favoritos: {e}")
+            return False
+
+    def remove_url(self, url):
+        """True se o favorito foi removido (ou não existia); False se o banco não aceitou."""
+        if self._connection is None:
+            return False
+        try:
+            with self._connection:
+                self._connection.execute("DELETE FROM bookmarks WHERE url = ? AND is_folder = 0", (url,))
+        except sqlite3.Error as e:
+            print(f"AVISO: Falha ao remover o favorito: {e}")
+            return False
+        return True
+
+    def folder_bookmarks(self, folder_id):
+        """(url, título) dos favoritos diretamente dentro da pasta, na ordem em que foram criados."""
+        if self._connection is None:
+            return []
+        try:
+            return self._connection.execute("SELECT url, title FROM bookmarks WHERE parent_id = ? AND is_folder = 0 "
+                                            "ORDER BY id", (folder_id,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"AVISO: Falha ao ler a pasta de favoritos: {e}")
+            return []
+
+    def search(self, text, limit=BOOKMARK_SEARCH_LIMIT):
+        """Busca enquanto se digita: lista de (id, é_pasta, título, url).
+
+        Primeiro as URLs que começam com o texto (índice por chave), depois os
+        títulos/URLs com palavras que começam com cada termo (FTS5, ou LIKE sem FTS5).
+        """
+        key = normalize_history_key(text)
+        if not key or self._connection is None:
+            return []
+        results = OrderedDict()
+        try:
+            rows = self._connection.execute("SELECT id, is_folder, title, url FROM bookmarks WHERE key >= ? AND key < ? "
+                                            "LIMIT ?", (key, key + "\U0010ffff", limit))
+            for row in rows:
+                results[row[0]] = row
+            terms = BOOKMARK_SEARCH_TOKEN_RE.findall(text.lower())
+            if terms and len(results) < limit:
+                if self.has_fts:
+                    query = " AND ".join(f'"{term}"*' for term in terms)
+                    rows = self._connection.execute(
+                        "SELECT b.id, b.is_folder, b.title, b.url FROM bookmarks_fts JOIN bookmarks b ON b.id = bookmarks_fts.rowid "
+                        "WHERE bookmarks_fts MATCH ? LIMIT ?", (query, limit * 2))
+                else:
+                    where = " AND ".join("(title LIKE ? OR url LIKE ?)" for _ in terms)
+                    params = [value for term in terms for value in (f"%{term}%", f"%{term}%")]
+                    rows = self._connection.execute(f"SELECT id, is_folder, title, url FROM bookmarks WHERE {where} LIMIT ?",
+                                                    params + [limit * 2])
+                for row in rows:
+                    results.setdefault(row[0], row)
+        except sqlite3.Error as e:
+            print(f"AVISO: Falha ao buscar nos favoritos: {e}")
+        return list(results.values())[:limit]
+
+    def import_file(self, file_path):
+        """Importa em segundo plano; o sinal imported avisa quando terminar."""
+        if self._connection is None or (self._import_thread is not None and self._import_thread.isRunning()):
+            return False
+        self._import_thread = BookmarkImportThread(self.db_path, file_path)
+        self._import_thread.import_finished.connect(self.imported)
+        start_background_thread(self._import_thread)
+        return True
+
+    def close(self):
+        if self._import_thread is not None:
+            self._import_thread.wait(3000)
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+# --- ÍCONES DOS SITES (favicons) ---
+FAVICONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS icons (
+    id INTEGER PRIMARY KEY,
+    icon_url TEXT NOT NULL UNIQUE,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS icons_last_used ON icons(last_used);
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    icon_id INTEGER NOT NULL REFERENCES icons(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+"""
+
+FAVICON_ICON_SQL = """
+INSERT INTO icons (icon_url, data, size, last_used) VALUES (?, ?, ?, ?)
+ON CONFLICT(icon_url) DO UPDATE SET data = excluded.data, size = excluded.size, last_used = excluded.last_used
+"""
+
+FAVICON_HOST_SQL = "INSERT OR REPLACE INTO hosts (host, icon_id) SELECT ?, id FROM icons WHERE icon_url = ?"
+
+FAVICON_TOUCH_SQL = "UPDATE icons SET last_used = ? WHERE icon_url = ?"
+
+def open_favicons_connection(path):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA foreign_keys=ON") # Apagar um ícone apaga os hosts que apontam para ele
+    if path != ":memory:":
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(FAVICONS_SCHEMA)
+    return connection
+
+def evict_favicons(connection, max_bytes=FAVICON_STORE_MAX_BYTES):
+    """Passou do limite: apaga os ícones usados há mais tempo até FAVICON_STORE_TRIM_RATIO do limite."""
+    total = connection.execute("SELECT total(size) FROM icons").fetchone()[0]
+    if total <= max_bytes:
+        return 0
+    target = max_bytes * FAVICON_STORE_TRIM_RATIO
+    evicted = []
+    for icon_id, size in connection.execute("SELECT id, size FROM icons ORDER BY last_used"):
+        if total <= target:
+            break
+        evicted.append((icon_id,))
+        total -= size
+    with connection:
+        connection.executemany("DELETE FROM icons WHERE id = ?", evicted)
+    return len(evicted)
+
+def encode_favicon(icon):
+    """PNG de no máximo FAVICON_STORE_SIZE px: o que vai para o banco."""
+    pixmap = icon.pixmap(FAVICON_STORE_SIZE, FAVICON_STORE_SIZE)
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    pixmap.save(buffer, "PNG")
+    return bytes(buffer.data())
+
+def decode_favicon(data):
+    pixmap = QPixmap()
+    if not pixmap.loadFromData(data, "PNG"):
+        return None
+    return QIcon(pixmap)
+
+
+class FaviconWriterThread(QThread):
+    """Grava os ícones numa conexão própria e aplica o limite de tamanho do banco depois de cada lote."""
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+        self.queue = queue.Queue()
+
+    def run(self):
+        try:
+            connection = open_favicons_connection(self.db_path)
+        except sqlite3.Error as e:
+            print(f"AVISO: Não foi possível abrir o cache de ícones {self.db_path}: {e}")
+            return
+
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                running = False
+            try:
+                with connection:
+                    for statement, params in batch:
+                        connection.execute(statement, params)
+                if any(statement is FAVICON_ICON_SQL for statement, _ in batch):
+                    evict_favicons(connection)
+            except sqlite3.Error as e:
+                print(f"AVISO: Falha ao gravar {len(batch)} ícone(s): {e}")
+        connection.close()
+
+
+class FaviconStore(QObject):
+    """Ícones dos sites por host e por URL do ícone, compartilhados por todas as abas do perfil.
+
+    Três níveis: um LRU de QIcon já decodificados (por URL do ícone, então hosts
+    que usam o mesmo ícone dividem uma entrada), o banco SQLite do perfil com
+    PNGs pequenos e limite de tamanho, e por fim o iconChanged da página. Abas
+    restauradas recebem o ícone do banco sem nenhum acesso à rede.
+    Sem db_path (modo convidado) o banco fica em memória.
+    """
+    def __init__(self, db_path=None, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self._writer = None
+        self._icons = OrderedDict() # URL do ícone -> QIcon (LRU)
+        self._host_icon_urls = OrderedDict() # host -> URL do ícone (LRU, evita consultar o banco)
+        self._touched = set() # URLs cujo last_used já foi atualizado nesta sessão
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        try:
+            self._reader = open_favicons_connection(db_path or ":memory:")
+        except sqlite3.Error as e:
+            print(f"AVISO: Cache de ícones indisponível ({db_path}): {e}")
+            self._reader = None
+            return
+        if db_path:
+            self._writer = FaviconWriterThread(db_path)
+            self._writer.start()
+
+    def _execute(self, statement, params):
+        if self._writer is not None:
+            self._writer.queue.put((statement, params))
+        elif self._reader is not None:
+            with self._reader:
+                self._reader.execute(statement, params)
+            if statement is FAVICON_ICON_SQL:
+                evict_favicons(self._reader)
+
+    def _remember(self, host, icon_url, icon):
+        self._host_icon_urls[host] = icon_url
+        self._host_icon_urls.move_to_end(host)
+        while len(self._host_icon_urls) > FAVICON_MEMORY_CACHE_SIZE * 4:
+            self._host_icon_urls.popitem(last=False)
+        self._icons[icon_url] = icon
+        self._icons.move_to_end(icon_url)
+        while len(self._icons) > FAVICON_MEMORY_CACHE_SIZE:
+            self._icons.popitem(last=False)
+
+    def _touch(self, icon_url):
+        if icon_url not in self._touched:
+            self._touched.add(icon_url)
+            self._execute(FAVICON_TOUCH_SQL, (time.time(), icon_url))
+
+    def icon_for_host(self, host):
+        """Ícone conhecido para o host (QIcon), ou None. Não acessa a rede."""
+        if not host or self._reader is None:
+            return None
+        icon_url = self._host_icon_urls.get(host)
+        if icon_url is not None and icon_url in self._icons:
+            self.memory_hits += 1
+            self._host_icon_urls.move_to_end(host)
+            self._icons.move_to_end(icon_url)
+            return self._icons[icon_url]
+        try:
+            row = self._reader.execute("SELECT icons.icon_url, icons.data FROM hosts JOIN icons ON icons.id = hosts.icon_id "
+                                       "WHERE hosts.host = ?", (host,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"AVISO: Falha ao consultar o cache de ícones: {e}")
+            row = None
+        icon = decode_favicon(row[1]) if row else None
+        if icon is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self._remember(host, row[0], icon)
+        self._touch(row[0])
+        return icon
+
+    def store(self, host, icon_url, icon):
+        """Guarda o ícone que a página anunciou. Só codifica e grava o que o banco ainda não tem."""
+        if not host or not icon_url or icon.isNull() or self._reader is None:
+            return
+        if self._host_icon_urls.get(host) == icon_url and icon_url in self._icons:
+            return # Mesmo ícone de sempre: nada a gravar
+        known = icon_url in self._icons
+        if not known:
+            try:
+                known = self._reader.execute("SELECT 1 FROM icons WHERE icon_url = ?", (icon_url,)).fetchone() is not None
+            except sqlite3.Error:
+                known = False
+        self._remember(host, icon_url, icon)
+        if known:
+            self._touch(icon_url)
+        else:
+            data = encode_favicon(icon)
+            self._touched.add(icon_url)
+            self._execute(FAVICON_ICON_SQL, (icon_url, data, len(data), time.time()))
+        self._execute(FAVICON_HOST_SQL, (host, icon_url))
+
+    def stats(self):
+        """Acertos por nível e tamanho do banco (o que o escritor ainda não gravou não aparece)."""
+        stored = stored_bytes = 0
+        if self._reader is not None:
+            try:
+                stored, stored_bytes = self._reader.execute("SELECT count(*), total(size) FROM icons").fetchone()
+            except sqlite3.Error:
+                pass
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {"memory": len(self._icons), "memory_hits": self.memory_hits, "disk_hits": self.disk_hits,
+                "misses": self.misses, "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "stored": stored, "stored_bytes": int(stored_bytes)}
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.queue.put(None)
+            self._writer.wait(3000)
+            self._writer = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._icons.clear()
+
+
+# Caminhos locais reconhecidos só pela forma do texto: /abs, ~/..., ./rel, ../rel, C:\..., \\servidor
+LOCAL_PATH_PATTERN = re.compile(r'^(?:/|~(?:[/\\]|$)|\.{1,2}[/\\]|[A-Za-z]:[/\\]|\\\\)')
+
+def classify_url_bar_input(text):
+    """Transforma o texto da barra de endereço em QUrl (arquivo local, URL ou busca).
+
+    Não consulta o sistema de arquivos: um os.path.exists() aqui travaria a
+    interface em montagens de rede lentas.
+    """
+    if text.startswith("file://") or text.startswith(LOCAL_FILE_SCHEME + ":"):
+        return QUrl(text)
+    if LOCAL_PATH_PATTERN.match(text):
+        return local_file_url(os.path.expanduser(text))
+    if text.startswith("http://") or text.startswith("https://") or text.startswith("ftp://"):
+        return QUrl(text)
+    if '.' in text and ' ' not in text:
+        return QUrl("http://" + text)
+    search_query = QUrl.toPercentEncoding(text).data().decode('utf-8')
+    return QUrl(DEFAULT_SEARCH_ENGINE_URL + search_query)
+
+
+class ProfileSelectionDialog(QDialog):
+    def __init__(self, parent=None, profiles=None):
+        super().__init__(parent)
+        self.setWindowTitle("Selecionar Perfil")
+        self.setGeometry(200, 200, 400, 350)
+        
+        self.selected_profile = None
+
+        layout = QVBoxLayout(self)
+
+        self.profile_list_widget = QListWidget()
+        layout.addWidget(self.profile_list_widget)
+
+        button_layout = QHBoxLayout()
+
+        self.guest_button = QPushButton("Iniciar no Modo Convidado")
+        self.guest_button.clicked.connect(self.select_guest_mode)
+        button_layout.addWidget(self.guest_button)
+
+        self.create_button = QPushButton("Criar Novo Perfil")
+        self.create_button.clicked.connect(self.create_new_profile)
+        button_layout.addWidget(self.create_button)
+
+        layout.addLayout(button_layout)
+
+        action_button_layout = QHBoxLayout()
+
+        self.ok_button = QPushButton("Carregar Perfil Selecionado")
+        self.ok_button.clicked.connect(self.accept_selection)
+        self.ok_button.setEnabled(False)
+        action_button_layout.addWidget(self.ok_button)
+
+        self.delete_button = QPushButton("Deletar Perfil Selecionado")
+        self.delete_button.clicked.connect(self.delete_selected_profile)
+        self.delete_button.setEnabled(False)
+        action_button_layout.addWidget(self.delete_button)
+
+        layout.addLayout(action_button_layout)
+
+        # Operações demoradas rodam num ProfileJobThread, com barra de progresso
+        profile_ops_layout = QHBoxLayout()
+
+        self.clone_button = QPushButton("Clonar...")
+        self.clone_button.clicked.connect(self.clone_selected_profile)
+        profile_ops_layout.addWidget(self.clone_button)
+
+        self.export_button = QPushButton("Exportar...")
+        self.export_button.clicked.connect(self.export_selected_profile)
+        profile_ops_layout.addWidget(self.export_button)
+
+        self.import_button = QPushButton("Importar...")
+        self.import_button.clicked.connect(self.import_profile)
+        profile_ops_layout.addWidget(self.import_button)
+
+        layout.addLayout(profile_ops_layout)
+
+        self.job_status_label = QLabel()
+        self.job_progress_bar = QProgressBar()
+        self.job_progress_bar.setRange(0, 1000) # Em milésimos: os totais em bytes não cabem num int
+        self.job_status_label.hide()
+        self.job_progress_bar.hide()
+        layout.addWidget(self.job_status_label)
+        layout.addWidget(self.job_progress_bar)
+        self._job_thread = None
+        self._job_description = ""
+
+        cache_layout = QHBoxLayout()
+
+        self.cache_usage_label = QLabel()
+        cache_layout.addWidget(self.cache_usage_label, 1)
+
+        self.clear_cache_button = QPushButton("Limpar Cache")
+        clear_cache_menu = QMenu(self.clear_cache_button)
+        clear_cache_menu.addAction("Aparar ao limite").triggered.connect(self.trim_selected_cache)
+        clear_cache_menu.addAction("Limpar tudo (mantém cookies e dados)").triggered.connect(self.clear_selected_cache)
+        self.clear_cache_button.setMenu(clear_cache_menu)
+        cache_layout.addWidget(self.clear_cache_button)
+
+        self.cache_settings_button = QPushButton("Configurar Cache")
+        self.cache_settings_button.clicked.connect(self.configure_selected_cache)
+        cache_layout.addWidget(self.cache_settings_button)
+
+        layout.addLayout(cache_layout)
+
+        self._cache_managers = {}
+        self._connected_cache_managers = []
+        self._disk_usage_thread = None
+        self.profile_list_widget.currentItemChanged.connect(self.update_cache_usage)
+
+        self.load_profiles(profiles)
+        self.profile_list_widget.itemDoubleClicked.connect(self.accept_selection)
+        self.profile_list_widget.itemClicked.connect(self.enable_buttons)
+
+        self.enable_buttons()
+
+    def load_profiles(self, existing_profiles=None):
+        """Preenche a lista. Quem já listou os perfis (ex.: o main) pode passá-los para evitar reler o disco."""
+        self.profile_list_widget.clear()
+        if existing_profiles is None:
+            existing_profiles = list_profiles()
+        
+        if not existing_profiles:
+            QMessageBox.information(self, "Nenhum Perfil Encontrado", 
+                                    "Nenhum perfil persistente encontrado. Você pode criar um novo ou iniciar no modo convidado.")
+            self.profile_list_widget.setEnabled(False)
+            self.enable_buttons()
+        else:
+            self.profile_list_widget.setEnabled(True)
+            for profile in existing_profiles:
+                item = QListWidgetItem(profile)
+                item.setData(Qt.UserRole, profile) # O texto ganha o uso de disco; o nome fica aqui
+                self.profile_list_widget.addItem(item)
+            self.start_disk_usage_scan(existing_profiles)
+            if existing_profiles:
+                self.profile_list_widget.setCurrentRow(0)
+                self.enable_buttons()
+
+    def start_disk_usage_scan(self, profile_names):
+        """Mede cache/dados/app de cada perfil em segundo plano e mostra ao lado do nome."""
+        if self._disk_usage_thread is not None:
+            self._disk_usage_thread.usage_ready.disconnect(self.show_disk_usage)
+        self._disk_usage_thread = ProfileDiskUsageThread(profile_names)
+        self._disk_usage_thread.usage_ready.connect(self.show_disk_usage)
+        start_background_thread(self._disk_usage_thread)
+
+    def show_disk_usage(self, profile_name, usage):
+        for row in range(self.profile_list_widget.count()):
+            item = self.profile_list_widget.item(row)
+            if item.data(Qt.UserRole) == profile_name:
+                item.setText(f"{profile_name}  —  cache {format_bytes(usage[PROFILE_CACHE_DIR_NAME])} · "
+                             f"dados de sites {format_bytes(usage[PROFILE_STORAGE_DIR_NAME])} · "
+                             f"navegador {format_bytes(usage[PROFILE_APPDATA_DIR_NAME])}")
+                item.setToolTip(f"{usage['files']} arquivo(s); {usage['scanned']} pasta(s) lida(s), "
+                                f"{usage['reused']} reaproveitada(s) da medição anterior")
+                break
+
+    def enable_buttons(self):
+        is_selected = bool(self.profile_list_widget.currentItem())
+        job_running = self._job_thread is not None
+        self.ok_button.setEnabled(is_selected)
+        self.delete_button.setEnabled(is_selected and not job_running)
+        self.clone_button.setEnabled(is_selected and not job_running)
+        self.export_button.setEnabled(is_selected and not job_running)
+        self.import_button.setEnabled(not job_running)
+        self.clear_cache_button.setEnabled(is_selected)
+        self.cache_settings_button.setEnabled(is_selected)
+
+    # --- Cache do perfil selecionado ---
+    def cache_manager_for(self, profile_name):
+        """Gerenciador de cache do perfil: o da janela aberta, se estiver em uso, ou um só de disco."""
+        browser = _profile_windows.get(profile_name)
+        if browser is not None and browser.cache_manager:
+            manager = browser.cache_manager
+        else:
+            manager = self._cache_managers.get(profile_name)
+            if manager is None:
+                manager = ProfileCacheManager(profile_name, parent=self)
+                self._cache_managers[profile_name] = manager
+        if manager not in self._connected_cache_managers:
+            self._connected_cache_managers.append(manager)
+            manager.usage_changed.connect(self._cache_usage_changed)
+        return manager
+
+    def _cache_usage_changed(self, usage):
+        self.show_cache_usage(self.sender().profile_name, usage)
+
+    def selected_profile_name(self):
+        selected_item = self.profile_list_widget.currentItem()
+        return selected_item.data(Qt.UserRole) if selected_item else None
+
+    def update_cache_usage(self, *args):
+        """Mostra o uso do cache do perfil selecionado; a medição roda em segundo plano."""
+        profile_name = self.selected_profile_name()
+        if not profile_name:
+            self.cache_usage_label.clear()
+            return
+        manager = self.cache_manager_for(profile_name)
+        if manager.last_usage:
+            self.show_cache_usage(profile_name, manager.last_usage)
+        else:
+            self.cache_usage_label.setText("Cache: calculando...")
+        manager.measure_async()
+
+    def show_cache_usage(self, profile_name, usage):
+        if profile_name != self.selected_profile_name():
+            return
+        manager = self.cache_manager_for(profile_name)
+        cache_type = "memória" if manager.cache_type == "memory" else "disco"
+        self.cache_usage_label.setText(
+            f"Cache ({cache_type}): {format_bytes(usage['bytes'])} de {format_bytes(manager.max_bytes)}"
+            f" em {usage['files']} arquivo(s)")
+
+    def trim_selected_cache(self):
+        profile_name = self.selected_profile_name()
+        if profile_name:
+            self.cache_usage_label.setText("Cache: aparando...")
+            self.cache_manager_for(profile_name).trim()
+
+    def clear_selected_cache(self):
+        profile_name = self.selected_profile_name()
+        if profile_name:
+            self.cache_usage_label.setText("Cache: limpando...")
+            self.cache_manager_for(profile_name).clear()
+
+    def configure_selected_cache(self):
+        profile_name = self.selected_profile_name()
+        if not profile_name:
+            return
+        manager = self.cache_manager_for(profile_name)
+        cache_types = ["Disco", "Memória"]
+        current = 1 if manager.cache_type == "memory" else 0
+        cache_type, ok = QInputDialog.getItem(self, "Tipo de Cache", "Onde guardar o cache HTTP:", cache_types, current, False)
+        if not ok:
+            return
+        max_mb, ok = QInputDialog.getInt(self, "Limite do Cache", "Tamanho máximo do cache (MB):",
+                                         manager.max_bytes // (1024 * 1024), HTTP_CACHE_MIN_MB, HTTP_CACHE_MAX_MB)
+        if not ok:
+            return
+        manager.configure("memory" if cache_type == "Memória" else "disk", max_mb)
+        self.update_cache_usage()
+
+    def select_guest_mode(self):
+        self.selected_profile = "guest_mode"
+        self.accept()
+
+    def create_new_profile(self):
+        new_profile_name, ok = QInputDialog.getText(
+            self, "Novo Perfil", "Digite o nome para o novo perfil:"
+        )
+        if ok and new_profile_name:
+            new_profile_name = new_profile_name.strip()
+            # Um perfil que já existe é simplesmente carregado (aviso logo abaixo)
+            problem = profile_name_problem(new_profile_name, must_be_new=False)
+            if problem:
+                QMessageBox.warning(self, "Nome Inválido", problem)
+                return
+
+            profile_path = get_profile_data_path(new_profile_name)
+            if os.path.exists(profile_path) and os.path.isdir(profile_path):
+                QMessageBox.information(self, "Perfil Existente", f"O perfil '{new_profile_name}' já existe e será carregado.")
+            else:
+                QMessageBox.information(self, "Perfil Criado", f"O perfil '{new_profile_name}' foi criado com sucesso!")
+
+            self.selected_profile = new_profile_name
+            self.accept()
+
+    def accept_selection(self):
+        selected_item = self.profile_list_widget.currentItem()
+        if selected_item:
+            self.selected_profile = selected_item.data(Qt.UserRole)
+            self.accept()
+        else:
+            QMessageBox.warning(self, "Nenhuma Seleção", "Por favor, selecione um perfil ou inicie no modo convidado.")
+
+    def delete_selected_profile(self):
+        selected_item = self.profile_list_widget.currentItem()
+        if not selected_item:
+            QMessageBox.warning(self, "Nenhuma Seleção", "Por favor, selecione um perfil para deletar.")
+            return
+
+        profile_to_delete = selected_item.data(Qt.UserRole)
+        if not self.ensure_profile_closed(profile_to_delete, "deletar"):
+            return
+        reply = QMessageBox.question(self, 'Confirmar Exclusão', 
+                                    f"Tem certeza que deseja deletar o perfil '{profile_to_delete}' e todos os seus dados?",
+                                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+
+        if reply == QMessageBox.Yes:
+            # Renomear é instantâneo: o perfil some da lista e os arquivos são apagados em segundo plano
+            try:
+                trash_path = trash_profile_dir(profile_to_delete)
+            except FileNotFoundError:
+                QMessageBox.warning(self, "Erro", "Diretório do perfil não encontrado.")
+                return
+            except OSError as e:
+                QMessageBox.critical(self, "Erro ao Deletar", f"Erro ao deletar o perfil '{profile_to_delete}':\n{e}")
+                return
+            self.load_profiles()
+            self.start_profile_job("delete", f"Apagando '{profile_to_delete}'", path=trash_path)
+
+    # --- Operações em segundo plano (apagar, clonar, exportar, importar) ---
+    def ensure_profile_closed(self, profile_name, action):
+        """Perfil aberto numa janela não pode ser copiado nem apagado: os bancos estariam em uso."""
+        # A janela pode ser deste processo ou de outro (perfil aberto com --profile em outra invocação)
+        if profile_name in _profile_windows or is_profile_open_elsewhere(profile_name):
+            QMessageBox.warning(self, "Perfil em Uso",
+                                f"Feche a janela do perfil '{profile_name}' antes de {action}.")
+            return False
+        return True
+
+    def ask_new_profile_name(self, title, default_name):
+        while True:
+            profile_name, ok = QInputDialog.getText(self, title, "Nome do novo perfil:", text=default_name)
+            if not ok:
+                return None
+            profile_name = profile_name.strip()
+            problem = profile_name_problem(profile_name)
+            if problem is None:
+                return profile_name
+            QMessageBox.warning(self, "Nome Inválido", problem)
+            default_name = profile_name
+
+    def ask_include_cache(self, title):
+        reply = QMessageBox.question(self, title, "Incluir o cache HTTP? Ele pode ser grande e é recriado sozinho.",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        return reply == QMessageBox.Yes
+
+    def clone_selected_profile(self):
+        source_name = self.selected_profile_name()
+        if not source_name or not self.ensure_profile_closed(source_name, "clonar"):
+            return
+        target_name = self.ask_new_profile_name("Clonar Perfil", f"{source_name} (cópia)")
+        if target_name is None:
+            return
+        include_cache = self.ask_include_cache("Clonar Perfil")
+        self.start_profile_job("clone", f"Clonando '{source_name}' para '{target_name}'",
+                               source_name=source_name, target_name=target_name, include_cache=include_cache)
+
+    def export_selected_profile(self):
+        profile_name = self.selected_profile_name()
+        if not profile_name or not self.ensure_profile_closed(profile_name, "exportar"):
+            return
+        default_path = os.path.join(os.path.expanduser("~"), f"{profile_name}{PROFILE_ARCHIVE_SUFFIX}")
+        archive_path, _ = QFileDialog.getSaveFileName(self, "Exportar Perfil", default_path,
+                                                      f"Perfil exportado (*{PROFILE_ARCHIVE_SUFFIX})")
+        if not archive_path:
+            return
+        include_cache = self.ask_include_cache("Exportar Perfil")
+        # Perfil ainda no layout antigo é migrado antes, aqui na thread da interface
+        ensure_profile_layout(profile_name)
+        self.start_profile_job("export", f"Exportando '{profile_name}'",
+                               profile_name=profile_name, archive_path=archive_path, include_cache=include_cache)
+
+    def import_profile(self):
+        archive_path, _ = QFileDialog.getOpenFileName(self, "Importar Perfil", os.path.expanduser("~"),
+                                                      f"Perfil exportado (*{PROFILE_ARCHIVE_SUFFIX});;Todos os arquivos (*)")
+        if not archive_path:
+            return
+        default_name = os.path.basename(archive_path)
+        if default_name.endswith(PROFILE_ARCHIVE_SUFFIX):
+            default_name = default_name[:-len(PROFILE_ARCHIVE_SUFFIX)]
+        profile_name = self.ask_new_profile_name("Importar Perfil", default_name)
+        if profile_name is None:
+            return
+        self.start_profile_job("import", f"Importando '{profile_name}'",
+                               archive_path=archive_path, profile_name=profile_name)
+
+    def start_profile_job(self, operation, description, **params):
+        self._job_description = description
+        self._job_thread = ProfileJobThread(operation, **params)
+        self._job_thread.progress.connect(self.show_job_progress)
+        self._job_thread.done.connect(self.profile_job_done)
+        self.job_status_label.setText(f"{description}...")
+        self.job_progress_bar.setValue(0)
+        self.job_status_label.show()
+        self.job_progress_bar.show()
+        self.enable_buttons()
+        start_background_thread(self._job_thread)
+
+    def show_job_progress(self, done, total):
+        self.job_progress_bar.setValue(int(done * 1000 // total) if total else 0)
+        self.job_status_label.setText(f"{self._job_description}: {format_bytes(done)} de {format_bytes(total)}")
+
+    def profile_job_done(self, operation, result):
+        self._job_thread = None
+        self.job_progress_bar.hide()
+        error = result["error"]
+        if error:
+            self.job_status_label.setText(f"{self._job_description}: falhou.")
+            QMessageBox.critical(self, "Erro", f"{self._job_description} falhou:\n{error}")
+        elif operation == "delete":
+            message = f"Perfil apagado: {format_bytes(result['bytes'])} liberados em {result['seconds']:.1f}s."
+            if result["failed"]:
+                message += f" {result['failed']} item(ns) serão apagados na próxima inicialização."
+            self.job_status_label.setText(message)
+        elif operation == "export":
+            self.job_status_label.setText(f"Perfil exportado: {result['files']} arquivo(s), "
+                                          f"{format_bytes(result['bytes'])} em {result['seconds']:.1f}s.")
+        else:
+            verb = "clonado" if operation == "clone" else "importado"
+            self.job_status_label.setText(f"Perfil '{result['profile']}' {verb}: {result['files']} arquivo(s), "
+                                          f"{format_bytes(result['bytes'])} em {result['seconds']:.1f}s.")
+            self.load_profiles()
+        self.enable_buttons()
+
+
+# --- ARQUIVOS LOCAIS (esquema arquivo:) ---
+def local_path_from_url(qurl):
+    """Caminho local de uma URL arquivo: ou file: (None para os outros esquemas)."""
+    if qurl.scheme() == LOCAL_FILE_SCHEME:
+        return QDir.toNativeSeparators(qurl.path())
+    if qurl.isLocalFile():
+        return qurl.toLocalFile()
+    return None
+
+def register_local_file_scheme():
+    """Registra o esquema arquivo: no motor. Precisa rodar antes de criar o QApplication."""
+    if QWebEngineUrlScheme is None: # Qt < 5.12: o esquema funciona, só sem as opções abaixo
+        return
+    scheme = QWebEngineUrlScheme(LOCAL_FILE_SCHEME.encode("ascii"))
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Path)
+    # Local: páginas da web não conseguem abrir nem embutir arquivo:, só outras páginas locais
+    scheme.setFlags(QWebEngineUrlScheme.LocalScheme | QWebEngineUrlScheme.LocalAccessAllowed)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+class MappedFileDevice(QIODevice):
+    """QIODevice somente leitura sobre um arquivo mapeado em memória (mmap).
+
+    Não é sequencial: o motor atende pedidos Range (ex.: avançar num vídeo) com
+    seek(), e só os trechos pedidos são lidos do disco, em pedaços de até
+    LOCAL_FILE_READ_CHUNK_BYTES.
+    """
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self._file = open(path, "rb")
+        self._size = os.fstat(self._file.fileno()).st_size
+        # mmap de arquivo vazio não é permitido
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        self.open(QIODevice.ReadOnly)
+
+    def isSequential(self):
+        return False
+
+    def size(self):
+        return self._size
+
+    def readData(self, max_size):
+        position = self.pos()
+        if self._map is None or position >= self._size:
+            return b""
+        return self._map[position:position + min(max_size, LOCAL_FILE_READ_CHUNK_BYTES, self._size - position)]
+
+    def writeData(self, data):
+        return -1
+
+    def release(self):
+        """Fecha o mapeamento e o arquivo (chamado quando o job do motor é destruído)."""
+        self.close()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+def render_directory_listing(path, page):
+    """Página HTML com as entradas page*N..(page+1)*N do diretório, na ordem do scandir.
+
+    Nada é ordenado de propósito: ordenar exigiria ler o diretório inteiro, e uma
+    pasta com 100 mil entradas precisa abrir na hora. Só as entradas da página
+    recebem stat().
+    """
+    start = page * LOCAL_DIR_PAGE_SIZE
+    rows = []
+    with os.scandir(path) as entries:
+        # Uma entrada a mais só para saber se existe próxima página
+        for entry in itertools.islice(entries, start, start + LOCAL_DIR_PAGE_SIZE + 1):
+            rows.append(entry)
+            if len(rows) > LOCAL_DIR_PAGE_SIZE:
+                break
+        has_next = len(rows) > LOCAL_DIR_PAGE_SIZE
+        rows = rows[:LOCAL_DIR_PAGE_SIZE]
+        lines = []
+        for entry in rows:
+            try:
+                is_dir = entry.is_dir()
+                size = "" if is_dir else format_bytes(entry.stat().st_size)
+            except OSError:
+                is_dir, size = False, "?"
+            name = entry.name + ("/" if is_dir else "")
+            href = local_file_url(entry.path).toString(QUrl.FullyEncoded)
+            lines.append(f'<tr><td><a href="{html.escape(href)}">{html.escape(name)}</a></td><td>{size}</td></tr>')
+
+    base_url = local_file_url(path).toString(QUrl.FullyEncoded)
+    parent = os.path.dirname(os.path.abspath(path))
+    navigation = []
+    if parent != os.path.abspath(path):
+        navigation.append(f'<a href="{html.escape(local_file_url(parent).toString(QUrl.FullyEncoded))}">Pasta acima</a>')
+    if page > 0:
+        navigation.append(f'<a href="{html.escape(base_url)}?pagina={page - 1}">&larr; Anterior</a>')
+    if has_next:
+        navigation.append(f'<a href="{html.escape(base_url)}?pagina={page + 1}">Próxima &rarr;</a>')
+    title = html.escape(path)
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title>'
+            f'<style>body{{font-family:sans-serif}}td{{padding:2px 12px}}</style></head><body>'
+            f'<h2>{title}</h2><p>Entradas {start + 1 if rows else 0}–{start + len(rows)} (página {page + 1}) '
+            f'{" | ".join(navigation)}</p><table>{"".join(lines)}</table>'
+            f'<p>{" | ".join(navigation)}</p></body></html>').encode("utf-8")
+
+
+class LocalFileSchemeHandler(QWebEngineUrlSchemeHandler):
+    """Atende arquivo:/caminho: arquivos via MappedFileDevice, pastas como listagem paginada."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._devices = set() # O Python precisa manter os dispositivos vivos enquanto o job existir
+
+    def requestCreated(self, job):
+        url = job.requestUrl()
+        path = QDir.toNativeSeparators(url.path())
+        try:
+            if os.path.isdir(path):
+                page = QUrlQuery(url).queryItemValue("pagina")
+                device = QBuffer(parent=job)
+                device.setData(render_directory_listing(path, int(page) if page.isdigit() else 0))
+                device.open(QIODevice.ReadOnly)
+                job.reply(b"text/html", device)
+                return
+            device = MappedFileDevice(path)
+        except FileNotFoundError:
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            return
+        except PermissionError:
+            job.fail(QWebEngineUrlRequestJob.RequestDenied)
+            return
+        except (OSError, ValueError) as e:
+            print(f"AVISO: Não foi possível abrir {path}: {e}")
+            job.fail(QWebEngineUrlRequestJob.RequestFailed)
+            return
+        self._devices.add(device)
+        job.destroyed.connect(lambda: self._release(device))
+        mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        job.reply(mime_type.encode("ascii"), device)
+
+    def _release(self, device):
+        self._devices.discard(device)
+        device.release()
+
+
+_local_file_scheme_handler = None
+
+def install_local_file_scheme(web_profile):
+    """Instala no perfil o handler do esquema arquivo: (um só, compartilhado por todos os perfis)."""
+    global _local_file_scheme_handler
+    if _local_file_scheme_handler is None:
+        _local_file_scheme_handler = LocalFileSchemeHandler()
+    web_profile.installUrlSchemeHandler(LOCAL_FILE_SCHEME.encode("ascii"), _local_file_scheme_handler)
+
+
+# --- PERFIL DO MOTOR ---
+def create_web_profile(profile_name, parent, guest_disk_path=None):
+    """Cria o QWebEngineProfile de uma janela.
+
+    Convidado: perfil off-the-record, com cookies, cache e armazenamento só em
+    memória (nada vai para o disco e não há o que limpar ao fechar), ou, com
+    guest_disk_path, o modo antigo numa pasta temporária (--guest-on-disk).
+    Perfil persistente: cache/ e storage/ do layout do perfil; o tipo e o limite
+    do cache são aplicados depois pelo ProfileCacheManager.
+    """
+    if profile_name == "guest_mode" and guest_disk_path is None:
+        web_profile = QWebEngineProfile(parent) # Sem nome de armazenamento = off-the-record
+        web_profile.setHttpCacheType(QWebEngineProfile.MemoryHttpCache)
+        web_profile.setHttpCacheMaximumSize(GUEST_MEMORY_HTTP_CACHE_MAX_MB * 1024 * 1024)
+    elif profile_name == "guest_mode":
+        guest_cache_path = os.path.join(guest_disk_path, "cache")
+        guest_storage_path = os.path.join(guest_disk_path, "storage")
+        os.makedirs(guest_cache_path, exist_ok=True)
+        os.makedirs(guest_storage_path, exist_ok=True)
+        web_profile = QWebEngineProfile("guest_profile", parent)
+        web_profile.setPersistentCookiesPolicy(QWebEngineProfile.NoPersistentCookies)
+        web_profile.setCachePath(guest_cache_path)
+        web_profile.setPersistentStoragePath(guest_storage_path)
+    else:
+        # Cache, dados dos sites e dados do navegador em subpastas separadas (perfis antigos são migrados aqui)
+        web_profile = QWebEngineProfile(profile_name, parent)
+        web_profile.setPersistentCookiesPolicy(QWebEngineProfile.AllowPersistentCookies)
+        web_profile.setCachePath(get_profile_cache_path(profile_name))
+        web_profile.setPersistentStoragePath(get_profile_storage_path(profile_name))
+    install_local_file_scheme(web_profile)
+    return web_profile
+
+
+# --- REGRAS POR SITE E MODO LEVE ---
+# compile_site_rules e SiteRules ficam em navegador_nucleo
+def apply_site_settings(page, settings):
+    """Aplica as configurações resolvidas; as que nenhuma regra define voltam ao padrão do motor."""
+    page_settings = page.settings()
+    for name, (attribute_name, inverted) in SITE_RULE_ATTRIBUTES.items():
+        attribute = getattr(QWebEngineSettings, attribute_name, None)
+        if attribute is None: # Autoplay só existe no Qt >= 5.11
+            continue
+        if name in settings:
+            page_settings.setAttribute(attribute, settings[name] != inverted)
+        else:
+            page_settings.resetAttribute(attribute)
+
+
+class BrowserPage(QWebEnginePage):
+    """Página das abas: aplica as regras por site antes de cada navegação do quadro principal
+    e, no Qt >= 5.13, tem o próprio bloqueador de conteúdo (o contador da aba)."""
+    def __init__(self, profile, site_rules=None, parent=None):
+        super().__init__(profile, parent)
+        self.site_rules = site_rules
+        self._applied_settings = None
+        self.last_navigation_was_form = False
+        self.content_blocker = None
+        if PAGE_REQUEST_INTERCEPTORS:
+            self.content_blocker = ContentBlocker(self)
+            self.setUrlRequestInterceptor(self.content_blocker)
+        # Redirecionamentos e mudanças de URL que não passam por acceptNavigationRequest
+        self.urlChanged.connect(self.apply_site_rules)
+
+    def acceptNavigationRequest(self, url, navigation_type, is_main_frame):
+        if is_main_frame:
+            self.apply_site_rules(url)
+            # O DownloadManager deixa com o motor os downloads que vêm de um formulário
+            self.last_navigation_was_form = navigation_type == QWebEnginePage.NavigationTypeFormSubmitted
+        return super().acceptNavigationRequest(url, navigation_type, is_main_frame)
+
+    def apply_site_rules(self, url):
+        if self.site_rules is None:
+            return
+        settings = self.site_rules.settings_for_host(url.host())
+        if settings is not self._applied_settings: # Mesmo host de antes: nada a fazer
+            apply_site_settings(self, settings)
+            self._applied_settings = settings
+
+
+# --- NOVA CLASSE PARA CADA ABA DO NAVEGADOR ---
+class BrowserTabWidget(QWidget):
+    # Sinais repassados para a janela principal (assim o Browser consegue usar self.sender())
+    url_changed = pyqtSignal(QUrl)
+    title_changed = pyqtSignal(str)
+    icon_changed = pyqtSignal(QIcon)
+    load_finished = pyqtSignal(bool)
+    navigation_timed = pyqtSignal(object) # {"url", "commit_seconds", "load_seconds", "success"}
+
+    def __init__(self, profile, parent=None, initial_url=None, lazy=False, title="", view=None, site_rules=None):
+        super().__init__(parent)
+        self.web_profile = profile # Recebe o perfil de QWebEngineProfile
+        self.site_rules = site_rules
+        self.session_id = None # Identificador da aba no diário de sessão
+        self.icon_host = None # Host do ícone que a barra de abas mostra para esta aba
+
+        # Último estado conhecido: mantido para a aba continuar mostrando título/URL quando descartada
+        self.last_url = QUrl(initial_url) if initial_url else QUrl(DEFAULT_HOME_URL)
+        self.last_title = title
+        self.last_active_time = time.monotonic()
+        # Navegação em andamento: instantes (perf_counter) do loadStarted e do primeiro urlChanged
+        self._navigation_started = None
+        self._navigation_committed = None
+        
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0,0,0,0) # Remove margens extras
+
+        # Abas "preguiçosas" (restauradas da sessão) nascem só como marcador: a
+        # QWebEngineView é criada quando a aba vai para o primeiro plano
+        # Uma view já pronta (do WarmPagePool) é usada em vez de criar outra
+        self.browser = None
+        self._warm_view = view
+        if not lazy:
+            self.ensure_browser()
+
+    def is_loaded(self):
+        return self.browser is not None
+
+    def ensure_browser(self):
+        """Cria a QWebEngineView da aba, se ainda não existir, e carrega a última URL conhecida."""
+        if self.browser is not None:
+            return self.browser
+
+        if self._warm_view is not None:
+            self.browser, self._warm_view = self._warm_view, None
+            self.browser.setParent(self)
+            self.browser.show()
+        else:
+            self.browser = QWebEngineView(self)
+            self.browser.setPage(BrowserPage(self.web_profile, self.site_rules, self.browser)) # Associa a página ao perfil
+
+        self._layout.addWidget(self.browser)
+
+        # Conecta sinais para atualizar a janela principal
+        self.browser.loadStarted.connect(self._load_started)
+        self.browser.urlChanged.connect(self._url_changed)
+        self.browser.titleChanged.connect(self._title_changed)
+        if hasattr(self.browser, 'iconChanged'): # Qt >= 5.7
+            self.browser.iconChanged.connect(self._icon_changed)
+        self.browser.loadFinished.connect(self._load_finished)
+
+        # Carrega a URL inicial
+        self.browser.setUrl(self.last_url)
+        return self.browser
+
+    def _load_started(self):
+        self._navigation_started = time.perf_counter()
+        self._navigation_committed = None
+
+    def _url_changed(self, qurl):
+        # Uma página descartada pode emitir URLs vazias; o último estado conhecido é mantido
+        if self.is_discarded() or qurl.isEmpty():
+            return
+        # Mudanças de URL sem loadStarted (pushState de SPAs) não contam como navegação
+        if self._navigation_started is not None and self._navigation_committed is None:
+            self._navigation_committed = time.perf_counter()
+        self.last_url = QUrl(qurl)
+        # Sinaliza para a janela principal que a URL mudou
+        self.url_changed.emit(self.browser.url())
+
+    def _title_changed(self, title):
+        if self.is_discarded():
+            return
+        self.last_title = title
+        # Sinaliza para a janela principal que o título mudou
+        self.title_changed.emit(title)
+
+    def _icon_changed(self, icon):
+        # Ícone vazio acontece ao começar cada navegação: a aba mantém o que já mostra
+        if self.is_discarded() or icon.isNull():
+            return
+        self.icon_changed.emit(icon)
+
+    def _load_finished(self, success):
+        if self._navigation_started is not None:
+            finished = time.perf_counter()
+            committed = self._navigation_committed
+            self.navigation_timed.emit({
+                "url": self.browser.url(),
+                "commit_seconds": None if committed is None else committed - self._navigation_started,
+                "load_seconds": finished - self._navigation_started,
+                "success": success,
+            })
+            self._navigation_started = self._navigation_committed = None
+        # Sinaliza para a janela principal que o carregamento terminou (útil para icones, etc)
+        self.load_finished.emit(success)
+
+    def current_url(self):
+        """URL da aba, mesmo que a página esteja descartada ou ainda não criada."""
+        if self.browser is None or self.is_discarded():
+            return QUrl(self.last_url)
+        return self.browser.url()
+
+    def current_title(self):
+        """Título da aba, mesmo que a página esteja descartada ou ainda não criada."""
+        if self.browser is None or self.is_discarded():
+            return self.last_title
+        return self.browser.title() or self.last_title
+
+    # --- Ciclo de vida (Qt >= 5.14) ---
+    def lifecycle_state(self):
+        """Estado do ciclo de vida da página, ou None se não houver página ou o Qt não suportar."""
+        if self.browser is None:
+            return None
+        page = self.browser.page()
+        if not hasattr(page, 'lifecycleState'):
+            return None
+        return page.lifecycleState()
+
+    def is_discarded(self):
+        return self.lifecycle_state() == QWebEnginePage.LifecycleState.Discarded
+
+    def is_audible(self):
+        if self.browser is None:
+            return False
+        page = self.browser.page()
+        return hasattr(page, 'recentlyAudible') and page.recentlyAudible()
+
+    def renderer_pid(self):
+        """PID do processo renderizador desta aba (0 se desconhecido, descartada ou não criada)."""
+        if self.browser is None:
+            return 0
+        page = self.browser.page()
+        if not hasattr(page, 'renderProcessPid'):
+            return 0
+        return page.renderProcessPid()
+
+    def set_lifecycle_state(self, state):
+        """Muda o estado do ciclo de vida. Voltar de Discarded para Active recarrega a página."""
+        current = self.lifecycle_state()
+        if current is None or current == state:
+            return False
+        self.browser.page().setLifecycleState(state)
+        return True
+
+    def freeze(self):
+        return self.set_lifecycle_state(QWebEnginePage.LifecycleState.Frozen)
+
+    def discard(self):
+        return self.set_lifecycle_state(QWebEnginePage.LifecycleState.Discarded)
+
+    def activate(self):
+        self.last_active_time = time.monotonic()
+        return self.set_lifecycle_state(QWebEnginePage.LifecycleState.Active)
+
+
+# --- PÁGINAS PRÉ-CRIADAS ---
+def load_page_pool_size(profile_name):
+    """Tamanho do pool de páginas nas preferências do perfil (o convidado usa o padrão)."""
+    if profile_name == "guest_mode":
+        return DEFAULT_PAGE_POOL_SIZE
+    try:
+        size = int(load_profile_settings(profile_name).get("page_pool_size", DEFAULT_PAGE_POOL_SIZE))
+    except (TypeError, ValueError):
+        size = DEFAULT_PAGE_POOL_SIZE
+    return max(0, min(size, PAGE_POOL_MAX_SIZE))
+
+class WarmPagePool(QObject):
+    """Mantém algumas QWebEngineView + QWebEnginePage do perfil já criadas e ocultas.
+
+    Uma nova aba pega uma view pronta (acerto) em vez de montar tudo na hora (falha);
+    o pool é reposto aos poucos depois. Sob pressão de memória fica vazio até ela passar.
+    """
+    def __init__(self, window, web_profile, size=DEFAULT_PAGE_POOL_SIZE, site_rules=None):
+        super().__init__(window)
+        self.window = window # Dono das views guardadas (elas ficam ocultas)
+        self.web_profile = web_profile
+        self.site_rules = site_rules
+        self.size = size
+        self.under_pressure = False
+        self.hits = 0
+        self.misses = 0
+        self._views = []
+
+        self._refill_timer = QTimer(self)
+        self._refill_timer.setSingleShot(True)
+        self._refill_timer.setInterval(PAGE_POOL_REFILL_DELAY_MS)
+        self._refill_timer.timeout.connect(self._refill_one)
+        self.schedule_refill()
+
+    def target_size(self):
+        return 0 if self.under_pressure else self.size
+
+    def take(self):
+        """Devolve uma view pronta ou None (a aba cria a sua); agenda a reposição."""
+        if self._views:
+            self.hits += 1
+            view = self._views.pop()
+            # O about:blank do aquecimento é a entrada atual da view, que history().clear()
+            # manteria: o histórico só é limpo quando a primeira página de verdade terminar
+            view.loadFinished.connect(self._first_load_finished)
+        else:
+            self.misses += 1
+            view = None
+        self.schedule_refill()
+        return view
+
+    def _first_load_finished(self, ok):
+        view = self.sender()
+        if view is None or view.url() == QUrl(PAGE_POOL_WARM_URL):
+            return # Ainda o aquecimento terminando
+        view.loadFinished.disconnect(self._first_load_finished)
+        view.history().clear() # Só a página atual fica: o about:blank some do "Voltar"
+
+    def schedule_refill(self):
+        if len(self._views) < self.target_size() and not self._refill_timer.isActive():
+            self._refill_timer.start()
+
+    def _refill_one(self):
+        if len(self._views) >= self.target_size():
+            return
+        view = QWebEngineView(self.window)
+        view.hide()
+        view.setPage(BrowserPage(self.web_profile, self.site_rules, view))
+        view.setUrl(QUrl(PAGE_POOL_WARM_URL))
+        self._views.append(view)
+        self.schedule_refill()
+
+    def _release_extra(self):
+        while len(self._views) > self.target_size():
+            self._views.pop().deleteLater()
+
+    def resize(self, size):
+        self.size = max(0, min(size, PAGE_POOL_MAX_SIZE))
+        self._release_extra()
+        self.schedule_refill()
+
+    def set_memory_pressure(self, under_pressure):
+        """Sob pressão as páginas guardadas são liberadas; quando passa, o pool volta a encher."""
+        if under_pressure == self.under_pressure:
+            return
+        self.under_pressure = under_pressure
+        if under_pressure:
+            print(f"Pressão de memória: liberando {len(self._views)} página(s) pré-criada(s).")
+        self._release_extra()
+        self.schedule_refill()
+
+    def clear(self):
+        self._refill_timer.stop()
+        self.size = 0
+        self._release_extra()
+
+    def stats(self):
+        return {"size": self.size, "ready": len(self._views), "hits": self.hits, "misses": self.misses,
+                "under_pressure": self.under_pressure}
+
+
+# --- ATUALIZAÇÕES DA INTERFACE AGRUPADAS ---
+class UiUpdateScheduler(QObject):
+    """Junta as mudanças de cada aba (url/título/carregamento) e aplica uma vez por quadro.
+
+    SPAs disparam rajadas de urlChanged/titleChanged; só o estado final de cada
+    aba chega a Browser.apply_tab_update.
+    """
+    def __init__(self, browser):
+        super().__init__(browser)
+        self.browser = browser
+        self._pending = {} # aba -> conjunto de mudanças
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(UI_UPDATE_INTERVAL_MS)
+        self._timer.timeout.connect(self.flush)
+
+    def mark(self, tab, change):
+        if tab is None:
+            return
+        self._pending.setdefault(tab, set()).add(change)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def forget(self, tab):
+        self._pending.pop(tab, None)
+
+    def flush(self):
+        pending, self._pending = self._pending, {}
+        for tab, changes in pending.items():
+            self.browser.apply_tab_update(tab, changes)
+
+
+# --- LISTA DE ABAS (painel vertical e Ctrl+K) ---
+# A busca aproximada (rank_fuzzy) fica em navegador_nucleo
+def tab_search_key(tab):
+    return f"{tab.current_title()} {tab.current_url().toString()}".lower()
+
+
+class TabListModel(QAbstractListModel):
+    """Modelo das abas da janela, na mesma ordem do QTabWidget.
+
+    Mantém os índices que o resto da janela consulta a cada sinal: aba -> posição,
+    id da sessão -> aba, URL -> abas e o texto de busca de cada aba. Assim nada
+    precisa percorrer as abas (nem tabs.indexOf) com centenas delas abertas.
+    """
+    def __init__(self, tab_widget, parent=None):
+        super().__init__(parent)
+        self.tab_widget = tab_widget
+        self._tabs = []
+        self._rows = {} # aba -> posição
+        self._by_id = {} # id da sessão -> aba
+        self._urls = {} # aba -> URL indexada
+        self._by_url = {} # URL -> conjunto de abas
+        self.search_keys = [] # Texto de busca de cada posição (título + URL, minúsculo)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._tabs)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._tabs):
+            return None
+        tab = self._tabs[index.row()]
+        if role == Qt.DisplayRole:
+            return tab.current_title() or "Nova Aba"
+        if role == Qt.ToolTipRole:
+            return tab.current_url().toString()
+        if role == Qt.DecorationRole:
+            return self.tab_widget.tabIcon(index.row())
+        return None
+
+    def _reindex_from(self, row):
+        for position in range(row, len(self._tabs)):
+            self._rows[self._tabs[position]] = position
+
+    def _index_url(self, tab):
+        url = tab.current_url().toString()
+        old_url = self._urls.get(tab)
+        if old_url == url:
+            return
+        if old_url is not None:
+            self._by_url[old_url].discard(tab)
+            if not self._by_url[old_url]:
+                del self._by_url[old_url]
+        self._urls[tab] = url
+        self._by_url.setdefault(url, set()).add(tab)
+
+    def tab_inserted(self, tab, row):
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._tabs.insert(row, tab)
+        self.search_keys.insert(row, tab_search_key(tab))
+        self._by_id[tab.session_id] = tab
+        self._index_url(tab)
+        self._reindex_from(row)
+        self.endInsertRows()
+
+    def tab_removed(self, tab):
+        row = self._rows.pop(tab, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._tabs[row]
+        del self.search_keys[row]
+        if self._by_id.get(tab.session_id) is tab:
+            del self._by_id[tab.session_id]
+        url = self._urls.pop(tab)
+        self._by_url[url].discard(tab)
+        if not self._by_url[url]:
+            del self._by_url[url]
+        self._reindex_from(row)
+        self.endRemoveRows()
+
+    def tab_updated(self, tab):
+        """Título, URL ou ícone da aba mudou: atualiza os índices e repinta a linha (se estiver visível)."""
+        row = self._rows.get(tab)
+        if row is None:
+            return
+        self.search_keys[row] = tab_search_key(tab)
+        self._index_url(tab)
+        model_index = self.index(row)
+        self.dataChanged.emit(model_index, model_index)
+
+    def row_of(self, tab):
+        return self._rows.get(tab, -1)
 
+    def tab_at(self, row):
+        return self._tabs[row]
 
-class ProfileSelectionDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Selecionar Perfil")
-        self.setGeometry(200, 200, 400, 350)
-        
-        self.selected_profile = None
+    def tab_by_id(self, tab_id):
+        return self._by_id.get(tab_id)
 
-        layout = QVBoxLayout(self)
+    def tabs_with_url(self, url):
+        return self._by_url.get(url, set())
 
-        self.profile_list_widget = QListWidget()
-        layout.addWidget(self.profile_list_widget)
 
-        button_layout = QHBoxLayout()
+class TabSwitcherDialog(QDialog):
+    """Ctrl+K: digite partes do título ou da URL e Enter vai para a aba."""
+    def __init__(self, browser):
+        super().__init__(browser, Qt.Popup)
+        self.browser = browser
+        self.model = browser.tab_model
+        self.resize(560, 380)
+        layout = QVBoxLayout(self)
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("Ir para a aba...")
+        self.query_edit.textChanged.connect(self.update_results)
+        self.query_edit.returnPressed.connect(self.accept_current)
+        self.query_edit.installEventFilter(self)
+        layout.addWidget(self.query_edit)
+        self.results = QListWidget()
+        self.results.setUniformItemSizes(True)
+        self.results.itemActivated.connect(lambda item: self.switch_to(item))
+        layout.addWidget(self.results)
+        self.update_results("")
 
-        self.guest_button = QPushButton("Iniciar no Modo Convidado")
-        self.guest_button.clicked.connect(self.select_guest_mode)
-        button_layout.addWidget(self.guest_button)
+    def update_results(self, text):
+        self.results.clear()
+        rows = rank_fuzzy(text, self.model.search_keys)
+        exact = self.model.tabs_with_url(text.strip())
+        if exact: # URL colada inteira: essas abas vêm primeiro
+            exact_rows = sorted(self.model.row_of(tab) for tab in exact)
+            rows = exact_rows + [row for row in rows if row not in exact_rows]
+        for row in rows:
+            tab = self.model.tab_at(row)
+            item = QListWidgetItem(self.browser.tabs.tabIcon(row), tab.current_title() or "Nova Aba")
+            item.setToolTip(tab.current_url().toString())
+            item.setData(Qt.UserRole, tab.session_id)
+            self.results.addItem(item)
+        if self.results.count():
+            self.results.setCurrentRow(0)
 
-        self.create_button = QPushButton("Criar Novo Perfil")
-        self.create_button.clicked.connect(self.create_new_profile)
-        button_layout.addWidget(self.create_button)
+    def eventFilter(self, obj, event):
+        # Setas e PageUp/PageDown na caixa de texto movem a seleção da lista
+        if obj is self.query_edit and event.type() == QEvent.KeyPress and event.key() in (
+                Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown):
+            QApplication.sendEvent(self.results, event)
+            return True
+        return super().eventFilter(obj, event)
 
-        layout.addLayout(button_layout)
+    def accept_current(self):
+        item = self.results.currentItem()
+        if item is not None:
+            self.switch_to(item)
 
-        action_button_layout = QHBoxLayout()
+    def switch_to(self, item):
+        tab = self.model.tab_by_id(item.data(Qt.UserRole))
+        if tab is not None:
+            self.browser.tabs.setCurrentIndex(self.model.row_of(tab))
+        self.accept()
 
-        self.ok_button = QPushButton("Carregar Perfil Selecionado")
-        self.ok_button.clicked.connect(self.accept_selection)
-        self.ok_button.setEnabled(False)
-        action_button_layout.addWidget(self.ok_button)
 
-        self.delete_button = QPushButton("Deletar Perfil Selecionado")
-        self.delete_button.clicked.connect(self.delete_selected_profile)
-        self.delete_button.setEnabled(False)
-        action_button_layout.addWidget(self.delete_button)
+# --- GERENCIADOR DE TAREFAS ---
+class TaskManagerDialog(QDialog):
+    """Lista as abas com PID do renderizador, memória e CPU, atualizando a cada TASK_MANAGER_REFRESH_MS."""
+    COLUMNS = ["Aba", "Estado", "PID", "Memória (MB)", "CPU %"]
 
-        layout.addLayout(action_button_layout)
+    def __init__(self, browser):
+        super().__init__(browser)
+        self.browser = browser
+        self.setWindowTitle("Gerenciador de Tarefas")
+        self.setGeometry(250, 250, 700, 400)
 
-        self.load_profiles()
-        self.profile_list_widget.itemDoubleClicked.connect(self.accept_selection)
-        self.profile_list_widget.itemClicked.connect(self.enable_buttons)
+        layout = QVBoxLayout(self)
 
-        self.enable_buttons()
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(3, Qt.DescendingOrder) # Mais pesadas primeiro
+        layout.addWidget(self.table)
 
-    def load_profiles(self):
-        self.profile_list_widget.clear()
-        profiles_dir = get_profiles_data_dir()
-        existing_profiles = [d for d in os.listdir(profiles_dir) if os.path.isdir(os.path.join(profiles_dir, d))]
-        
-        if not existing_profiles:
-            QMessageBox.information(self, "Nenhum Perfil Encontrado", 
-                                    "Nenhum perfil persistente encontrado. Você pode criar um novo ou iniciar no modo convidado.")
-            self.profile_list_widget.setEnabled(False)
-            self.ok_button.setEnabled(False)
-            self.delete_button.setEnabled(False)
-        else:
-            self.profile_list_widget.setEnabled(True)
-            for profile in existing_profiles:
-                self.profile_list_widget.addItem(profile)
-            if existing_profiles:
-                self.profile_list_widget.setCurrentRow(0)
-                self.enable_buttons()
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
 
-    def enable_buttons(self):
-        is_selected = bool(self.profile_list_widget.currentItem())
-        self.ok_button.setEnabled(is_selected)
-        self.delete_button.setEnabled(is_selected)
+        button_layout = QHBoxLayout()
+        reload_button = QPushButton("Recarregar")
+        reload_button.clicked.connect(self.reload_selected)
+        button_layout.addWidget(reload_button)
+        close_button = QPushButton("Fechar Aba")
+        close_button.clicked.connect(self.close_selected)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
 
-    def select_guest_mode(self):
-        self.selected_profile = "guest_mode"
-        self.accept()
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(TASK_MANAGER_REFRESH_MS)
+        self.refresh()
 
-    def create_new_profile(self):
-        new_profile_name, ok = QInputDialog.getText(
-            self, "Novo Perfil", "Digite o nome para o novo perfil:"
-        )
-        if ok and new_profile_name:
-            new_profile_name = new_profile_name.strip()
-            if not new_profile_name:
-                QMessageBox.warning(self, "Nome Inválido", "O nome do perfil não pode ser vazio.")
-                return
-            
-            if new_profile_name.lower() == "guest" or new_profile_name.lower() == "guest_mode":
-                QMessageBox.warning(self, "Nome Reservado", "O nome 'guest' é reservado para o modo convidado. Por favor, escolha outro nome.")
-                return
+    def selected_tab_ids(self):
+        return {self.table.item(index.row(), 0).data(Qt.UserRole)
+                for index in self.table.selectionModel().selectedRows()}
 
-            profile_path = get_profile_data_path(new_profile_name)
-            if os.path.exists(profile_path) and os.path.isdir(profile_path):
-                QMessageBox.information(self, "Perfil Existente", f"O perfil '{new_profile_name}' já existe e será carregado.")
-            else:
-                QMessageBox.information(self, "Perfil Criado", f"O perfil '{new_profile_name}' foi criado com sucesso!")
+    def refresh(self):
+        if not self.isVisible() and self.table.rowCount():
+            return # Janela fechada: não gasta /proc à toa
+        selected = self.selected_tab_ids()
+        snapshot = self.browser.tab_resource_snapshot()
 
-            self.selected_profile = new_profile_name
-            self.accept()
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(snapshot))
+        for row, entry in enumerate(snapshot):
+            values = [entry["title"] or entry["url"], entry["state"], entry["pid"] or "",
+                      round(entry["rss_bytes"] / (1024 * 1024), 1), round(entry["cpu_percent"], 1)]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, value) # Números ordenam como números
+                if column == 0:
+                    item.setData(Qt.UserRole, entry["tab_id"])
+                    item.setToolTip(entry["url"])
+                self.table.setItem(row, column, item)
+        self.table.setSortingEnabled(True)
 
-    def accept_selection(self):
-        selected_item = self.profile_list_widget.currentItem()
-        if selected_item:
-            self.selected_profile = selected_item.text()
-            self.accept()
-        else:
-            QMessageBox.warning(self, "Nenhuma Seleção", "Por favor, selecione um perfil ou inicie no modo convidado.")
+        self.table.clearSelection()
+        for row in range(self.table.rowCount()):
+            if self.table.item(row, 0).data(Qt.UserRole) in selected:
+                self.table.selectRow(row)
 
-    def delete_selected_profile(self):
-        selected_item = self.profile_list_widget.currentItem()
-        if not selected_item:
-            QMessageBox.warning(self, "Nenhuma Seleção", "Por favor, selecione um perfil para deletar.")
-            return
+        # Renderizadores compartilhados entre abas contam uma vez só no total
+        total_rss = sum({entry["pid"]: entry["rss_bytes"] for entry in snapshot if entry["pid"]}.values())
+        pool = self.browser.page_pool.stats()
+        icons = self.browser.favicons.stats()
+        summary = (f"{len(snapshot)} aba(s), renderizadores usando {format_bytes(total_rss)} | "
+                   f"Páginas prontas: {pool['ready']}/{pool['size']} (acertos {pool['hits']}, falhas {pool['misses']}) | "
+                   f"Ícones: {icons['hit_rate']:.0%} de acertos (memória {icons['memory_hits']}, "
+                   f"disco {icons['disk_hits']}, faltas {icons['misses']}), "
+                   f"{icons['stored']} no banco ({format_bytes(icons['stored_bytes'])})")
+        guest_report = self.browser.guest_memory_report()
+        self.summary_label.setText(f"{summary}\n{guest_report}" if guest_report else summary)
 
-        profile_to_delete = selected_item.text()
-        reply = QMessageBox.question(self, 'Confirmar Exclusão', 
-                                    f"Tem certeza que deseja deletar o perfil '{profile_to_delete}' e todos os seus dados?",
-                                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+    def reload_selected(self):
+        for tab_id in self.selected_tab_ids():
+            tab = self.browser.tab_by_id(tab_id)
+            if tab is not None and tab.is_loaded():
+                tab.browser.reload()
 
-        if reply == QMessageBox.Yes:
-            profile_path = get_profile_data_path(profile_to_delete)
-            if os.path.exists(profile_path):
-                try:
-                    shutil.rmtree(profile_path)
-                    QMessageBox.information(self, "Perfil Deletado", f"O perfil '{profile_to_delete}' foi deletado com sucesso.")
-                    self.load_profiles()
-                except OSError as e:
-                    QMessageBox.critical(self, "Erro ao Deletar", f"Erro ao deletar o perfil '{profile_to_delete}':\n{e}")
-            else:
-                QMessageBox.warning(self, "Erro", "Diretório do perfil não encontrado.")
+    def close_selected(self):
+        for tab_id in self.selected_tab_ids():
+            tab = self.browser.tab_by_id(tab_id)
+            if tab is not None:
+                self.browser.close_tab_by_index(self.browser.tab_model.row_of(tab))
+        self.refresh()
 
 
-# --- NOVA CLASSE PARA CADA ABA DO NAVEGADOR ---
-class BrowserTabWidget(QWidget):
-    def __init__(self, profile, parent=None, initial_url=None):
-        super().__init__(parent)
-        self.web_profile = profile # Recebe o perfil de QWebEngineProfile
-        
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(0,0,0,0) # Remove margens extras
+# --- GERENCIADOR DE CICLO DE VIDA DAS ABAS ---
+class TabLifecycleManager(QObject):
+    """Congela e descarta abas em segundo plano ociosas ou quando o orçamento de memória estoura."""
+    def __init__(self, browser, freeze_after=TAB_FREEZE_AFTER_SECONDS, discard_after=TAB_DISCARD_AFTER_SECONDS,
+                 memory_budget_mb=RENDERER_MEMORY_BUDGET_MB, check_interval_ms=TAB_LIFECYCLE_CHECK_INTERVAL_MS):
+        super().__init__(browser)
+        self.browser = browser
+        self.freeze_after = freeze_after
+        self.discard_after = discard_after
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
 
-        self.browser = QWebEngineView(self)
-        self.browser.setPage(QWebEnginePage(self.web_profile, self.browser)) # Associa a página ao perfil
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.check_tabs)
+        self._timer.start(check_interval_ms)
 
-        layout.addWidget(self.browser)
+    def _all_tabs(self):
+        for i in range(self.browser.tabs.count()):
+            tab = self.browser.tabs.widget(i)
+            if tab is not None:
+                yield tab
 
-        # Conecta sinais para atualizar a janela principal
-        self.browser.urlChanged.connect(self._url_changed)
-        self.browser.titleChanged.connect(self._title_changed)
-        self.browser.loadFinished.connect(self._load_finished)
+    def _background_tabs(self):
+        current = self.browser.tabs.currentWidget()
+        # Abas tocando áudio nunca são suspensas
+        return [tab for tab in self._all_tabs() if tab is not current and not tab.is_audible()]
 
-        # Carrega a URL inicial
-        if initial_url:
-            self.browser.setUrl(QUrl(initial_url))
-        else:
-            self.browser.setUrl(QUrl(DEFAULT_HOME_URL))
+    def check_tabs(self):
+        """Aplica os limites de ociosidade e, depois, o orçamento de memória."""
+        now = time.monotonic()
+        for tab in self._background_tabs():
+            state = tab.lifecycle_state()
+            if state is None: # Marcador de sessão ainda não criado, ou Qt sem suporte a ciclo de vida
+                continue
+            idle = now - tab.last_active_time
+            if idle >= self.discard_after:
+                tab.discard()
+            elif idle >= self.freeze_after and state == QWebEnginePage.LifecycleState.Active:
+                tab.freeze()
+        self.enforce_memory_budget()
 
-    def _url_changed(self, qurl):
-        # Sinaliza para a janela principal que a URL mudou
-        if self.parent() and hasattr(self.parent(), 'tab_url_changed'):
-            self.parent().tab_url_changed(self.browser.url())
+    def renderer_memory_by_pid(self):
+        """Memória residente de cada processo renderizador usado pelas abas desta janela."""
+        usage = {}
+        for tab in self._all_tabs():
+            pid = tab.renderer_pid()
+            if pid and pid not in usage:
+                usage[pid] = get_process_rss_bytes(pid)
+        return usage
 
-    def _title_changed(self, title):
-        # Sinaliza para a janela principal que o título mudou
-        if self.parent() and hasattr(self.parent(), 'tab_title_changed'):
-            self.parent().tab_title_changed(title)
+    def enforce_memory_budget(self):
+        """Descarta abas em segundo plano (a menos usada recentemente primeiro) até caber no orçamento."""
+        if self.memory_budget_bytes <= 0:
+            return
+        usage = self.renderer_memory_by_pid()
+        total = sum(usage.values())
+        # Páginas pré-criadas são as primeiras a sair: não custam nada ao usuário
+        self.browser.page_pool.set_memory_pressure(total > self.memory_budget_bytes)
+        if total <= self.memory_budget_bytes:
+            return
 
-    def _load_finished(self, success):
-        # Sinaliza para a janela principal que o carregamento terminou (útil para icones, etc)
-        if self.parent() and hasattr(self.parent(), 'tab_load_finished'):
-            self.parent().tab_load_finished(success)
+        # Vários sites podem dividir o mesmo renderizador; cada aba "libera" só a sua parte
+        tabs_per_pid = {}
+        for tab in self._all_tabs():
+            pid = tab.renderer_pid()
+            tabs_per_pid[pid] = tabs_per_pid.get(pid, 0) + 1
+
+        candidates = [tab for tab in self._background_tabs() if not tab.is_discarded()]
+        candidates.sort(key=lambda tab: tab.last_active_time)
+        for tab in candidates:
+            if total <= self.memory_budget_bytes:
+                break
+            pid = tab.renderer_pid()
+            share = usage.get(pid, 0) // max(tabs_per_pid.get(pid, 1), 1)
+            if tab.discard():
+                total -= share
+                print(f"Orçamento de memória excedido: aba '{tab.current_title()}' descartada.")
 
 
 class Browser(QMainWindow):
-    def __init__(self, profile_name="guest_mode", initial_url=DEFAULT_HOME_URL):
+    def __init__(self, profile_name="guest_mode", initial_urls=None, guest_on_disk=False):
         super().__init__()
+        # Várias janelas (perfis) convivem no processo: fechar uma libera tudo dela
+        self.setAttribute(Qt.WA_DeleteOnClose)
         self.profile_name = profile_name
         self.is_guest_mode = (self.profile_name == "guest_mode")
         self.guest_temp_path = None
         self._cleaner_thread = None
+        self._previous_tab = None
+        self._next_tab_id = 1
+        self.session_journal = None
+        self.cache_manager = None
+        self.history = None
+        self.bookmarks = None
+        self.favicons = None
+        self.task_manager_dialog = None
+        self.downloads_dialog = None
+        self._security_pixmaps = {}
+        self._security_state = None
+        self.ui_updates = UiUpdateScheduler(self)
+        self._cpu_samples = {} # pid -> (ticks de CPU, instante) da última amostra
+        # Contagem de abas para as métricas: um timer da janela, que morre junto com ela
+        self._tab_count_timer = QTimer(self)
+        self._tab_count_timer.setSingleShot(True)
+        self._tab_count_timer.setInterval(0)
+        self._tab_count_timer.timeout.connect(self._record_tab_count)
 
         # 1. Configura o QWebEngineProfile PRIMEIRO
         if self.is_guest_mode:
-            self.guest_temp_path = get_guest_profile_base_temp_dir()
-            print(f"Iniciando em modo convidado. Dados temporários em: {self.guest_temp_path}")
-
-            guest_cache_path = os.path.join(self.guest_temp_path, "cache")
-            guest_storage_path = os.path.join(self.guest_temp_path, "storage")
-            os.makedirs(guest_cache_path, exist_ok=True)
-            os.makedirs(guest_storage_path, exist_ok=True)
-            
-            self.web_profile = QWebEngineProfile("guest_profile", self)
-            self.web_profile.setPersistentCookiesPolicy(QWebEngineProfile.NoPersistentCookies)
-            self.web_profile.setCachePath(guest_cache_path)
-            self.web_profile.setPersistentStoragePath(guest_storage_path)
+            if guest_on_disk:
+                self.guest_temp_path = get_guest_profile_base_temp_dir()
+                print(f"Iniciando em modo convidado em disco. Dados temporários em: {self.guest_temp_path}")
+            else:
+                print("Iniciando em modo convidado em memória: nada será gravado em disco.")
+            self.web_profile = create_web_profile(self.profile_name, self, self.guest_temp_path)
             self._guest_web_profile_ref = self.web_profile 
+            self.site_rules = SiteRules() # Modo leve do convidado vale só para esta sessão
         else:
-            profile_data_path = get_profile_data_path(self.profile_name)
-            self.web_profile = QWebEngineProfile(self.profile_name, self) 
-            self.web_profile.setPersistentCookiesPolicy(QWebEngineProfile.AllowPersistentCookies)
-            self.web_profile.setCachePath(profile_data_path)
-            self.web_profile.setPersistentStoragePath(profile_data_path)
+            # Só o que a primeira aba precisa antes de existir: as regras aplicadas à página dela,
+            # o cache HTTP configurado antes da primeira requisição e a sessão a restaurar
+            appdata_path = get_profile_appdata_path(self.profile_name)
+            self.web_profile = create_web_profile(self.profile_name, self)
+            self.site_rules = SiteRules(os.path.join(appdata_path, SITE_RULES_FILE_NAME),
+                                        bool(load_profile_settings(self.profile_name).get("lite_mode", False)))
+            # Tipo e limite do cache HTTP; o uso em disco é medido em segundo plano
+            self.cache_manager = ProfileCacheManager(self.profile_name, self.web_profile, self)
+            # Só perfis persistentes guardam a sessão; o modo convidado não deixa rastros
+            self.session_journal = SessionJournal(os.path.join(appdata_path, SESSION_JOURNAL_FILE_NAME), self)
+
+        # Bloqueio de rastreadores e anúncios: cada BrowserPage tem o seu; Qt antigo usa um só no perfil
+        start_filter_engine_loader()
+        self.content_blocker = None
+        if not PAGE_REQUEST_INTERCEPTORS:
+            self.content_blocker = ContentBlocker(self)
+            self.content_blocker.install(self.web_profile)
+
+        # Histórico, favoritos, ícones e downloads abrem depois da primeira pintura (start_deferred_services)
+        self.download_manager = None
+        self._deferred_services_started = False
+        self._deferred_services_timer = QTimer(self) # Da janela: não dispara se ela fechar antes
+        self._deferred_services_timer.setSingleShot(True)
+        self._deferred_services_timer.setInterval(0)
+        self._deferred_services_timer.timeout.connect(self.start_deferred_services)
+
+        # Páginas já criadas para novas abas abrirem sem esperar a QWebEngineView.
+        # Criar o pool só arma um timer: as views vêm depois, em PAGE_POOL_REFILL_DELAY_MS
+        self.page_pool = WarmPagePool(self, self.web_profile, load_page_pool_size(self.profile_name), self.site_rules)
 
         title_suffix = "Modo Convidado" if self.is_guest_mode else f"Perfil: {self.profile_name}"
         self.setWindowTitle(f"Mini Navegador PyQt - {title_suffix}")
@@ -323,6 +4221,19 @@ class Browser(QMainWindow):
 
         layout.addWidget(self.tabs) # Adiciona o QTabWidget ao layout
 
+        # Modelo das abas: índices para não percorrer as abas, painel vertical e Ctrl+K
+        self.tab_model = TabListModel(self.tabs, self)
+        self.tab_list_view = QListView()
+        self.tab_list_view.setModel(self.tab_model)
+        self.tab_list_view.setUniformItemSizes(True) # Só as linhas visíveis são medidas e pintadas
+        self.tab_list_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tab_list_view.clicked.connect(lambda model_index: self.tabs.setCurrentIndex(model_index.row()))
+        self.tab_dock = QDockWidget("Abas", self)
+        self.tab_dock.setFeatures(QDockWidget.DockWidgetMovable) # Sem botão de fechar: quem controla é a toolbar
+        self.tab_dock.setWidget(self.tab_list_view)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.tab_dock)
+        self.tab_dock.hide()
+
         # 3. Barra de Ferramentas
         toolbar = QToolBar("Navegação")
         self.addToolBar(toolbar)
@@ -351,14 +4262,50 @@ class Browser(QMainWindow):
         close_tab_button.triggered.connect(self.close_current_tab)
         close_tab_button.setShortcut(QKeySequence("Ctrl+W")) # Atalho para fechar aba
 
+        self.vertical_tabs_action = toolbar.addAction("Abas Verticais")
+        self.vertical_tabs_action.setCheckable(True)
+        self.vertical_tabs_action.setToolTip("Lista de abas na lateral, legível com centenas de abas abertas")
+        self.vertical_tabs_action.toggled.connect(self.set_vertical_tabs)
+
+        tab_switcher_action = QAction("Ir para Aba...", self)
+        tab_switcher_action.setShortcut(QKeySequence("Ctrl+K"))
+        tab_switcher_action.triggered.connect(self.show_tab_switcher)
+        self.addAction(tab_switcher_action)
+
         manage_profiles_button = toolbar.addAction("Gerenciar Perfis")
         manage_profiles_button.triggered.connect(self.show_profile_management_dialog)
 
+        task_manager_button = toolbar.addAction("Gerenciador de Tarefas")
+        task_manager_button.triggered.connect(self.show_task_manager)
+        task_manager_button.setShortcut(QKeySequence("Shift+Esc"))
+
+        downloads_button = toolbar.addAction("Downloads")
+        downloads_button.triggered.connect(self.show_downloads)
+        downloads_button.setShortcut(QKeySequence("Ctrl+J"))
+
+        # Um clique para links lentos: sem JavaScript, imagens, plugins nem autoplay (salvo regras por site)
+        self.lite_mode_action = toolbar.addAction("Modo Leve")
+        self.lite_mode_action.setCheckable(True)
+        self.lite_mode_action.setChecked(self.site_rules.lite_mode)
+        self.lite_mode_action.setToolTip("Desliga JavaScript, imagens, plugins e autoplay em todos os sites, "
+                                         f"exceto os liberados em {SITE_RULES_FILE_NAME}")
+        self.lite_mode_action.toggled.connect(self.set_lite_mode)
+
+        bookmarks_menu = QMenu("Favoritos", self)
+        add_bookmark_action = bookmarks_menu.addAction("Adicionar/Remover Favorito")
+        add_bookmark_action.triggered.connect(self.toggle_bookmark_for_current_tab)
+        add_bookmark_action.setShortcut(QKeySequence("Ctrl+D"))
+        self.addAction(add_bookmark_action) # Atalho funciona mesmo com o menu fechado
+        bookmarks_menu.addAction("Importar Favoritos...").triggered.connect(self.import_bookmarks)
+        bookmarks_button = toolbar.addAction("Favoritos")
+        bookmarks_button.setMenu(bookmarks_menu)
+        toolbar.widgetForAction(bookmarks_button).setPopupMode(QToolButton.InstantPopup)
+
         self.url_bar_layout = QHBoxLayout()
         
         self.secure_icon = QLabel()
         self.secure_icon.setFixedSize(20, 20)
-        self.secure_icon.setPixmap(QIcon.fromTheme("object-locked", QIcon.fromTheme("dialog-ok")).pixmap(20, 20))
+        self.update_security_icon(QUrl(DEFAULT_HOME_URL))
 
         self.url_bar_layout.addWidget(self.secure_icon)
         
@@ -366,13 +4313,87 @@ class Browser(QMainWindow):
         self.url_bar.returnPressed.connect(self.navigate_to_url_from_bar) # Conectado a nova função
         self.url_bar_layout.addWidget(self.url_bar)
 
+        # Sugestões do histórico: o completer não filtra nada, só mostra o que o histórico ranqueou
+        self.url_suggestions_model = QStandardItemModel(self)
+        self.url_completer = QCompleter(self.url_suggestions_model, self)
+        self.url_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.url_completer.setWidget(self.url_bar)
+        self.url_completer.activated[QModelIndex].connect(self.url_suggestion_activated)
+        self.url_bar.textEdited.connect(self.update_url_suggestions)
+
         toolbar.addWidget(self._create_widget_from_layout(self.url_bar_layout))
 
-        # 4. Adiciona a primeira aba APÓS o QTabWidget ser inicializado
-        self.add_new_tab(QUrl(initial_url))
-        
-        # Garante que os botões da toolbar estejam conectados corretamente após a primeira aba ser criada
-        self.update_toolbar_connections() # Chama isso para a aba inicial
+        # Busca nos favoritos enquanto se digita; uma pasta escolhida abre todas as abas dela
+        self.bookmark_search = QLineEdit()
+        self.bookmark_search.setPlaceholderText("Buscar favoritos")
+        self.bookmark_search.setMaximumWidth(220)
+        self.bookmark_results_model = QStandardItemModel(self)
+        self.bookmark_completer = QCompleter(self.bookmark_results_model, self)
+        self.bookmark_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.bookmark_completer.setWidget(self.bookmark_search)
+        self.bookmark_completer.activated[QModelIndex].connect(self.bookmark_result_activated)
+        self.bookmark_search.textEdited.connect(self.update_bookmark_results)
+        toolbar.addWidget(self.bookmark_search)
+
+        self.blocked_label = QLabel()
+        self.blocked_label.setToolTip("Requisições bloqueadas nesta aba pelo bloqueador de conteúdo")
+        toolbar.addWidget(self.blocked_label)
+        self._blocked_counter_timer = QTimer(self)
+        self._blocked_counter_timer.timeout.connect(self.update_blocked_counter)
+        self._blocked_counter_timer.start(BLOCKED_COUNTER_REFRESH_MS)
+
+        if not self.is_guest_mode and load_profile_settings(self.profile_name).get("vertical_tabs", False):
+            self.vertical_tabs_action.setChecked(True)
+
+        # 4. Restaura a sessão anterior e/ou adiciona a primeira aba APÓS o QTabWidget ser inicializado
+        restored = self.restore_session()
+        if initial_urls:
+            # Só a primeira URL cria página agora; as demais esperam ser selecionadas
+            self.add_new_tab(QUrl(initial_urls[0]))
+            for extra_url in initial_urls[1:]:
+                self.add_lazy_tab(QUrl(extra_url))
+        elif not restored:
+            self.add_new_tab(QUrl(DEFAULT_HOME_URL))
+
+        # 5. Congela/descarta abas em segundo plano para economizar memória e CPU
+        self.lifecycle_manager = TabLifecycleManager(self)
+        # Roda na primeira volta do laço de eventos, com a janela já exibida
+        self._deferred_services_timer.start()
+
+    def start_deferred_services(self):
+        """Abre histórico, favoritos, ícones e downloads (bancos SQLite, threads de escrita, cookies).
+
+        Nada disso é preciso para pintar a janela e começar a carregar a primeira
+        aba, então fica para depois do show(). Ações do usuário que dependem deles
+        (atalhos logo na abertura) chamam aqui antes; a segunda chamada não faz nada.
+        """
+        if self._deferred_services_started:
+            return
+        self._deferred_services_started = True
+        self._deferred_services_timer.stop()
+        if self.is_guest_mode:
+            self.history = HistoryStore(parent=self) # Histórico do convidado fica só em memória
+            self.bookmarks = BookmarkStore(parent=self)
+            self.favicons = FaviconStore(parent=self)
+        else:
+            appdata_path = get_profile_appdata_path(self.profile_name)
+            self.history = HistoryStore(os.path.join(appdata_path, HISTORY_DB_FILE_NAME), self)
+            self.bookmarks = BookmarkStore(os.path.join(appdata_path, BOOKMARKS_DB_FILE_NAME), self)
+            self.favicons = FaviconStore(os.path.join(appdata_path, FAVICONS_DB_FILE_NAME), self)
+        self.bookmarks.imported.connect(self.bookmarks_imported)
+        # Downloads paralelos e retomáveis para tudo que o perfil baixar
+        self.download_manager = DownloadManager(self.web_profile, self)
+        # As abas criadas até aqui ganham agora o ícone guardado do host
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            if self.tabs.tabIcon(index).isNull():
+                self.show_cached_tab_icon(tab, index, tab.current_url().host())
+                self.tab_model.tab_updated(tab)
+        startup_trace.mark_once("histórico, favoritos, ícones e downloads")
+
+    def paintEvent(self, event):
+        startup_trace.mark_once("primeira pintura da janela")
+        super().paintEvent(event)
 
     def _create_widget_from_layout(self, layout):
         widget = QWidget()
@@ -404,25 +4425,86 @@ class Browser(QMainWindow):
         else:
             initial_url = QUrl(DEFAULT_HOME_URL) # Se não for URL, é por clique no botão/duplo clique
 
-        # Cria uma nova instância de BrowserTabWidget, passando o perfil
-        browser_tab = BrowserTabWidget(self.web_profile, self, initial_url)
+        # Cria uma nova instância de BrowserTabWidget, passando o perfil e, se houver, uma página pronta
+        browser_tab = BrowserTabWidget(self.web_profile, self, initial_url, view=self.page_pool.take(),
+                                       site_rules=self.site_rules)
         
         # Adiciona a aba e a torna a aba ativa
-        index = self.tabs.addTab(browser_tab, "Nova Aba")
+        index = self._insert_tab(browser_tab)
         self.tabs.setCurrentIndex(index)
+        return browser_tab
+
+    def add_lazy_tab(self, qurl, title="", tab_id=None):
+        """Adiciona uma aba marcadora: só cria a QWebEngineView quando for selecionada."""
+        browser_tab = BrowserTabWidget(self.web_profile, self, qurl, lazy=True, title=title, site_rules=self.site_rules)
+        self._insert_tab(browser_tab, tab_id)
+        return browser_tab
+
+    def _insert_tab(self, browser_tab, tab_id=None):
+        """Conecta os sinais da aba, registra no diário de sessão e adiciona no fim da barra."""
+        browser_tab.url_changed.connect(self.tab_url_changed)
+        browser_tab.title_changed.connect(self.tab_title_changed)
+        browser_tab.icon_changed.connect(self.tab_icon_changed)
+        browser_tab.load_finished.connect(self.tab_load_finished)
+        browser_tab.navigation_timed.connect(self.tab_navigation_timed)
+        self.schedule_tab_count_metric()
+
+        # Abas restauradas mantêm o id que já têm no diário
+        is_new = tab_id is None
+        if is_new:
+            tab_id = self._next_tab_id
+        self._next_tab_id = max(self._next_tab_id, tab_id + 1)
+        browser_tab.session_id = tab_id
+
+        # O modelo recebe a aba antes: o currentChanged do addTab já encontra os índices em dia
+        self.tab_model.tab_inserted(browser_tab, self.tabs.count())
+        index = self.tabs.addTab(browser_tab, browser_tab.last_title or "Nova Aba")
+        self.tabs.setTabToolTip(index, browser_tab.last_url.toString())
+        # Abas restauradas ou novas já mostram o ícone conhecido do host, sem esperar a rede
+        self.show_cached_tab_icon(browser_tab, index, browser_tab.last_url.host())
+        # A linha do painel vertical foi criada sem ícone: repinta agora que a barra já tem o do host
+        self.tab_model.tab_updated(browser_tab)
+        if is_new and self.session_journal:
+            self.session_journal.record_open(tab_id, index, browser_tab.last_url.toString(), browser_tab.last_title)
+        return index
+
+    def restore_session(self):
+        """Recria as abas da sessão anterior. Só a aba ativa cria uma QWebEngineView."""
+        if not self.session_journal:
+            return False
+        saved_tabs, active_index = self.session_journal.saved_tabs()
+        if not saved_tabs:
+            return False
+
+        # Sem sinais durante a restauração: cada addTab mudaria a aba atual e criaria a página dela
+        self.tabs.blockSignals(True)
+        for saved in saved_tabs:
+            self.add_lazy_tab(QUrl(saved["url"]), saved["title"], tab_id=saved["id"])
+        self.tabs.setCurrentIndex(active_index)
+        self.tabs.blockSignals(False)
+        self.current_tab_changed(active_index)
+        print(f"Sessão restaurada: {len(saved_tabs)} aba(s).")
+        return True
 
     def close_current_tab(self):
         """Fecha a aba atualmente ativa."""
-        current_index = self.tabs.currentIndex()
-        if self.tabs.count() > 1: # Não feche a última aba
-            self.tabs.removeTab(current_index)
-        else:
-            self.close() # Se for a última aba, fecha a janela principal
+        self.close_tab_by_index(self.tabs.currentIndex())
 
     def close_tab_by_index(self, index):
         """Fecha uma aba dado seu índice (usado pelo botão 'x' da aba)."""
         if self.tabs.count() > 1: # Não feche a última aba
+            tab = self.tabs.widget(index)
+            self.tab_model.tab_removed(tab)
             self.tabs.removeTab(index)
+            # removeTab não destrói o widget: sem isso a página continuaria viva consumindo memória
+            if tab is not None:
+                if self.session_journal:
+                    self.session_journal.record_close(tab.session_id)
+                if tab is self._previous_tab:
+                    self._previous_tab = None
+                self.ui_updates.forget(tab)
+                tab.deleteLater()
+                self.schedule_tab_count_metric()
         else:
             self.close() # Se for a última aba, fecha a janela principal
 
@@ -430,132 +4512,387 @@ class Browser(QMainWindow):
         """Retorna a instância de BrowserTabWidget da aba ativa."""
         return self.tabs.currentWidget()
 
+    def tab_by_id(self, tab_id):
+        return self.tab_model.tab_by_id(tab_id)
+
+    def tab_resource_snapshot(self):
+        """Uso de recursos por aba: lista de dicts com tab_id, index, title, url, state, pid, rss_bytes e cpu_percent.
+
+        A CPU é a média desde a chamada anterior (a primeira chamada devolve 0).
+        Abas que dividem um renderizador mostram os números do processo inteiro.
+        """
+        now = time.monotonic()
+        clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        cpu_samples = {}
+        snapshot = []
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            pid = tab.renderer_pid()
+            cpu_percent = 0.0
+            if pid:
+                if pid not in cpu_samples:
+                    cpu_samples[pid] = (get_process_cpu_ticks(pid), now)
+                ticks = cpu_samples[pid][0]
+                previous = self._cpu_samples.get(pid)
+                if ticks is not None and previous and previous[0] is not None and now > previous[1]:
+                    cpu_percent = (ticks - previous[0]) / clock_ticks / (now - previous[1]) * 100
+
+            state = tab.lifecycle_state()
+            if not tab.is_loaded():
+                state_name = "Não carregada"
+            elif state == QWebEnginePage.LifecycleState.Discarded:
+                state_name = "Descartada"
+            elif state == QWebEnginePage.LifecycleState.Frozen:
+                state_name = "Congelada"
+            else:
+                state_name = "Ativa"
+
+            snapshot.append({"tab_id": tab.session_id, "index": index, "title": tab.current_title(),
+                             "url": tab.current_url().toString(), "state": state_name, "pid": pid,
+                             "rss_bytes": get_process_rss_bytes(pid) if pid else 0,
+                             "cpu_percent": max(cpu_percent, 0.0)})
+        self._cpu_samples = cpu_samples
+        return snapshot
+
+    def update_blocked_counter(self):
+        tab = self.current_browser_tab()
+        count = 0
+        if tab is not None and self.content_blocker is not None:
+            count = self.content_blocker.blocked_count_for(tab.current_url())
+        elif tab is not None and tab.browser is not None:
+            page_blocker = getattr(tab.browser.page(), "content_blocker", None)
+            count = page_blocker.blocked_count if page_blocker is not None else 0
+        self.blocked_label.setText(f" Bloqueados: {count} ")
+
+    def show_task_manager(self):
+        self.start_deferred_services()
+        if self.task_manager_dialog is None:
+            self.task_manager_dialog = TaskManagerDialog(self)
+        self.task_manager_dialog.show()
+        self.task_manager_dialog.raise_()
+        self.task_manager_dialog.refresh()
+
+    def show_downloads(self):
+        self.start_deferred_services()
+        if self.downloads_dialog is None:
+            self.downloads_dialog = DownloadsDialog(self.download_manager, self)
+        self.downloads_dialog.show()
+        self.downloads_dialog.raise_()
+        self.downloads_dialog.refresh()
+
     def navigate_to_url_from_bar(self):
         """Navega para a URL digitada na barra de endereço da aba ativa."""
         text = self.url_bar.text().strip()
         if not text:
             return
 
-        current_browser = self.current_browser_tab().browser
-        
-        if os.path.exists(text):
-            url = QUrl.fromLocalFile(text)
-            current_browser.setUrl(url)
-        elif (text.startswith("http://") or
-            text.startswith("https://") or
-            text.startswith("ftp://") or
-            ('.' in text and ' ' not in text)):
-            
-            if not (text.startswith("http://") or text.startswith("https://") or text.startswith("ftp://")):
-                url = "http://" + text
-            else:
-                url = text
-            current_browser.setUrl(QUrl(url))
+        self.url_completer.popup().hide()
+        self.current_browser_tab().browser.setUrl(classify_url_bar_input(text))
+
+    def update_url_suggestions(self, text):
+        """Preenche o popup da barra de endereço com o histórico (consulta de poucos ms)."""
+        suggestions = self.history.suggest(text) if self.history else []
+        self.url_suggestions_model.clear()
+        for url, title in suggestions:
+            item = QStandardItem(f"{url} — {title}" if title else url)
+            item.setData(url, Qt.UserRole)
+            self.url_suggestions_model.appendRow(item)
+        if suggestions:
+            self.url_completer.complete()
         else:
-            search_query = QUrl.toPercentEncoding(text).data().decode('utf-8')
-            search_url = DEFAULT_SEARCH_ENGINE_URL + search_query
-            current_browser.setUrl(QUrl(search_url))
+            self.url_completer.popup().hide()
 
-    def update_url_bar(self, qurl):
-        # Esta função foi removida diretamente do browser.urlChanged.
-        # Agora ela é chamada pela aba ativa através de `tab_url_changed`.
-        pass
+    def url_suggestion_activated(self, index):
+        self.url_bar.setText(index.data(Qt.UserRole))
+        self.navigate_to_url_from_bar()
+
+    def update_bookmark_results(self, text):
+        self.start_deferred_services()
+        results = self.bookmarks.search(text)
+        self.bookmark_results_model.clear()
+        for bookmark_id, is_folder, title, url in results:
+            item = QStandardItem(f"[Pasta] {title}" if is_folder else (f"{title} — {url}" if title != url else url))
+            item.setData(bookmark_id, Qt.UserRole)
+            item.setData(bool(is_folder), Qt.UserRole + 1)
+            item.setData(url, Qt.UserRole + 2)
+            self.bookmark_results_model.appendRow(item)
+        if results:
+            self.bookmark_completer.complete()
+        else:
+            self.bookmark_completer.popup().hide()
+
+    def bookmark_result_activated(self, index):
+        self.bookmark_search.clear()
+        if index.data(Qt.UserRole + 1):
+            self.open_bookmark_folder(index.data(Qt.UserRole))
+        else:
+            self.current_browser_tab().ensure_browser().setUrl(QUrl(index.data(Qt.UserRole + 2)))
+
+    def open_bookmark_folder(self, folder_id):
+        """Abre os favoritos da pasta como abas marcadoras: só a primeira cria página agora."""
+        first_tab = None
+        for url, title in self.bookmarks.folder_bookmarks(folder_id):
+            tab = self.add_lazy_tab(QUrl(url), title)
+            first_tab = first_tab or tab
+        if first_tab is not None:
+            self.tabs.setCurrentWidget(first_tab)
+
+    def toggle_bookmark_for_current_tab(self):
+        tab = self.current_browser_tab()
+        if tab is None:
+            return
+        self.start_deferred_services()
+        url = tab.current_url().toString()
+        if self.bookmarks.contains(url):
+            if self.bookmarks.remove_url(url):
+                print(f"Favorito removido: {url}")
+        elif self.bookmarks.add(url, tab.current_title()) is not None:
+            print(f"Favorito adicionado: {url}")
+
+    def import_bookmarks(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Importar Favoritos", QDir.homePath(),
+                                                   "Favoritos (*.html *.htm *.json Bookmarks);;Todos os arquivos (*)")
+        if not file_path:
+            return
+        self.start_deferred_services()
+        if not self.bookmarks.import_file(file_path):
+            QMessageBox.information(self, "Importar Favoritos", "Já existe uma importação em andamento.")
+
+    def set_vertical_tabs(self, enabled):
+        """Troca a barra de abas pelo painel lateral (ou volta), guardando a escolha no perfil."""
+        self.tab_dock.setVisible(enabled)
+        self.tabs.tabBar().setVisible(not enabled)
+        if enabled:
+            self.tab_list_view.scrollTo(self.tab_model.index(self.tabs.currentIndex()))
+        if not self.is_guest_mode:
+            settings = load_profile_settings(self.profile_name)
+            if settings.get("vertical_tabs", False) != enabled:
+                settings["vertical_tabs"] = enabled
+                save_profile_settings(self.profile_name, settings)
+
+    def show_tab_switcher(self):
+        switcher = TabSwitcherDialog(self)
+        switcher.setAttribute(Qt.WA_DeleteOnClose)
+        # Centralizado no topo da janela, como uma paleta de comandos
+        top_left = self.mapToGlobal(self.rect().topLeft())
+        switcher.move(top_left.x() + (self.width() - switcher.width()) // 2, top_left.y() + 80)
+        switcher.show()
+        switcher.query_edit.setFocus()
+
+    def set_lite_mode(self, enabled):
+        """Liga/desliga o modo leve: vale para as próximas navegações e recarrega a aba atual."""
+        self.site_rules.set_lite_mode(enabled)
+        if not self.is_guest_mode:
+            settings = load_profile_settings(self.profile_name)
+            settings["lite_mode"] = enabled
+            save_profile_settings(self.profile_name, settings)
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            if tab.is_loaded() and not tab.is_discarded():
+                tab.browser.page().apply_site_rules(tab.current_url())
+        current = self.current_browser_tab()
+        if current is not None and current.is_loaded():
+            current.browser.reload()
+        print(f"Modo leve {'ligado' if enabled else 'desligado'}.")
+
+    def bookmarks_imported(self, count, error):
+        if error:
+            QMessageBox.warning(self, "Importar Favoritos", f"Falha ao importar os favoritos: {error}")
+        else:
+            QMessageBox.information(self, "Importar Favoritos", f"{count} favorito(s) importado(s).")
 
     def tab_url_changed(self, qurl):
-        """Chamado quando a URL de uma aba muda."""
-        # Se a aba que mudou for a aba ativa, atualiza a barra de URL principal
-        if self.tabs.currentWidget() == self.sender(): # 'sender()' é a instância de BrowserTabWidget que emitiu o sinal
-            if qurl.isLocalFile():
-                self.url_bar.setText(qurl.toLocalFile())
-            else:
-                self.url_bar.setText(qurl.toString())
-            self.update_security_icon(qurl)
+        """Chamado quando a URL de uma aba muda. A atualização da interface é agrupada por quadro."""
+        self.ui_updates.mark(self.sender(), "url") # 'sender()' é a instância de BrowserTabWidget que emitiu o sinal
 
     def tab_title_changed(self, title):
         """Chamado quando o título de uma aba muda."""
-        # Atualiza o título da aba no QTabWidget
-        index = self.tabs.indexOf(self.sender())
-        if index != -1:
-            self.tabs.setTabText(index, title or "Nova Aba") # Fallback para "Nova Aba" se o título for vazio
+        self.ui_updates.mark(self.sender(), "title")
+
+    def tab_icon_changed(self, icon):
+        """Chamado quando a página de uma aba anuncia um ícone."""
+        self.ui_updates.mark(self.sender(), "icon")
 
     def tab_load_finished(self, success):
         """Chamado quando uma aba termina de carregar."""
         # Você pode usar isso para mostrar/ocultar um spinner de carregamento, etc.
         # Por enquanto, apenas garante que o ícone de segurança seja atualizado.
+        self.ui_updates.mark(self.sender(), "load")
         if self.tabs.currentWidget() == self.sender():
-            self.update_security_icon(self.sender().browser.url())
+            startup_trace.mark_once("primeiro loadFinished")
+            startup_trace.report()
+
+    def tab_navigation_timed(self, timing):
+        """Registra os tempos de uma navegação da aba (loadStarted, primeiro urlChanged e loadFinished)."""
+        # O convidado não deixa rastros: nem o host vai para o log
+        host = None if self.is_guest_mode else (timing["url"].host() or timing["url"].scheme())
+        metrics.record_navigation(self.profile_name, self.sender().session_id, host,
+                                  timing["commit_seconds"], timing["load_seconds"], timing["success"])
+
+    def schedule_tab_count_metric(self):
+        """Registra a contagem de abas no próximo ciclo do loop: a restauração de uma sessão vira um evento só."""
+        if not self._tab_count_timer.isActive():
+            self._tab_count_timer.start()
+
+    def _record_tab_count(self):
+        tabs = [self.tabs.widget(index) for index in range(self.tabs.count())]
+        metrics.record_tab_count(self.profile_name, len(tabs), sum(1 for tab in tabs if tab.is_loaded()))
+
+    def apply_tab_update(self, tab, changes):
+        """Aplica de uma vez o estado mais recente de uma aba (chamado pelo UiUpdateScheduler)."""
+        index = self.tab_model.row_of(tab)
+        if index == -1:
+            return
+        url = tab.current_url()
+        if "url" in changes:
+            # A dica da aba guarda a URL: continua visível mesmo com a página descartada
+            self.tabs.setTabToolTip(index, url.toString())
+            if self.session_journal:
+                self.session_journal.record_url(tab.session_id, url.toString())
+            if self.history:
+                self.history.record_visit(url)
+            if url.host() != tab.icon_host:
+                self.show_cached_tab_icon(tab, index, url.host())
+        if "icon" in changes and tab.browser is not None:
+            icon = tab.browser.icon()
+            if not icon.isNull():
+                self.tabs.setTabIcon(index, icon)
+                tab.icon_host = url.host()
+                if self.favicons:
+                    self.favicons.store(url.host(), tab.browser.iconUrl().toString(), icon)
+        if "title" in changes:
+            title = tab.current_title()
+            self.tabs.setTabText(index, title or "Nova Aba") # Fallback para "Nova Aba" se o título for vazio
+            if self.session_journal:
+                self.session_journal.record_title(tab.session_id, title)
+            if self.history:
+                self.history.record_title(url, title)
+        if "url" in changes or "title" in changes or "icon" in changes:
+            self.tab_model.tab_updated(tab)
+        # Se a aba que mudou for a aba ativa, atualiza a barra de URL principal
+        if tab is self.tabs.currentWidget() and ("url" in changes or "load" in changes):
+            self.show_url_in_bar(url)
+            self.update_security_icon(url)
+
+    def show_cached_tab_icon(self, tab, index, host):
+        """Mostra o ícone guardado para o host (ou nenhum, se não houver) enquanto a página não anuncia o dela."""
+        if self.favicons is None:
+            return # Ainda não abriu: start_deferred_services passa pelas abas depois
+        icon = self.favicons.icon_for_host(host)
+        self.tabs.setTabIcon(index, icon if icon is not None else QIcon())
+        tab.icon_host = host
+
+    def show_url_in_bar(self, qurl):
+        local_path = local_path_from_url(qurl)
+        if local_path is not None:
+            self.url_bar.setText(local_path)
+        else:
+            self.url_bar.setText(qurl.toString())
 
     def current_tab_changed(self, index):
-        """Chamado quando a aba ativa muda."""
-        # Atualiza a barra de URL e o ícone de segurança para refletir a nova aba ativa
+        """Chamado quando a aba ativa muda. Faz o mesmo trabalho fixo, não importa quantas abas existam."""
+        # A aba que saiu do primeiro plano começa a contar o tempo ocioso a partir de agora
+        if self._previous_tab is not None:
+            self._previous_tab.last_active_time = time.monotonic()
+        self._previous_tab = self.tabs.widget(index) if index != -1 else None
+        self.tab_list_view.setCurrentIndex(self.tab_model.index(index))
+
         if index != -1:
             current_tab_widget = self.tabs.widget(index)
             if current_tab_widget:
-                current_url = current_tab_widget.browser.url()
-                if current_url.isLocalFile():
-                    self.url_bar.setText(current_url.toLocalFile())
-                else:
-                    self.url_bar.setText(current_url.toString())
+                # Marcador restaurado da sessão ganha sua página só agora, ao ir para o primeiro plano
+                current_tab_widget.ensure_browser()
+                # Aba congelada ou descartada volta a ficar ativa (descartada recarrega aqui)
+                current_tab_widget.activate()
+                if self.session_journal:
+                    self.session_journal.record_active(current_tab_widget.session_id)
+                # Atualiza a barra de URL e o ícone de segurança para refletir a nova aba ativa
+                current_url = current_tab_widget.current_url()
+                self.show_url_in_bar(current_url)
                 self.update_security_icon(current_url)
-                self.tabs.setTabText(index, current_tab_widget.browser.title() or "Nova Aba")
-                # Garante que os botões de navegação da toolbar estejam conectados ao browser correto
-                self.update_toolbar_connections()
-        
-    def update_toolbar_connections(self):
-        """Atualiza os alvos dos botões da toolbar para a aba ativa."""
-        # Desconecta e reconecta os botões da toolbar para a aba atualmente ativa
-        current_browser = self.current_browser_tab().browser
-        
-        # Percorre as ações da toolbar e atualiza suas conexões
-        for action in self.findChildren(QAction):
-            if action.text() == "Voltar":
-                try:
-                    action.triggered.disconnect()
-                except TypeError: # Ignora se não houver conexão anterior
-                    pass
-                action.triggered.connect(current_browser.back)
-            elif action.text() == "Avançar":
-                try:
-                    action.triggered.disconnect()
-                except TypeError:
-                    pass
-                action.triggered.connect(current_browser.forward)
-            elif action.text() == "Recarregar":
-                try:
-                    action.triggered.disconnect()
-                except TypeError:
-                    pass
-                action.triggered.connect(current_browser.reload)
-            elif action.text() == "Home":
-                try:
-                    action.triggered.disconnect()
-                except TypeError:
-                    pass
-                action.triggered.connect(self._go_home_on_current_tab) # O Home button continua chamando o delegado
+                self.tabs.setTabText(index, current_tab_widget.current_title() or "Nova Aba")
+                # Os botões da toolbar chamam métodos delegados que procuram a aba ativa na hora
+                # do clique, então não há conexões para refazer aqui
+
+    def security_pixmap(self, state):
+        """Pixmap do ícone de segurança, resolvido no tema só na primeira vez."""
+        pixmap = self._security_pixmaps.get(state)
+        if pixmap is None:
+            theme_name, fallback_name, _ = SECURITY_ICON_STATES[state]
+            pixmap = QIcon.fromTheme(theme_name, QIcon.fromTheme(fallback_name)).pixmap(20, 20)
+            self._security_pixmaps[state] = pixmap
+        return pixmap
 
     def update_security_icon(self, qurl):
         """Atualiza o ícone de segurança com base na URL."""
         if qurl.scheme() == "https":
-            self.secure_icon.setPixmap(QIcon.fromTheme("object-locked", QIcon.fromTheme("dialog-ok")).pixmap(20, 20))
-            self.secure_icon.setToolTip("Conexão segura (HTTPS)")
-        elif qurl.isLocalFile():
-             self.secure_icon.setPixmap(QIcon.fromTheme("dialog-information", QIcon.fromTheme("dialog-information")).pixmap(20, 20))
-             self.secure_icon.setToolTip("Arquivo local")
+            state = "secure"
+        elif qurl.isLocalFile() or qurl.scheme() == LOCAL_FILE_SCHEME:
+            state = "local"
         else:
-            self.secure_icon.setPixmap(QIcon.fromTheme("dialog-warning", QIcon.fromTheme("dialog-error")).pixmap(20, 20))
-            self.secure_icon.setToolTip("Conexão não segura ou HTTP")
+            state = "insecure"
+        if state == self._security_state:
+            return
+        self._security_state = state
+        self.secure_icon.setPixmap(self.security_pixmap(state))
+        self.secure_icon.setToolTip(SECURITY_ICON_STATES[state][2])
+
+    def open_forwarded_urls(self, urls):
+        """Abre as URLs recebidas de outra invocação e traz a janela para a frente."""
+        for url in urls:
+            self.add_new_tab(QUrl(url))
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
+    def guest_memory_report(self):
+        """Texto com o limite do cache em memória do convidado e o RSS do processo (vazio fora desse modo).
+
+        O cache HTTP do motor roda no processo do navegador, então é no RSS dele que aparece.
+        """
+        if not self.is_guest_mode or self.guest_temp_path:
+            return ""
+        return (f"Convidado em memória: cache HTTP até {format_bytes(self.web_profile.httpCacheMaximumSize())}, "
+                f"processo do navegador usando {format_bytes(get_process_rss_bytes(os.getpid()))}")
 
     def show_profile_management_dialog(self):
         dialog = ProfileSelectionDialog(self)
         if dialog.exec_() == QDialog.Accepted:
             new_profile = dialog.selected_profile
             if new_profile:
-                QMessageBox.information(self, "Reiniciar", 
-                                        f"O navegador será reiniciado com o perfil '{new_profile}'.")
-                QApplication.quit()
+                # Outra janela no mesmo processo: sem reiniciar o motor nem perder as abas desta
+                if open_profile_window(new_profile) is None:
+                    QMessageBox.information(self, "Perfil em Uso",
+                                            f"O perfil '{new_profile}' já está aberto em outra instância do navegador.")
 
     def closeEvent(self, event):
-        if self.is_guest_mode and self.guest_temp_path:
+        started = time.perf_counter()
+        tab_count = self.tabs.count()
+        forget_profile_window(self)
+        # As páginas precisam ser destruídas antes do QWebEngineProfile (filho desta janela,
+        # que só é destruída depois, por WA_DeleteOnClose): os deleteLater rodam nessa ordem
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            if tab.browser is not None:
+                tab.browser.page().deleteLater()
+        self.page_pool.clear()
+        self._deferred_services_timer.stop()
+        if self.download_manager:
+            self.download_manager.shutdown()
+        # A sessão continua salva ao fechar: o diário é só compactado para a próxima abertura
+        if self.session_journal:
+            self.session_journal.close()
+        if self.history:
+            self.history.close()
+        if self.bookmarks:
+            self.bookmarks.close()
+        if self.favicons:
+            self.favicons.close()
+
+        if self.is_guest_mode and not self.guest_temp_path:
+            print("Modo convidado em memória encerrado: nada a limpar no disco.")
+        elif self.is_guest_mode:
             print(f"Agendando limpeza do modo convidado para: {self.guest_temp_path}")
             
             # Limpa o cache e links visitados do perfil antes de fechar
@@ -567,48 +4904,347 @@ class Browser(QMainWindow):
                 print("Referências ao QWebEngineProfile do modo convidado liberadas.")
 
             gc.collect() 
-            QTimer.singleShot(5000, lambda: self._start_cleaner_thread())
+            # A pasta é renomeada na hora; o que não for apagado agora fica para a próxima inicialização
+            self._start_cleaner_thread()
             
+        metrics.record_window("closed", self.profile_name, time.perf_counter() - started, tab_count)
+        self._tab_count_timer.stop()
+        metrics.record_tab_count(self.profile_name, 0, 0)
         super().closeEvent(event)
 
     def _start_cleaner_thread(self):
         self._cleaner_thread = clean_guest_profile_data_async(self.guest_temp_path)
 
-if __name__ == "__main__":
-    clean_all_old_guest_data_on_startup()
+# --- JANELAS ABERTAS (vários perfis no mesmo processo) ---
+_profile_windows = OrderedDict() # perfil -> Browser, na ordem em que foram abertas
+
+def open_profile_window(profile_name, initial_urls=None, guest_on_disk=False):
+    """Abre a janela do perfil neste processo, ou traz para a frente a que já existe.
+
+    O QtWebEngine (e seus processos de GPU e utilitários) já está de pé: uma janela
+    nova custa só o QWebEngineProfile dela e a primeira aba, sem reiniciar o
+    Chromium nem recarregar as abas das outras janelas. Retorna None se outro
+    processo já está com o perfil aberto (a janela de lá recebe as URLs).
+    """
+    window = _profile_windows.get(profile_name)
+    if window is not None:
+        window.open_forwarded_urls(initial_urls or [])
+        return window
+    # Perfil aberto por outro processo: um segundo QWebEngineProfile sobre as mesmas pastas e bancos
+    # SQLite corromperia os dois. Só a janela de lá é tentada: a instância principal pode
+    # ser este mesmo processo, que chamaria open_profile_window de novo
+    if is_profile_open_elsewhere(profile_name):
+        if forward_to_running_instance(profile_name, initial_urls or [], include_primary=False):
+            print(f"O perfil '{profile_name}' já está aberto em outro processo: a janela de lá foi usada.")
+        else:
+            print(f"AVISO: O perfil '{profile_name}' está aberto em outro processo, que não respondeu.")
+        return None
+
+    started = time.perf_counter()
+    window = Browser(profile_name, initial_urls=initial_urls, guest_on_disk=guest_on_disk)
+    _profile_windows[profile_name] = window
+    window.show()
+    # Cada janela atende as invocações que pedem o seu perfil
+    window.instance_server = SingleInstanceServer(lambda _, urls: window.open_forwarded_urls(urls), profile_name, window)
+    elapsed = time.perf_counter() - started
+    metrics.record_window("opened", profile_name, elapsed, window.tabs.count())
+    print(f"Janela do perfil '{profile_name}' aberta em {elapsed * 1000:.0f} ms.")
+    return window
+
+def forget_profile_window(window):
+    if _profile_windows.get(window.profile_name) is window:
+        del _profile_windows[window.profile_name]
+
+def route_forwarded_urls(profile_name, urls):
+    """Handler da instância principal: perfil pedido ganha (ou reaproveita) uma janela; sem perfil,
+    as URLs vão para a janela ativa (ou a última aberta)."""
+    if profile_name:
+        # O nome vem de outro processo: o mesmo filtro do --profile antes de virar caminho
+        if profile_name != "guest_mode" and profile_name_problem(profile_name, must_be_new=False):
+            print(f"AVISO: Pedido para abrir um perfil com nome inválido ignorado: {profile_name!r}")
+            return
+        open_profile_window(profile_name, urls)
+        return
+    window = QApplication.activeWindow()
+    if not isinstance(window, Browser):
+        window = next(reversed(_profile_windows.values()), None)
+    if window is not None:
+        window.open_forwarded_urls(urls)
+
+# --- RENDERIZAÇÃO EM LOTE (--batch) ---
+def iter_batch_sources(stream):
+    """Entradas da lista já aberta, uma por linha, lidas sob demanda. '#' comenta. Fecha o arquivo no fim."""
+    try:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+    except (OSError, UnicodeDecodeError) as e: # Lida dentro do laço do Qt: vira fim da lista, não uma exceção
+        print(f"ERRO: Leitura da lista do --batch interrompida: {e}")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def batch_output_name(index, url, extension):
+    qurl = QUrl(url)
+    slug = re.sub(r'[^A-Za-z0-9._-]+', '_', qurl.host() + qurl.path()).strip('_.')[:BATCH_SLUG_MAX_CHARS]
+    return f"{index:05d}-{slug or 'pagina'}.{extension}"
+
+
+class BatchRenderSlot(QObject):
+    """Uma página do pool do --batch, reaproveitada de um item para o outro.
+
+    Só é recriada quando um item estoura o tempo: a página travada poderia
+    entregar sinais atrasados ao item seguinte.
+    """
+    done = pyqtSignal(object, object) # (slot, resultado do item)
+
+    def __init__(self, web_profile, output_format, timeout_seconds, parent=None):
+        super().__init__(parent)
+        self.web_profile = web_profile
+        self.output_format = output_format
+        self.timeout_seconds = timeout_seconds
+        self.job = None
+        self.view = None
 
-    app = QApplication(sys.argv)
+        self._timeout = QTimer(self)
+        self._timeout.setSingleShot(True)
+        self._timeout.timeout.connect(self._timed_out)
+        self._settle = QTimer(self)
+        self._settle.setSingleShot(True)
+        self._settle.setInterval(BATCH_SETTLE_MS)
+        self._settle.timeout.connect(self._render)
+        self._create_view()
 
-    profile_to_load = "guest_mode"
-    initial_load_url = DEFAULT_HOME_URL
+    def _create_view(self):
+        if self.view is not None:
+            # Sinais atrasados da página travada não podem cair no próximo item
+            old_page = self.view.page()
+            old_page.loadFinished.disconnect(self._load_finished)
+            old_page.pdfPrintingFinished.disconnect(self._pdf_finished)
+            self.view.deleteLater()
+        self.view = QWebEngineView()
+        self.view.setAttribute(Qt.WA_DontShowOnScreen) # "Mostrada" só para o motor desenhar e o grab() funcionar
+        self.view.setPage(QWebEnginePage(self.web_profile, self.view))
+        self.view.resize(*BATCH_VIEWPORT_SIZE)
+        self.view.show()
+        page = self.view.page()
+        page.loadFinished.connect(self._load_finished)
+        page.pdfPrintingFinished.connect(self._pdf_finished)
 
-    if len(sys.argv) > 1:
-        file_path_from_arg = sys.argv[1]
-        if os.path.exists(file_path_from_arg) and file_path_from_arg.lower().endswith(('.html', '.htm')):
-            initial_load_url = QUrl.fromLocalFile(file_path_from_arg).toString()
-            print(f"Iniciando com arquivo local: {file_path_from_arg}")
+    def start(self, job):
+        """job: {"index", "url", "output"}."""
+        self.job = job
+        job["started"] = time.perf_counter()
+        self._timeout.start(int(self.timeout_seconds * 1000))
+        self.view.page().load(QUrl(job["url"]))
+
+    def _load_finished(self, ok):
+        if self.job is None or "loaded" in self.job:
+            return
+        self.job["loaded"] = time.perf_counter()
+        if not ok:
+            self._finish(False, "falha ao carregar")
+            return
+        self._settle.start() # Dá tempo para fontes e imagens tardias aparecerem
+
+    def _render(self):
+        if self.job is None:
+            return
+        self.job["render_started"] = time.perf_counter()
+        if self.output_format == "pdf":
+            self.view.page().printToPdf(self.job["output"]) # Termina em pdfPrintingFinished
         else:
-            print(f"Argumento inválido ou arquivo não HTML: {file_path_from_arg}")
+            saved = self.view.grab().save(self.job["output"], "PNG")
+            self._finish(saved, "" if saved else "falha ao gravar a imagem")
 
-    profiles_dir = get_profiles_data_dir()
-    existing_profiles = [d for d in os.listdir(profiles_dir) if os.path.isdir(os.path.join(profiles_dir, d))]
-    profiles_exist = bool(existing_profiles)
+    def _pdf_finished(self, file_path, success):
+        if self.job is not None and file_path == self.job["output"]:
+            self._finish(success, "" if success else "falha ao gerar o PDF")
 
-    if profiles_exist:
-        dialog = ProfileSelectionDialog()
-        if dialog.exec_() == QDialog.Accepted:
-            profile_to_load = dialog.selected_profile
+    def _timed_out(self):
+        if self.job is None:
+            return
+        self._settle.stop()
+        self.view.page().triggerAction(QWebEnginePage.Stop)
+        self._create_view()
+        self._finish(False, f"tempo esgotado ({self.timeout_seconds:g}s)")
+
+    def _finish(self, ok, error):
+        self._timeout.stop()
+        job, self.job = self.job, None
+        now = time.perf_counter()
+        loaded = job.get("loaded", now)
+        result = {"index": job["index"], "url": job["url"], "output": job["output"] if ok else None,
+                  "ok": ok, "error": error,
+                  "load_ms": round((loaded - job["started"]) * 1000, 1),
+                  "render_ms": round((now - job.get("render_started", now)) * 1000, 1),
+                  "total_ms": round((now - job["started"]) * 1000, 1)}
+        self.done.emit(self, result)
+
+    def close(self):
+        self._timeout.stop()
+        self._settle.stop()
+        self.view.deleteLater()
+
+
+class BatchRenderer(QObject):
+    """Renderiza as entradas com um pool de `concurrency` páginas e monta o relatório.
+
+    As entradas são consumidas de um iterador conforme as páginas ficam livres,
+    então milhares de URLs não ocupam mais memória que as N páginas do pool.
+    """
+    finished = pyqtSignal(object) # relatório
+
+    def __init__(self, web_profile, sources, output_dir, output_format="pdf",
+                 concurrency=BATCH_DEFAULT_CONCURRENCY, timeout_seconds=BATCH_DEFAULT_TIMEOUT_SECONDS, parent=None):
+        super().__init__(parent)
+        self.sources = enumerate(sources, 1)
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.concurrency = concurrency
+        self.results = []
+        self.active = 0
+        self.started = None
+        self._done = False
+        self.slots = [BatchRenderSlot(web_profile, output_format, timeout_seconds, self) for _ in range(concurrency)]
+        for slot in self.slots:
+            slot.done.connect(self._slot_done)
+
+    def start(self):
+        self.started = time.perf_counter()
+        for slot in self.slots:
+            self._next(slot)
+
+    def _next(self, slot):
+        for index, source in self.sources:
+            url = command_line_url(source)
+            if not url:
+                self.results.append({"index": index, "url": source, "output": None, "ok": False,
+                                     "error": "entrada inválida", "load_ms": 0, "render_ms": 0, "total_ms": 0})
+                continue
+            output = os.path.join(self.output_dir, batch_output_name(index, url, self.output_format))
+            self.active += 1
+            slot.start({"index": index, "url": url, "output": output})
+            return
+        if self.active == 0 and not self._done:
+            self._done = True
+            self.finished.emit(self.report())
+
+    def _slot_done(self, slot, result):
+        self.active -= 1
+        self.results.append(result)
+        status = "ok" if result["ok"] else f"ERRO: {result['error']}"
+        print(f"[{result['index']}] {result['url']} -> {status} ({result['total_ms']:.0f} ms)")
+        # Fora do sinal da página: o próximo load() não acontece dentro do loadFinished/pdfPrintingFinished
+        QTimer.singleShot(0, lambda: self._next(slot))
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        ok_count = sum(1 for result in self.results if result["ok"])
+        return {"format": self.output_format, "concurrency": self.concurrency,
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "total_seconds": round(elapsed, 2),
+                "items_per_second": round(len(self.results) / elapsed, 2) if elapsed > 0 else 0,
+                "ok": ok_count, "failed": len(self.results) - ok_count,
+                "items": sorted(self.results, key=lambda result: result["index"])}
+
+    def close(self):
+        for slot in self.slots:
+            slot.close()
+
+
+def run_batch(app, args):
+    """Modo --batch: renderiza tudo sem janela e grava o relatório JSON. Retorna o código de saída."""
+    os.makedirs(args.output, exist_ok=True)
+    report_path = args.report or os.path.join(args.output, BATCH_REPORT_FILE_NAME)
+    profile_name = args.profile or "guest_mode"
+    web_profile = create_web_profile(profile_name, None)
+    sources = itertools.chain(args.urls, iter_batch_sources(args.batch_list))
+    renderer = BatchRenderer(web_profile, sources, args.output, args.format, args.concurrency, args.timeout)
+    report = {}
+
+    def batch_finished(result):
+        report.update(result, profile=profile_name)
+        app.quit()
+
+    renderer.finished.connect(batch_finished)
+    QTimer.singleShot(0, renderer.start)
+    app.exec_()
+
+    # As páginas precisam ser destruídas antes do perfil
+    renderer.close()
+    QApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    web_profile.deleteLater()
+    QApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+
+    if not report: # O laço de eventos terminou sem o lote chegar ao fim
+        print("ERRO: A renderização em lote foi interrompida antes de terminar; nenhum relatório gravado.")
+        return 1
+    with open(report_path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
+    print(f"{report['ok']} de {report['ok'] + report['failed']} item(ns) renderizado(s) em {report['total_seconds']}s "
+          f"({report['items_per_second']}/s). Relatório: {report_path}")
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    if args.startup_trace:
+        startup_trace.start()
+    if args.batch and "QT_QPA_PLATFORM" not in os.environ and not any(arg == "-platform" for arg in qt_argv):
+        os.environ["QT_QPA_PLATFORM"] = "offscreen" # Lote não precisa de tela
+
+    register_local_file_scheme() # Esquemas só podem ser registrados antes do QApplication
+    app = QApplication(qt_argv)
+    startup_trace.mark("QApplication")
+    if args.batch:
+        sys.exit(run_batch(app, args))
+
+    # args, qt_argv e initial_load_urls vêm da entrada rápida, no topo do módulo.
+    # Sem URLs: restaura a sessão do perfil (ou abre a página inicial)
+    # Só a instância que fica aberta grava métricas (quem só repassou URLs já saiu)
+    metrics.start_log(os.path.join(get_app_base_data_dir(), METRICS_DIR_NAME, METRICS_LOG_FILE_NAME))
+    metrics.event("session_start", pid=os.getpid())
+    if args.metrics_port is not None:
+        metrics.start_http(args.metrics_port)
+
+    if args.guest:
+        profile_to_load = "guest_mode"
+    elif args.profile:
+        profile_to_load = args.profile
+    else:
+        existing_profiles = list_profiles()
+        if args.no_dialog:
+            profile_to_load = "guest_mode"
+        elif existing_profiles:
+            dialog = ProfileSelectionDialog(profiles=existing_profiles)
+            if dialog.exec_() == QDialog.Accepted:
+                profile_to_load = dialog.selected_profile
+            else:
+                QMessageBox.information(None, "Nenhum Perfil Selecionado", 
+                                        "Nenhum perfil persistente foi selecionado. Iniciando no modo convidado.")
+                profile_to_load = "guest_mode"
         else:
-            QMessageBox.information(None, "Nenhum Perfil Selecionado", 
-                                    "Nenhum perfil persistente foi selecionado. Iniciando no modo convidado.")
+            QMessageBox.information(None, "Iniciando em Modo Convidado", 
+                                    "Nenhum perfil persistente encontrado. Iniciando no modo convidado.\n"
+                                    "Você pode criar um novo perfil usando a opção 'Gerenciar Perfis'.")
             profile_to_load = "guest_mode"
-    else:
-        QMessageBox.information(None, "Iniciando em Modo Convidado", 
-                                "Nenhum perfil persistente encontrado. Iniciando no modo convidado.\n"
-                                "Você pode criar um novo perfil usando a opção 'Gerenciar Perfis'.")
-        profile_to_load = "guest_mode"
+    startup_trace.mark("escolha do perfil")
+
+    # Só renomeia as sobras de convidados anteriores; a exclusão roda depois que a janela aparece
+    tombstone_old_guest_data_on_startup()
 
-    browser_window = Browser(profile_to_load, initial_url=initial_load_url)
-    browser_window.show()
+    browser_window = open_profile_window(profile_to_load, initial_load_urls, guest_on_disk=args.guest_on_disk)
+    if browser_window is None: # Outro processo abriu o perfil depois da entrada rápida
+        metrics.stop()
+        sys.exit(0)
+    startup_trace.mark("janela principal exibida")
+    # Atende quem não disse qual perfil usar e abre novos perfis neste mesmo processo
+    primary_instance_server = SingleInstanceServer(route_forwarded_urls)
+    QTimer.singleShot(CLEANUP_START_DELAY_MS, clean_guest_tombstones_async)
+    QTimer.singleShot(CLEANUP_START_DELAY_MS, clean_profile_leftovers_async)
 
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    wait_for_background_threads()
+    metrics.event("session_end", exit_code=exit_code)
+    metrics.stop()
+    sys.exit(exit_code)
@@ -0,0 +1,862 @@
+"""Partes do Mini Navegador PyQt que não dependem do QtWebEngine.
+
+Filtros de conteúdo, downloads em partes, diário de sessão, importação de
+favoritos em JSON, regras por site e a busca do Ctrl+K usam só a biblioteca
+padrão e o QtCore. O navegador.py importa daqui; os testes também, mesmo
+onde o QtWebEngine (ou as bibliotecas de sistema dele) não carrega.
+"""
+import os
+import re
+import time
+import json
+import heapq
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+from PyQt5.QtCore import QObject, QTimer
+
+# --- Downloads ---
+DOWNLOAD_MAX_CONNECTIONS = 6            # Conexões simultâneas somando todos os downloads, de todas as abas
+DOWNLOAD_MAX_CHUNKS = 4                 # Partes paralelas por arquivo
+DOWNLOAD_MIN_CHUNK_BYTES = 4 * 1024 * 1024  # Arquivos menores que isso não são divididos
+DOWNLOAD_BUFFER_BYTES = 256 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 30
+DOWNLOAD_MAX_RETRIES = 3                # Reconexões por parte antes de desistir
+DOWNLOAD_PART_SUFFIX = ".part"
+DOWNLOAD_STATE_SUFFIX = ".part.json"    # Progresso de cada parte: permite retomar depois de fechar
+DOWNLOAD_STATE_SAVE_INTERVAL_SECONDS = 1.0
+DOWNLOAD_PROGRESS_INTERVAL_SECONDS = 0.5
+
+# --- Lista de abas ---
+TAB_SWITCHER_RESULT_LIMIT = 50          # Abas listadas pelo Ctrl+K
+FUZZY_WORD_SEPARATORS = " ./-_:?=&#"    # Um termo logo depois destes conta como início de palavra
+
+# --- Diário de sessão ---
+SESSION_FLUSH_DELAY_MS = 500            # Agrupa rajadas de mudanças numa única escrita
+SESSION_COMPACT_AFTER_RECORDS = 500     # Reescreve o diário só com o estado atual depois de N linhas
+
+# --- Favoritos ---
+BOOKMARK_IMPORT_READ_BYTES = 64 * 1024  # Os importadores leem o arquivo neste tamanho de pedaço
+
+# --- Regras por site e modo leve ---
+SITE_RULES_CACHE_SIZE = 4096            # Hosts com as configurações já resolvidas
+# Regra -> (atributo do QWebEngineSettings, invertido?)
+SITE_RULE_ATTRIBUTES = {
+    "javascript": ("JavascriptEnabled", False),
+    "images": ("AutoLoadImages", False),
+    "plugins": ("PluginsEnabled", False),
+    "autoplay": ("PlaybackRequiresUserGesture", True),
+}
+LITE_MODE_SETTINGS = {"javascript": False, "images": False, "plugins": False, "autoplay": False}
+
+# --- Exportação e importação de perfis ---
+PROFILE_ARCHIVE_ROOT = "perfil"         # Arquivos do perfil ficam em perfil/... dentro do .tar.gz
+
+
+# --- UTILITÁRIOS ---
+def format_bytes(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+# --- BLOQUEADOR DE CONTEÚDO ---
+# Tipos de recurso entendidos nas opções dos filtros ($script, $image, ...)
+FILTER_RESOURCE_TYPES = {"script", "image", "stylesheet", "xmlhttprequest", "subdocument", "font",
+                         "media", "object", "ping", "websocket", "other"}
+FILTER_OPTION_ALIASES = {"xhr": "xmlhttprequest", "frame": "subdocument", "css": "stylesheet",
+                         "object-subrequest": "object"}
+# Opções que não mudam o que é bloqueado aqui
+FILTER_IGNORED_OPTIONS = {"important", "match-case", "all"}
+
+FILTER_TOKEN_RE = re.compile(r'[a-z0-9%]+')
+FILTER_DOMAIN_RULE_RE = re.compile(r'^\|\|([a-z0-9.-]+)\^$')
+# Tokens que aparecem em quase toda URL não servem para indexar
+FILTER_COMMON_TOKENS = {"http", "https", "www", "com", "net", "org", "js", "html", "php"}
+SECOND_LEVEL_LABELS = {"co", "com", "org", "net", "gov", "edu", "ac", "gob"}
+
+def registrable_domain(host):
+    """Aproximação do domínio registrável ('a.b.exemplo.com.br' -> 'exemplo.com.br') sem a Public Suffix List."""
+    labels = host.split(".")
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+def host_in_domains(host, domains):
+    """Verdadeiro se o host ou algum domínio pai dele está no conjunto (custo proporcional aos rótulos)."""
+    while host:
+        if host in domains:
+            return True
+        _, _, host = host.partition(".")
+    return False
+
+def filter_pattern_to_regex(pattern):
+    """Converte a sintaxe de filtro (||, |, *, ^) numa expressão regular."""
+    if len(pattern) > 2 and pattern.startswith("/") and pattern.endswith("/"):
+        return pattern[1:-1]
+    regex = ""
+    if pattern.startswith("||"):
+        regex = r"^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?"
+        pattern = pattern[2:]
+    elif pattern.startswith("|"):
+        regex = "^"
+        pattern = pattern[1:]
+    end_anchor = pattern.endswith("|")
+    if end_anchor:
+        pattern = pattern[:-1]
+    for char in pattern:
+        if char == "*":
+            regex += ".*"
+        elif char == "^":
+            regex += r"(?:[^\w\-.%]|$)"
+        else:
+            regex += re.escape(char)
+    return regex + ("$" if end_anchor else "")
+
+def filter_pattern_token(pattern):
+    """Escolhe o token mais longo do padrão que certamente aparece inteiro na URL, ou None."""
+    if len(pattern) > 2 and pattern.startswith("/") and pattern.endswith("/"):
+        return None # Expressão regular crua: vai para a lista de verificação direta
+    left_bounded = pattern.startswith("|")
+    right_bounded = pattern.endswith("|")
+    body = pattern.strip("|")
+    best = None
+    for match in FILTER_TOKEN_RE.finditer(body):
+        start, end = match.span()
+        if (start == 0 and not left_bounded) or (end == len(body) and not right_bounded):
+            continue # Pode ser só um pedaço de um token maior da URL
+        if (start > 0 and body[start - 1] == "*") or (end < len(body) and body[end] == "*"):
+            continue
+        token = match.group()
+        if len(token) < 2 or token in FILTER_COMMON_TOKENS:
+            continue
+        if best is None or len(token) > len(best):
+            best = token
+    return best
+
+def parse_filter_line(line):
+    """Interpreta uma linha de lista EasyList.
+
+    Retorna None (comentário, regra cosmética ou opção não suportada),
+    (é_exceção, "domain", domínio) ou (é_exceção, "pattern", token, regra).
+    """
+    line = line.strip().lower()
+    if not line or line.startswith(("!", "[")) or "##" in line or "#@#" in line or "#?#" in line or "#$#" in line:
+        return None
+    exception = line.startswith("@@")
+    if exception:
+        line = line[2:]
+
+    pattern, option_text = line, ""
+    if "$" in line and not (line.startswith("/") and line.endswith("/")):
+        pattern, _, option_text = line.rpartition("$")
+
+    third_party = None
+    included_types = set()
+    excluded_types = set()
+    include_domains = exclude_domains = None
+    for option in filter(None, option_text.split(",")):
+        negated = option.startswith("~")
+        name = FILTER_OPTION_ALIASES.get(option.lstrip("~"), option.lstrip("~"))
+        if name in ("third-party", "3p"):
+            third_party = not negated
+        elif name in ("first-party", "1p"):
+            third_party = negated
+        elif name in FILTER_RESOURCE_TYPES:
+            (excluded_types if negated else included_types).add(name)
+        elif name.startswith("domain="):
+            domains = name[len("domain="):].split("|")
+            include_domains = frozenset(d for d in domains if d and not d.startswith("~")) or None
+            exclude_domains = frozenset(d[1:] for d in domains if d.startswith("~")) or None
+        elif name not in FILTER_IGNORED_OPTIONS:
+            return None # $document, $popup, $csp=, $redirect=...: melhor não aplicar do que errar
+    if not pattern or pattern in ("*", "|", "||"):
+        return None
+
+    resource_types = None
+    if included_types or excluded_types:
+        resource_types = frozenset((included_types or FILTER_RESOURCE_TYPES) - excluded_types)
+
+    if not option_text:
+        domain_match = FILTER_DOMAIN_RULE_RE.match(pattern)
+        if domain_match:
+            return exception, "domain", domain_match.group(1)
+    rule = (filter_pattern_to_regex(pattern), third_party, resource_types, include_domains, exclude_domains)
+    return exception, "pattern", filter_pattern_token(pattern), rule
+
+
+class FilterEngine:
+    """Listas de filtros compiladas para consulta rápida.
+
+    Regras "||dominio^" viram conjuntos de domínios (consulta por sufixo do host).
+    As demais são indexadas por um token que tem de aparecer na URL: para cada
+    requisição só as regras dos tokens da própria URL são testadas.
+    """
+    def __init__(self):
+        self.blocked_domains = set()
+        self.allowed_domains = set()
+        self.block_index = {}
+        self.block_fallback = []
+        self.allow_index = {}
+        self.allow_fallback = []
+        self.rule_count = 0
+        self._compiled = {}
+
+    def add_line(self, line):
+        parsed = parse_filter_line(line)
+        if parsed is None:
+            return
+        self.rule_count += 1
+        exception, kind = parsed[0], parsed[1]
+        if kind == "domain":
+            (self.allowed_domains if exception else self.blocked_domains).add(parsed[2])
+            return
+        token, rule = parsed[2], parsed[3]
+        if token is None:
+            (self.allow_fallback if exception else self.block_fallback).append(rule)
+        else:
+            index = self.allow_index if exception else self.block_index
+            index.setdefault(token, []).append(rule)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_compiled"] = {} # Expressões são recompiladas sob demanda
+        return state
+
+    def _regex(self, source):
+        compiled = self._compiled.get(source)
+        if compiled is None:
+            try:
+                compiled = re.compile(source)
+            except re.error:
+                compiled = re.compile(r"(?!)") # Regra inválida nunca casa
+            self._compiled[source] = compiled
+        return compiled
+
+    def _rule_matches(self, rule, url, first_party_host, third_party, resource_type):
+        regex_source, rule_third_party, resource_types, include_domains, exclude_domains = rule
+        if rule_third_party is not None and rule_third_party != third_party:
+            return False
+        if resource_types is not None and resource_type not in resource_types:
+            return False
+        if include_domains is not None and not host_in_domains(first_party_host, include_domains):
+            return False
+        if exclude_domains is not None and host_in_domains(first_party_host, exclude_domains):
+            return False
+        return self._regex(regex_source).search(url) is not None
+
+    def _matches_any(self, index, fallback, url, tokens, first_party_host, third_party, resource_type):
+        for token in tokens:
+            for rule in index.get(token, ()):
+                if self._rule_matches(rule, url, first_party_host, third_party, resource_type):
+                    return True
+        for rule in fallback:
+            if self._rule_matches(rule, url, first_party_host, third_party, resource_type):
+                return True
+        return False
+
+    def should_block(self, url, host, first_party_host="", resource_type="other"):
+        url = url.lower()
+        host = host.lower()
+        first_party_host = first_party_host.lower()
+        third_party = bool(first_party_host) and registrable_domain(host) != registrable_domain(first_party_host)
+        tokens = set(FILTER_TOKEN_RE.findall(url))
+
+        if not (host_in_domains(host, self.blocked_domains) or
+                self._matches_any(self.block_index, self.block_fallback, url, tokens,
+                                  first_party_host, third_party, resource_type)):
+            return False
+        if host_in_domains(host, self.allowed_domains):
+            return False
+        return not self._matches_any(self.allow_index, self.allow_fallback, url, tokens,
+                                     first_party_host, third_party, resource_type)
+
+
+# --- DOWNLOADS ---
+# Conexões abertas por todos os downloads, de todas as abas e janelas
+download_connection_slots = threading.BoundedSemaphore(DOWNLOAD_MAX_CONNECTIONS)
+
+class DownloadMismatchError(ValueError):
+    """A resposta do servidor não é o arquivo que o motor ia baixar."""
+
+
+class ParallelDownload:
+    """Baixa uma URL em partes paralelas (requisições Range) com estado em disco para retomar.
+
+    Os bytes vão para "<destino>.part" e o progresso de cada parte para
+    "<destino>.part.json"; ao terminar o .part vira o arquivo final. Servidores sem
+    Range (ou sem tamanho conhecido) recebem uma conexão só. Não usa Qt: roda em
+    qualquer thread e pode ser testado contra um servidor HTTP local.
+    """
+    def __init__(self, url, target_path, headers=None, max_chunks=DOWNLOAD_MAX_CHUNKS,
+                 min_chunk_bytes=DOWNLOAD_MIN_CHUNK_BYTES, slots=None, expected_type=None, expected_name=None):
+        self.url = url
+        self.target_path = target_path
+        self.part_path = target_path + DOWNLOAD_PART_SUFFIX
+        self.state_path = target_path + DOWNLOAD_STATE_SUFFIX
+        self.headers = dict(headers or {})
+        # O que o motor recebeu (tipo e nome sugerido): a nossa resposta tem de ser a mesma
+        self.expected_type = expected_type
+        self.expected_name = expected_name
+        self.max_chunks = max_chunks
+        self.min_chunk_bytes = min_chunk_bytes
+        self.slots = slots or download_connection_slots
+        self.total_bytes = None
+        self.supports_ranges = False
+        self.validator = {}
+        self.probed = False
+        self.chunks = [] # [início, fim inclusivo (None = até o fim), bytes já gravados]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Interrompe as conexões; o estado fica salvo para retomar depois."""
+        self._stop.set()
+
+    def downloaded_bytes(self):
+        with self._lock:
+            return sum(chunk[2] for chunk in self.chunks)
+
+    def _request(self, byte_range=None):
+        headers = dict(self.headers)
+        if byte_range:
+            headers["Range"] = byte_range
+        return urllib.request.Request(self.url, headers=headers)
+
+    def check_response(self, headers):
+        """Levanta DownloadMismatchError se a resposta não é o arquivo que o motor recebeu
+        (ex.: uma página de login em HTML no lugar do arquivo, por falta da sessão)."""
+        content_type = (headers.get_content_type() if headers.get("Content-Type") else "").lower()
+        if self.expected_type and content_type and content_type != self.expected_type.lower():
+            raise DownloadMismatchError(f"o servidor respondeu {content_type} em vez de {self.expected_type}")
+        if self.expected_name:
+            file_name = headers.get_filename()
+            if not file_name: # Sem Content-Disposition o nome vem da URL (só compara se tiver extensão)
+                file_name = os.path.basename(urllib.parse.unquote(urllib.parse.urlsplit(self.url).path))
+                file_name = file_name if "." in file_name else None
+            if file_name and os.path.basename(file_name) != self.expected_name:
+                raise DownloadMismatchError(f"o servidor mandou '{file_name}' em vez de '{self.expected_name}'")
+
+    def probe(self):
+        """Descobre o tamanho e se o servidor aceita Range pedindo só o primeiro byte."""
+        with self.slots:
+            with urllib.request.urlopen(self._request("bytes=0-0"), timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+                status = response.status
+                headers = response.headers
+        self.check_response(headers)
+        self.validator = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+        total = headers.get("Content-Range", "").rpartition("/")[2] if status == 206 else headers.get("Content-Length", "")
+        self.total_bytes = int(total) if total.isdigit() else None
+        self.supports_ranges = status == 206 and self.total_bytes is not None
+        self.probed = True
+
+    def load_state(self):
+        """Reaproveita as partes de uma tentativa anterior se o arquivo no servidor não mudou."""
+        try:
+            with open(self.state_path, encoding="utf-8") as state_file:
+                state = json.load(state_file)
+            part_size = os.path.getsize(self.part_path)
+        except (OSError, ValueError):
+            return False
+        if not self.supports_ranges or state.get("url") != self.url or state.get("total_bytes") != self.total_bytes \
+                or state.get("validator") != self.validator or part_size != self.total_bytes:
+            return False
+        chunks = state.get("chunks")
+        if not isinstance(chunks, list) or not all(isinstance(chunk, list) and len(chunk) == 3 for chunk in chunks):
+            return False
+        self.chunks = chunks
+        return True
+
+    def save_state(self):
+        with self._lock:
+            state = {"url": self.url, "total_bytes": self.total_bytes, "validator": self.validator,
+                     "chunks": [list(chunk) for chunk in self.chunks]}
+        temp_path = self.state_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as state_file:
+                json.dump(state, state_file)
+            os.replace(temp_path, self.state_path)
+        except OSError as e:
+            print(f"AVISO: Não foi possível salvar o estado do download em {self.state_path}: {e}")
+
+    def plan_chunks(self):
+        if not self.supports_ranges:
+            end = self.total_bytes - 1 if self.total_bytes else None
+            return [[0, end, 0]]
+        count = max(1, min(self.max_chunks, self.total_bytes // self.min_chunk_bytes))
+        chunk_size = self.total_bytes // count
+        return [[i * chunk_size, self.total_bytes - 1 if i == count - 1 else (i + 1) * chunk_size - 1, 0]
+                for i in range(count)]
+
+    def _download_chunk(self, chunk):
+        """Baixa uma parte, reconectando de onde parou.
+
+        Desiste depois de DOWNLOAD_MAX_RETRIES falhas seguidas sem nenhum byte novo.
+        """
+        attempts = 0
+        while not self._stop.is_set():
+            start, end, done = chunk
+            if end is not None and start + done > end:
+                return
+            byte_range = f"bytes={start + done}-{end}" if self.supports_ranges else None
+            try:
+                with self.slots:
+                    with urllib.request.urlopen(self._request(byte_range), timeout=DOWNLOAD_TIMEOUT_SECONDS) as response, \
+                            open(self.part_path, "r+b") as part_file:
+                        if self.supports_ranges and response.status != 206:
+                            raise OSError(f"o servidor ignorou o Range (HTTP {response.status})")
+                        part_file.seek(start + done)
+                        while not self._stop.is_set():
+                            data = response.read(DOWNLOAD_BUFFER_BYTES)
+                            if not data:
+                                break
+                            part_file.write(data)
+                            with self._lock:
+                                chunk[2] += len(data)
+                if self._stop.is_set() or end is None or chunk[0] + chunk[2] > end:
+                    return
+                raise OSError("conexão encerrada antes do fim da parte")
+            except (OSError, http.client.HTTPException) as e:
+                attempts = 1 if chunk[2] > done else attempts + 1
+                if attempts > DOWNLOAD_MAX_RETRIES:
+                    raise
+                print(f"Download de {self.url}: parte em {start} falhou ({e}); tentativa {attempts}/{DOWNLOAD_MAX_RETRIES}.")
+                if not self.supports_ranges:
+                    # Sem Range não há como continuar do meio: recomeça do zero
+                    with self._lock:
+                        chunk[2] = 0
+                    with open(self.part_path, "wb"):
+                        pass
+                self._stop.wait(attempts)
+
+    def run(self, progress=None):
+        """Baixa até terminar ou até stop(). Retorna True se o arquivo final ficou completo.
+
+        progress(baixados, total) é chamado a cada DOWNLOAD_PROGRESS_INTERVAL_SECONDS.
+        Erros de rede são relançados depois de salvar o estado.
+        """
+        self.probe()
+        if self.load_state():
+            print(f"Retomando download de {self.url}: {format_bytes(self.downloaded_bytes())} já baixados.")
+        else:
+            self.chunks = self.plan_chunks()
+            with open(self.part_path, "wb") as part_file:
+                if self.supports_ranges:
+                    part_file.truncate(self.total_bytes) # Cada parte escreve direto na sua posição
+        self.save_state()
+
+        last_save = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(self.chunks)) as pool:
+            pending = {pool.submit(self._download_chunk, chunk) for chunk in self.chunks}
+            errors = []
+            while pending:
+                done, pending = wait_futures(pending, timeout=DOWNLOAD_PROGRESS_INTERVAL_SECONDS)
+                for future in done:
+                    if future.exception() is not None:
+                        errors.append(future.exception())
+                        self.stop() # Uma parte desistiu: para as outras e guarda o estado
+                if progress:
+                    progress(self.downloaded_bytes(), self.total_bytes)
+                if time.monotonic() - last_save >= DOWNLOAD_STATE_SAVE_INTERVAL_SECONDS:
+                    self.save_state()
+                    last_save = time.monotonic()
+
+        if errors or self._stop.is_set():
+            self.save_state()
+            if errors:
+                raise errors[0]
+            return False
+        os.replace(self.part_path, self.target_path)
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+        return True
+
+
+# --- DIÁRIO DE SESSÃO ---
+class SessionJournal(QObject):
+    """Diário de sessão somente-anexação: cada mudança de aba vira uma linha JSON.
+
+    As linhas são gravadas aos poucos (agrupadas por SESSION_FLUSH_DELAY_MS) e o
+    arquivo é compactado de tempos em tempos. Uma linha cortada por uma queda do
+    navegador é simplesmente ignorada na leitura.
+    """
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self._tabs = {}           # id da aba -> {"url": ..., "title": ...}
+        self._order = []          # ids na ordem em que aparecem na barra de abas
+        self._active_id = None
+        self._pending = []
+        self._records_since_compaction = 0
+        self._file = None
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(SESSION_FLUSH_DELAY_MS)
+        self._flush_timer.timeout.connect(self.flush)
+
+        self._replay()
+
+    def _replay(self):
+        try:
+            journal_file = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"AVISO: Não foi possível ler o diário de sessão {self.path}: {e}")
+            return
+        damaged = False
+        with journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    damaged = True # Linha incompleta de uma escrita interrompida
+                    continue
+                if isinstance(record, dict):
+                    self._apply(record)
+                    self._records_since_compaction += 1
+        # Uma linha cortada no fim colaria na próxima escrita: reescreve o diário antes de anexar
+        if damaged or self._records_since_compaction >= SESSION_COMPACT_AFTER_RECORDS:
+            self.compact()
+
+    def _apply(self, record):
+        op = record.get("op")
+        tab_id = record.get("id")
+        if op == "open":
+            self._tabs[tab_id] = {"url": record.get("url", ""), "title": record.get("title", "")}
+            if tab_id in self._order:
+                self._order.remove(tab_id)
+            index = min(max(record.get("index", len(self._order)), 0), len(self._order))
+            self._order.insert(index, tab_id)
+        elif op in ("url", "title"):
+            if tab_id in self._tabs:
+                self._tabs[tab_id][op] = record.get(op, "")
+        elif op == "close":
+            self._tabs.pop(tab_id, None)
+            if tab_id in self._order:
+                self._order.remove(tab_id)
+            if self._active_id == tab_id:
+                self._active_id = None
+        elif op == "active":
+            if tab_id in self._tabs:
+                self._active_id = tab_id
+
+    def saved_tabs(self):
+        """Abas salvas como (lista de dicts id/url/title na ordem, índice da aba ativa)."""
+        tabs = []
+        active_index = 0
+        for tab_id in self._order:
+            saved = self._tabs[tab_id]
+            if not saved.get("url"):
+                continue
+            if tab_id == self._active_id:
+                active_index = len(tabs)
+            tabs.append({"id": tab_id, "url": saved["url"], "title": saved.get("title", "")})
+        return tabs, active_index
+
+    def _append(self, record):
+        self._apply(record)
+        self._pending.append(json.dumps(record, ensure_ascii=False))
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def record_open(self, tab_id, index, url, title=""):
+        self._append({"op": "open", "id": tab_id, "index": index, "url": url, "title": title})
+
+    def record_url(self, tab_id, url):
+        if tab_id in self._tabs and self._tabs[tab_id]["url"] != url:
+            self._append({"op": "url", "id": tab_id, "url": url})
+
+    def record_title(self, tab_id, title):
+        if tab_id in self._tabs and self._tabs[tab_id]["title"] != title:
+            self._append({"op": "title", "id": tab_id, "title": title})
+
+    def record_close(self, tab_id):
+        if tab_id in self._tabs:
+            self._append({"op": "close", "id": tab_id})
+
+    def record_active(self, tab_id):
+        if tab_id in self._tabs and self._active_id != tab_id:
+            self._append({"op": "active", "id": tab_id})
+
+    def flush(self):
+        """Anexa as linhas pendentes ao diário (sem reescrever o arquivo)."""
+        self._flush_timer.stop()
+        if not self._pending:
+            return
+        lines = self._pending
+        self._pending = []
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+        except OSError as e:
+            print(f"AVISO: Não foi possível gravar o diário de sessão {self.path}: {e}")
+            return
+        self._records_since_compaction += len(lines)
+        if self._records_since_compaction >= SESSION_COMPACT_AFTER_RECORDS:
+            self.compact()
+
+    def compact(self):
+        """Reescreve o diário só com o estado atual (arquivo temporário + os.replace, atômico)."""
+        self._flush_timer.stop()
+        self._pending = [] # Já aplicadas ao estado em memória, entram no instantâneo
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        records = []
+        for index, tab_id in enumerate(self._order):
+            saved = self._tabs[tab_id]
+            records.append({"op": "open", "id": tab_id, "index": index, "url": saved["url"], "title": saved["title"]})
+        if self._active_id is not None:
+            records.append({"op": "active", "id": self._active_id})
+
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as temp_file:
+                for record in records:
+                    temp_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"AVISO: Não foi possível compactar o diário de sessão {self.path}: {e}")
+            return
+        self._records_since_compaction = len(records)
+
+    def close(self):
+        self.flush()
+        self.compact()
+
+
+# --- IMPORTAÇÃO DE FAVORITOS (JSON) ---
+JSON_NUMBER_OR_LITERAL_RE = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null')
+JSON_SCALAR_END_RE = re.compile(r'[\s,\]}]')
+
+def iter_json_events(stream, read_size=BOOKMARK_IMPORT_READ_BYTES):
+    """Percorre um JSON aos pedaços, sem montá-lo inteiro em memória.
+
+    Gera eventos (tipo, valor): ("start_map", None), ("key", nome), ("end_map", None),
+    ("start_array", None), ("end_array", None) e ("value", escalar).
+    """
+    buffer = ""
+    position = 0
+    eof = False
+    expect_key = [] # Pilha: True dentro de objeto quando o próximo string é uma chave
+
+    def fill():
+        nonlocal buffer, position, eof
+        data = stream.read(read_size)
+        if not data:
+            eof = True
+        buffer = buffer[position:] + data
+        position = 0
+
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,:":
+            if buffer[position] == ":" and expect_key:
+                expect_key[-1] = False
+            elif buffer[position] == "," and expect_key and expect_key[-1] is not None:
+                expect_key[-1] = True
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                if expect_key: # Arquivo cortado no meio de um objeto ou array
+                    raise ValueError("JSON inválido: o arquivo termina antes de fechar todos os objetos")
+                return
+            fill()
+            continue
+
+        char = buffer[position]
+        if char == "{":
+            expect_key.append(True)
+            position += 1
+            yield "start_map", None
+        elif char == "}":
+            expect_key.pop()
+            position += 1
+            yield "end_map", None
+        elif char == "[":
+            expect_key.append(None) # Arrays não têm chaves
+            position += 1
+            yield "start_array", None
+        elif char == "]":
+            expect_key.pop()
+            position += 1
+            yield "end_array", None
+        elif char == '"':
+            try:
+                value, end = json.decoder.scanstring(buffer, position + 1)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill() # A string continua no próximo pedaço
+                continue
+            position = end
+            if expect_key and expect_key[-1]:
+                yield "key", value
+            else:
+                yield "value", value
+        else:
+            end = JSON_SCALAR_END_RE.search(buffer, position)
+            if end is None and not eof:
+                fill() # O número ou literal pode continuar no próximo pedaço
+                continue
+            end = end.start() if end else len(buffer)
+            if not JSON_NUMBER_OR_LITERAL_RE.fullmatch(buffer, position, end):
+                raise ValueError(f"JSON inválido perto de: {buffer[position:position + 20]!r}")
+            yield "value", json.loads(buffer[position:end])
+            position = end
+
+
+# --- REGRAS POR SITE E MODO LEVE ---
+def compile_site_rules(raw_rules):
+    """Monta o índice sufixo -> configurações a partir do conteúdo de site_rules.json.
+
+    Cada chave é um host (vale também para os subdomínios; '*.' e '.' no início
+    são ignorados, '*' sozinho vale para todos os sites). O valor é um objeto com
+    as configurações de SITE_RULE_ATTRIBUTES ou a string "leve".
+    """
+    index = {}
+    ignored = 0
+    if not isinstance(raw_rules, dict):
+        raw_rules = {}
+        ignored += 1
+    for pattern, value in raw_rules.items():
+        host = pattern.strip().lower()
+        host = "" if host == "*" else host.lstrip("*").lstrip(".").rstrip(".")
+        if value == "leve":
+            settings = dict(LITE_MODE_SETTINGS)
+        elif isinstance(value, dict):
+            settings = {name: enabled for name, enabled in value.items()
+                        if name in SITE_RULE_ATTRIBUTES and isinstance(enabled, bool)}
+        else:
+            settings = None
+        if not settings or (not host and pattern.strip() != "*"):
+            ignored += 1
+            continue
+        index.setdefault(host, {}).update(settings)
+    if ignored:
+        print(f"AVISO: {ignored} regra(s) por site inválida(s) ignorada(s).")
+    return index
+
+
+class SiteRules:
+    """Regras por site do perfil (site_rules.json) mais o modo leve global.
+
+    A consulta percorre os sufixos do host ('a.exemplo.com', 'exemplo.com', 'com')
+    num dicionário: custa um acesso por rótulo, seja qual for o número de regras.
+    A regra mais específica vence em cada configuração; com o modo leve ligado o
+    ponto de partida é LITE_MODE_SETTINGS, e as regras ainda podem liberar um site.
+    O que nenhuma regra define fica no padrão do motor (autoplay só com gesto, etc.).
+    """
+    def __init__(self, rules_path=None, lite_mode=False):
+        self.rules_path = rules_path
+        self.lite_mode = lite_mode
+        self._index = {}
+        self._resolved = {} # host -> configurações (o mesmo dict enquanto nada mudar)
+        if rules_path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.rules_path, encoding="utf-8") as rules_file:
+                raw_rules = json.load(rules_file)
+        except FileNotFoundError:
+            raw_rules = {}
+        except (OSError, ValueError) as e:
+            print(f"AVISO: Regras por site inválidas em {self.rules_path}: {e}")
+            raw_rules = {}
+        self._index = compile_site_rules(raw_rules)
+        self._resolved.clear()
+
+    def set_lite_mode(self, enabled):
+        self.lite_mode = enabled
+        self._resolved.clear()
+
+    def settings_for_host(self, host):
+        settings = self._resolved.get(host)
+        if settings is not None:
+            return settings
+        settings = dict(LITE_MODE_SETTINGS) if self.lite_mode else {}
+        settings.update(self._index.get("", {}))
+        suffixes = []
+        suffix = host.lower()
+        while suffix:
+            suffixes.append(suffix)
+            _, _, suffix = suffix.partition(".")
+        for suffix in reversed(suffixes): # Do domínio mais geral para o mais específico
+            settings.update(self._index.get(suffix, {}))
+        if len(self._resolved) >= SITE_RULES_CACHE_SIZE:
+            self._resolved.clear()
+        self._resolved[host] = settings
+        return settings
+
+
+# --- BUSCA DAS ABAS (Ctrl+K) ---
+def fuzzy_match_cost(term, pattern, key):
+    """Custo de um termo da busca no texto (menor é melhor), ou None se não casar.
+
+    Trecho contínuo no início de uma palavra < trecho contínuo no meio < letras
+    na ordem, espalhadas (quanto mais espalhadas, pior).
+    """
+    position = key.find(term)
+    if position >= 0:
+        at_word_start = position == 0 or key[position - 1] in FUZZY_WORD_SEPARATORS
+        return (0 if at_word_start else 1) + position / 10000
+    match = pattern.match(key)
+    if match is None:
+        return None
+    return 2 + (match.end(1) - match.start(1) - len(term)) / len(term)
+
+def subsequence_pattern(term):
+    """'abc' -> '[^a]*(a[^b]*b[^c]*c)': cada letra casa na primeira ocorrência depois da anterior.
+
+    Sem '.*?', uma chave que não casa falha numa passada só, sem retrocesso.
+    """
+    escaped = [re.escape(char) for char in term]
+    body = escaped[0] + "".join(f"[^{char}]*{char}" for char in escaped[1:])
+    return re.compile(f"[^{escaped[0]}]*({body})", re.DOTALL)
+
+def rank_fuzzy(query, keys, limit=TAB_SWITCHER_RESULT_LIMIT):
+    """Índices de keys que casam com todos os termos de query, os melhores primeiros.
+
+    Cada termo vira uma expressão regular compilada uma vez (subsequence_pattern),
+    então a varredura das chaves roda no motor de regex em C: 1000 abas em poucos ms.
+    """
+    terms = query.lower().split()
+    if not terms:
+        return list(range(min(limit, len(keys))))
+    patterns = [subsequence_pattern(term) for term in terms]
+    scored = []
+    for row, key in enumerate(keys):
+        total = 0
+        for term, pattern in zip(terms, patterns):
+            cost = fuzzy_match_cost(term, pattern, key)
+            if cost is None:
+                break
+            total += cost
+        else:
+            scored.append((total, row))
+    return [row for _, row in heapq.nsmallest(limit, scored)]
+
+
+# --- ARQUIVOS DE PERFIL EXPORTADOS ---
+def archive_member_path(name):
+    """Caminho relativo de um membro 'perfil/...' do arquivo, ou None se ele apontar para fora da pasta."""
+    parts = name.replace("\\", "/").split("/")
+    if len(parts) < 2 or parts[0] != PROFILE_ARCHIVE_ROOT:
+        return None
+    parts = [part for part in parts[1:] if part not in ("", ".")]
+    if not parts or ".." in parts or ":" in parts[0]:
+        return None
+    return os.path.join(*parts)
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# navegador.py e navegador_nucleo.py ficam na raiz do repositório, não num pacote instalado
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def qt_core_app():
+    """QCoreApplication para os QObject/QTimer usados nos testes (sem janela)."""
+    from PyQt5.QtCore import QCoreApplication
+    return QCoreApplication.instance() or QCoreApplication([])
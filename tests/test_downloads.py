@@ -0,0 +1,193 @@
+import http.server
+import json
+import os
+import re
+import threading
+
+import pytest
+
+import navegador_nucleo as nucleo
+
+PAYLOAD_SIZE = 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)$")
+
+
+class RangeServer(http.server.ThreadingHTTPServer):
+    """Servidor local com suporte a Range; guarda os cabeçalhos de cada pedido."""
+    daemon_threads = True
+
+    def __init__(self, payload, accept_ranges=True):
+        super().__init__(("127.0.0.1", 0), RangeRequestHandler)
+        self.payload = payload
+        self.accept_ranges = accept_ranges
+        self.etag = '"v1"'
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def url(self, name="arquivo.bin"):
+        return f"http://127.0.0.1:{self.server_address[1]}/{name}"
+
+    def ranges(self):
+        """Início de cada Range pedido (menos a sondagem do primeiro byte), em ordem."""
+        with self._lock:
+            headers = list(self.requests)
+        starts = []
+        for request in headers:
+            match = RANGE_RE.match(request.get("Range") or "")
+            if match and request.get("Range") != "bytes=0-0":
+                starts.append(int(match.group(1)))
+        return sorted(starts)
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.requests.append(dict(self.headers))
+        payload = server.payload
+        match = RANGE_RE.match(self.headers.get("Range") or "")
+        if server.accept_ranges and match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(payload) - 1
+            body = payload[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+        else:
+            body = payload
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", server.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def payload():
+    return bytes(range(256)) * (PAYLOAD_SIZE // 256)
+
+
+@pytest.fixture
+def server(payload):
+    server = RangeServer(payload)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_download(server, tmp_path, **kwargs):
+    kwargs.setdefault("min_chunk_bytes", CHUNK_BYTES)
+    kwargs.setdefault("slots", threading.BoundedSemaphore(8))
+    return nucleo.ParallelDownload(server.url(), str(tmp_path / "arquivo.bin"), **kwargs)
+
+
+def write_partial_state(server, tmp_path, payload, fraction=2):
+    """Simula uma sessão anterior interrompida: cada parte baixou 1/fraction do seu trecho."""
+    download = make_download(server, tmp_path)
+    download.probe()
+    download.chunks = download.plan_chunks()
+    with open(download.part_path, "wb") as part_file:
+        part_file.truncate(download.total_bytes)
+        for chunk in download.chunks:
+            chunk[2] = (chunk[1] - chunk[0] + 1) // fraction
+            part_file.seek(chunk[0])
+            part_file.write(payload[chunk[0]:chunk[0] + chunk[2]])
+    download.save_state()
+    server.requests.clear()
+    return [chunk[0] + chunk[2] for chunk in download.chunks]
+
+
+def test_splits_into_parallel_chunks(server, payload, tmp_path):
+    download = make_download(server, tmp_path, max_chunks=4)
+    assert download.run() is True
+    assert (tmp_path / "arquivo.bin").read_bytes() == payload
+    chunk_size = PAYLOAD_SIZE // 4
+    assert server.ranges() == [0, chunk_size, 2 * chunk_size, 3 * chunk_size]
+    # Concluído: sem .part nem estado para retomar
+    assert not os.path.exists(download.part_path)
+    assert not os.path.exists(download.state_path)
+
+
+def test_small_file_is_not_split(server, payload, tmp_path):
+    download = make_download(server, tmp_path, min_chunk_bytes=PAYLOAD_SIZE * 2)
+    assert download.run() is True
+    assert server.ranges() == [0]
+    assert (tmp_path / "arquivo.bin").read_bytes() == payload
+
+
+def test_server_without_ranges_uses_one_connection(server, payload, tmp_path):
+    server.accept_ranges = False
+    download = make_download(server, tmp_path)
+    assert download.run() is True
+    assert download.supports_ranges is False
+    assert len(server.requests) == 2 # Sondagem + download inteiro
+    assert (tmp_path / "arquivo.bin").read_bytes() == payload
+
+
+def test_sends_the_given_headers(server, tmp_path):
+    download = make_download(server, tmp_path, headers={"Cookie": "sessao=abc", "Referer": "http://exemplo.com/"})
+    assert download.run() is True
+    assert all(request.get("Cookie") == "sessao=abc" for request in server.requests)
+    assert all(request.get("Referer") == "http://exemplo.com/" for request in server.requests)
+
+
+def test_resumes_from_sidecar_state(server, payload, tmp_path):
+    resume_offsets = write_partial_state(server, tmp_path, payload)
+    download = make_download(server, tmp_path)
+    assert download.run() is True
+    # Cada parte continua de onde parou, sem baixar de novo o que já estava no .part
+    assert server.ranges() == resume_offsets
+    assert (tmp_path / "arquivo.bin").read_bytes() == payload
+
+
+def test_validator_mismatch_restarts_from_scratch(server, payload, tmp_path):
+    write_partial_state(server, tmp_path, payload)
+    # O arquivo mudou no servidor: as partes antigas não valem mais
+    server.payload = payload[::-1]
+    server.etag = '"v2"'
+    download = make_download(server, tmp_path)
+    assert download.run() is True
+    chunk_size = PAYLOAD_SIZE // nucleo.DOWNLOAD_MAX_CHUNKS
+    assert server.ranges() == [index * chunk_size for index in range(nucleo.DOWNLOAD_MAX_CHUNKS)]
+    assert (tmp_path / "arquivo.bin").read_bytes() == payload[::-1]
+
+
+def test_corrupt_state_is_ignored(server, payload, tmp_path):
+    write_partial_state(server, tmp_path, payload)
+    state_path = tmp_path / ("arquivo.bin" + nucleo.DOWNLOAD_STATE_SUFFIX)
+    state = json.loads(state_path.read_text())
+    state["chunks"] = "quebrado"
+    state_path.write_text(json.dumps(state))
+    download = make_download(server, tmp_path)
+    assert download.run() is True
+    assert (tmp_path / "arquivo.bin").read_bytes() == payload
+
+
+def test_probe_rejects_a_different_content_type(server, tmp_path):
+    download = make_download(server, tmp_path, expected_type="application/pdf")
+    with pytest.raises(nucleo.DownloadMismatchError):
+        download.run()
+    assert download.probed is False # O DownloadManager devolve o download ao motor
+    assert not os.path.exists(download.part_path)
+
+
+def test_probe_rejects_a_different_file_name(server, tmp_path):
+    download = make_download(server, tmp_path, expected_type="application/octet-stream", expected_name="outro.zip")
+    with pytest.raises(nucleo.DownloadMismatchError):
+        download.probe()
+
+
+def test_probe_accepts_the_expected_response(server, tmp_path):
+    download = make_download(server, tmp_path, expected_type="application/octet-stream", expected_name="arquivo.bin")
+    download.probe()
+    assert download.probed is True
+    assert download.supports_ranges is True
+    assert download.total_bytes == PAYLOAD_SIZE
@@ -0,0 +1,234 @@
+import io
+import json
+import os
+
+import pytest
+
+import navegador_nucleo as nucleo
+
+
+# --- Bloqueador de conteúdo ---
+@pytest.fixture
+def filter_engine():
+    engine = nucleo.FilterEngine()
+    for line in ("! comentário",
+                 "##.anuncio",
+                 "||anuncios.exemplo.com^",
+                 "@@||anuncios.exemplo.com/permitido^",
+                 "/banner/*$image",
+                 "||rastreador.net^$third-party",
+                 "/popup/*$popup",
+                 "||so-aqui.org^$domain=noticias.com|~blog.noticias.com"):
+        engine.add_line(line)
+    return engine
+
+
+def test_filter_engine_blocks_domain_and_subdomains(filter_engine):
+    assert filter_engine.should_block("https://anuncios.exemplo.com/a.js", "anuncios.exemplo.com", "site.com", "script")
+    assert filter_engine.should_block("https://cdn.anuncios.exemplo.com/a.js", "cdn.anuncios.exemplo.com", "site.com",
+                                      "script")
+    assert not filter_engine.should_block("https://exemplo.com/a.js", "exemplo.com", "site.com", "script")
+
+
+def test_filter_engine_exceptions_win(filter_engine):
+    assert not filter_engine.should_block("https://anuncios.exemplo.com/permitido/x.js", "anuncios.exemplo.com",
+                                          "site.com", "script")
+
+
+def test_filter_engine_resource_type_option(filter_engine):
+    url = "https://site.com/banner/topo.png"
+    assert filter_engine.should_block(url, "site.com", "site.com", "image")
+    assert not filter_engine.should_block(url, "site.com", "site.com", "script")
+
+
+def test_filter_engine_third_party_option(filter_engine):
+    url = "https://rastreador.net/pixel.gif"
+    assert filter_engine.should_block(url, "rastreador.net", "site.com", "image")
+    assert not filter_engine.should_block(url, "rastreador.net", "www.rastreador.net", "image")
+
+
+def test_filter_engine_domain_option(filter_engine):
+    url = "https://so-aqui.org/x.js"
+    assert filter_engine.should_block(url, "so-aqui.org", "noticias.com", "script")
+    assert not filter_engine.should_block(url, "so-aqui.org", "blog.noticias.com", "script")
+    assert not filter_engine.should_block(url, "so-aqui.org", "outro.com", "script")
+
+
+def test_filter_engine_skips_comments_cosmetic_and_unsupported_rules(filter_engine):
+    assert filter_engine.rule_count == 5
+    assert not filter_engine.should_block("https://site.com/popup/x", "site.com", "site.com", "other")
+
+
+def test_filter_engine_survives_pickle(filter_engine):
+    import pickle
+    restored = pickle.loads(pickle.dumps(filter_engine))
+    assert restored.should_block("https://site.com/banner/a.png", "site.com", "site.com", "image")
+
+
+# --- Importação de favoritos ---
+def json_events(text, read_size):
+    return list(nucleo.iter_json_events(io.StringIO(text), read_size=read_size))
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 7, 64 * 1024])
+def test_iter_json_events_across_chunk_boundaries(read_size):
+    text = '{"nome": "pasta \\"A\\" \\u00e9", "filhos": [1, -2.5e3, true, null, {"url": "http://x/"}], "vazio": []}'
+    assert json_events(text, read_size) == [
+        ("start_map", None),
+        ("key", "nome"), ("value", 'pasta "A" é'),
+        ("key", "filhos"), ("start_array", None),
+        ("value", 1), ("value", -2500.0), ("value", True), ("value", None),
+        ("start_map", None), ("key", "url"), ("value", "http://x/"), ("end_map", None),
+        ("end_array", None),
+        ("key", "vazio"), ("start_array", None), ("end_array", None),
+        ("end_map", None),
+    ]
+
+
+def test_iter_json_events_matches_json_module():
+    document = {"roots": {"bookmark_bar": {"children": [{"name": f"f{i}", "url": f"https://{i}.com/"}
+                                                         for i in range(50)], "name": "Barra"}}}
+    events = json_events(json.dumps(document), 5)
+    urls = [value for event, value in events if event == "value" and str(value).startswith("https://")]
+    assert urls == [f"https://{i}.com/" for i in range(50)]
+
+
+@pytest.mark.parametrize("text", ['{"a": tru}', '{"a": 1', '[1, 2'])
+def test_iter_json_events_rejects_invalid_json(text):
+    with pytest.raises(ValueError):
+        json_events(text, 4)
+
+
+# --- Diário de sessão ---
+def test_session_journal_replays_after_reopen(qt_core_app, tmp_path):
+    path = str(tmp_path / "session.journal")
+    journal = nucleo.SessionJournal(path)
+    journal.record_open(1, 0, "https://a.com/", "A")
+    journal.record_open(2, 1, "https://b.com/", "B")
+    journal.record_open(3, 1, "https://c.com/", "C")
+    journal.record_url(2, "https://b.com/outra")
+    journal.record_title(2, "B2")
+    journal.record_close(1)
+    journal.record_active(2)
+    journal.flush()
+
+    tabs, active_index = nucleo.SessionJournal(path).saved_tabs()
+    assert [(tab["id"], tab["url"], tab["title"]) for tab in tabs] == [
+        (3, "https://c.com/", "C"), (2, "https://b.com/outra", "B2")]
+    assert active_index == 1
+
+
+def test_session_journal_ignores_a_truncated_last_line(qt_core_app, tmp_path):
+    path = str(tmp_path / "session.journal")
+    journal = nucleo.SessionJournal(path)
+    journal.record_open(1, 0, "https://a.com/", "A")
+    journal.flush()
+    with open(path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"op": "open", "id": 2, "url": "https://b.c') # Queda no meio da escrita
+
+    reopened = nucleo.SessionJournal(path)
+    assert [tab["id"] for tab in reopened.saved_tabs()[0]] == [1]
+    # A linha cortada some na reescrita: novas linhas não grudam nela
+    reopened.record_open(3, 1, "https://c.com/", "C")
+    reopened.flush()
+    assert [tab["id"] for tab in nucleo.SessionJournal(path).saved_tabs()[0]] == [1, 3]
+
+
+def test_session_journal_compacts_to_current_state(qt_core_app, tmp_path):
+    path = str(tmp_path / "session.journal")
+    journal = nucleo.SessionJournal(path)
+    journal.record_open(1, 0, "https://a.com/", "A")
+    for step in range(20):
+        journal.record_url(1, f"https://a.com/{step}")
+    journal.close()
+    with open(path, encoding="utf-8") as journal_file:
+        records = [json.loads(line) for line in journal_file]
+    assert records == [{"op": "open", "id": 1, "index": 0, "url": "https://a.com/19", "title": "A"}]
+
+
+# --- Ctrl+K ---
+def test_rank_fuzzy_prefers_word_start_then_contiguous_then_scattered():
+    keys = ["documentação python https://docs.python.org/",
+            "github https://github.com/",
+            "notícias https://g1.globo.com/",
+            "mapa https://maps.example.com/ghub"]
+    assert nucleo.rank_fuzzy("git", keys) == [1]
+    assert nucleo.rank_fuzzy("ghub", keys) == [3, 1]
+    assert nucleo.rank_fuzzy("py doc", keys) == [0]
+    assert nucleo.rank_fuzzy("zzz", keys) == []
+
+
+def test_rank_fuzzy_empty_query_and_limit():
+    keys = [f"aba {index}" for index in range(10)]
+    assert nucleo.rank_fuzzy("", keys, limit=3) == [0, 1, 2]
+    assert len(nucleo.rank_fuzzy("aba", keys, limit=4)) == 4
+
+
+def test_rank_fuzzy_escapes_regex_characters():
+    keys = ["preço (promoção) [site]", "outra aba"]
+    assert nucleo.rank_fuzzy("(p", keys) == [0]
+    assert nucleo.rank_fuzzy("[s", keys) == [0]
+
+
+# --- Regras por site ---
+def test_compile_site_rules_normalizes_hosts():
+    index = nucleo.compile_site_rules({
+        "*.Exemplo.com.": {"javascript": False},
+        ".exemplo.com": {"images": False},
+        "*": {"plugins": True},
+        "lento.com": "leve",
+    })
+    assert index["exemplo.com"] == {"javascript": False, "images": False}
+    assert index[""] == {"plugins": True}
+    assert index["lento.com"] == nucleo.LITE_MODE_SETTINGS
+
+
+def test_compile_site_rules_ignores_invalid_entries(capsys):
+    index = nucleo.compile_site_rules({
+        "a.com": {"javascript": "não"},  # Valor que não é booleano
+        "b.com": {"desconhecida": True},
+        "c.com": 42,
+        "": {"images": False},            # Host vazio sem ser '*'
+    })
+    assert index == {}
+    assert "4 regra(s)" in capsys.readouterr().out
+    assert nucleo.compile_site_rules(["não", "é", "dict"]) == {}
+
+
+def test_site_rules_most_specific_wins_and_defaults_stay_unset(tmp_path):
+    rules_path = tmp_path / "site_rules.json"
+    rules_path.write_text(json.dumps({"exemplo.com": {"javascript": False, "images": False},
+                                      "app.exemplo.com": {"javascript": True}}), encoding="utf-8")
+    rules = nucleo.SiteRules(str(rules_path))
+    assert rules.settings_for_host("app.exemplo.com") == {"javascript": True, "images": False}
+    assert rules.settings_for_host("www.exemplo.com") == {"javascript": False, "images": False}
+    # Sem regra nada é forçado: autoplay e o resto ficam no padrão do motor
+    assert rules.settings_for_host("outro.com") == {}
+
+    rules.set_lite_mode(True)
+    assert rules.settings_for_host("outro.com") == nucleo.LITE_MODE_SETTINGS
+    assert rules.settings_for_host("app.exemplo.com")["javascript"] is True
+
+
+# --- Exportação/importação de perfis ---
+@pytest.mark.parametrize("name, expected", [
+    ("perfil/appdata/history.sqlite", os.path.join("appdata", "history.sqlite")),
+    ("perfil/./storage//Cookies", os.path.join("storage", "Cookies")),
+    ("perfil\\appdata\\prefs.json", os.path.join("appdata", "prefs.json")),
+])
+def test_archive_member_path_accepts_profile_members(name, expected):
+    assert nucleo.archive_member_path(name) == expected
+
+
+@pytest.mark.parametrize("name", [
+    "perfil",
+    "perfil/",
+    "outro/arquivo",
+    "/etc/passwd",
+    "perfil/../fora.txt",
+    "perfil/appdata/../../fora.txt",
+    "perfil/C:/Windows/win.ini",
+    "../perfil/x",
+])
+def test_archive_member_path_rejects_paths_outside_the_profile(name):
+    assert nucleo.archive_member_path(name) is None